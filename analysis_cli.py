@@ -0,0 +1,272 @@
+"""
+Headless front end of analysis_core: runs the full analysis without a QApplication and
+writes the predictions as JSON.
+
+Usage:
+    # One analysis; match URLs or FotMob match IDs
+    python analysis_cli.py analyze 4446402 4446410 --home 8564 --away 8686 \\
+        --odds-euro 2.1 3.4 3.3 --odds-handicap -0.25 1.95 1.9 --odds-ou 2.5 1.9 1.95 -o result.json
+
+    # Show the team IDs of two matches
+    python analysis_cli.py teams 4446402 4446410
+
+    # Many analyses in parallel, one process per task; tasks without odds take them from
+    # an odds file by task name
+    python analysis_cli.py batch tasks.jsonl --output-dir predictions/ --jobs 8 --odds odds.csv
+
+    # Fair probabilities of a bulk odds file, with value flagged against the batch predictions
+    python analysis_cli.py odds odds.csv --predictions predictions/ --min-edge 0.05 -o value.csv
+
+A batch file is a JSON list or JSON lines of tasks:
+    {"name": "milan-roma", "matches": ["4446402", "4446410"], "home_team_id": 8564,
+     "away_team_id": 8686, "odds": {"euro": {"home": "2.1", "draw": "3.4", "away": "3.3"}}}
+
+Odds files are CSV or JSON; see odds_table.py for the accepted layouts.
+
+The Gemini API key is read from --api-key or the GEMINI_API_KEY environment variable.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from analysis_core import (
+    ODDS_FIELDS, AnalysisError, match_url_from_reference, normalize_odds, run_analysis, scrape_two_matches
+)
+from cancellation import CancelToken, JobCancelled
+
+TASK_FIELDS = ('matches', 'home_team_id', 'away_team_id')
+
+
+def _odds_from_args(args) -> dict:
+    if args.odds_file:
+        with open(args.odds_file, encoding='utf-8') as f:
+            return normalize_odds(json.load(f))
+    odds = {}
+    for market, fields in ODDS_FIELDS.items():
+        values = getattr(args, f'odds_{market}')
+        if values:
+            odds[market] = dict(zip(fields, values))
+    return normalize_odds(odds)
+
+
+def _print_progress(label):
+    def report_progress(percent, message=""):
+        print(f"[{label}] {percent:5.1f}% {message}", file=sys.stderr, flush=True)
+    return report_progress
+
+
+def _write_json(data, path=None):
+    text = json.dumps(data, indent=2, ensure_ascii=False)
+    if not path:
+        print(text)
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def load_tasks(path) -> list:
+    """Reads a batch file, either one JSON list or one task per line."""
+    with open(path, encoding='utf-8') as f:
+        text = f.read().strip()
+    if text.startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def run_task(index, task, gemini_api_key, with_squad_values=False) -> dict:
+    """Runs one batch task; errors are returned in the result instead of raised."""
+    label = task.get('name') or f"task-{index}"
+    started = time.perf_counter()
+    result = {'name': label, 'task': task}
+    try:
+        missing = [key for key in TASK_FIELDS if key not in task]
+        if missing:
+            raise AnalysisError(f"Tác vụ thiếu trường: {', '.join(missing)}")
+        result.update(run_analysis(
+            task['matches'], task['home_team_id'], task['away_team_id'],
+            normalize_odds(task.get('odds')), gemini_api_key,
+            report_progress=_print_progress(label), with_squad_values=with_squad_values,
+        ))
+        result['status'] = 'done'
+    except (AnalysisError, JobCancelled) as e:
+        result['status'] = 'failed'
+        result['error'] = str(e)
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['elapsed_seconds'] = round(time.perf_counter() - started, 2)
+    return result
+
+
+def _log_predictions(args, results):
+    """Appends the predictions of finished analyses to --prediction-log, if given."""
+    if not args.prediction_log:
+        return
+    from prediction_log import PredictionLog, prediction_record
+
+    PredictionLog(args.prediction_log).append([
+        prediction_record(result['prediction'], result['home_team'], result['away_team'], result.get('odds'))
+        for result in results if result['status'] == 'done' and result.get('prediction')
+    ])
+
+
+def command_analyze(args) -> int:
+    result = run_task(0, {
+        'name': 'analyze',
+        'matches': args.matches,
+        'home_team_id': args.home,
+        'away_team_id': args.away,
+        'odds': _odds_from_args(args),
+    }, args.api_key, args.squad_values)
+    _write_json(result, args.output)
+    _log_predictions(args, [result])
+    if result['status'] != 'done':
+        print(f"Lỗi: {result['error']}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def command_teams(args) -> int:
+    match1_url, match2_url = (match_url_from_reference(ref) for ref in args.matches)
+    raw_data = scrape_two_matches(match1_url, match2_url, CancelToken(), _print_progress('teams'))
+    teams = [{'id': team_id, 'name': team_name} for team_id, team_name in raw_data['all_teams_for_selection'].items()]
+    _write_json(teams)
+    return 0
+
+
+def load_results(path) -> list:
+    """Reads analysis results: a batch output directory, one result JSON, or a JSON/JSON lines list."""
+    if os.path.isdir(path):
+        results = []
+        for file_name in sorted(os.listdir(path)):
+            if file_name.endswith('.json'):
+                with open(os.path.join(path, file_name), encoding='utf-8') as f:
+                    results.append(json.load(f))
+        return results
+    with open(path, encoding='utf-8') as f:
+        text = f.read().strip()
+    if text.startswith('{') and '\n{' not in text:
+        return [json.loads(text)]
+    return load_tasks(path)
+
+
+def command_odds(args) -> int:
+    from odds_table import add_fair_probabilities, find_value, load_odds_file, predictions_frame
+
+    started = time.perf_counter()
+    table = add_fair_probabilities(load_odds_file(args.odds_file, args.bookmaker), args.method)
+    if args.predictions:
+        table = find_value(table, predictions_frame(load_results(args.predictions)), args.min_edge)
+    elapsed = time.perf_counter() - started
+
+    if args.output and args.output.lower().endswith('.json'):
+        _write_json(json.loads(table.to_json(orient='records')), args.output)
+    elif args.output:
+        table.to_csv(args.output, index=False)
+    else:
+        print(table.to_csv(index=False), end='')
+    summary = f"{len(table)} trận, {elapsed * 1000:.0f} ms"
+    if args.predictions:
+        summary += f", {int(table['best_value'].notna().sum())} trận có kèo giá trị (lợi thế >= {args.min_edge:.0%})"
+    print(summary, file=sys.stderr)
+    return 0
+
+
+def command_batch(args) -> int:
+    tasks = load_tasks(args.tasks)
+    if args.odds:
+        from odds_table import load_odds_file, odds_dicts
+
+        imported_odds = odds_dicts(load_odds_file(args.odds, args.bookmaker))
+        for index, task in enumerate(tasks):
+            if not task.get('odds'):
+                task['odds'] = imported_odds.get(task.get('name') or f"task-{index}")
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = args.jobs or os.cpu_count() or 1
+    print(f"{len(tasks)} tác vụ, {jobs} tiến trình", file=sys.stderr)
+
+    failed = 0
+    results = []
+    started = time.perf_counter()
+    # Each process runs its own browser and Gemini chat, so tasks never share state
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(run_task, index, task, args.api_key, args.squad_values): index for index, task in enumerate(tasks)}
+        for future in as_completed(futures):
+            index = futures[future]
+            result = future.result()
+            results.append(result)
+            file_name = re.sub(r'[^\w.-]+', '_', f"{index:04d}-{result['name']}") + '.json'
+            _write_json(result, os.path.join(args.output_dir, file_name))
+            failed += result['status'] != 'done'
+            print(f"{result['name']}: {result['status']} ({result['elapsed_seconds']}s)"
+                  + (f" - {result['error']}" if result['status'] != 'done' else ""), file=sys.stderr)
+
+    _log_predictions(args, results)
+    elapsed = time.perf_counter() - started
+    print(f"Hoàn tất {len(tasks) - failed}/{len(tasks)} tác vụ trong {elapsed:.1f}s", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Phân tích trận đấu kèo bóng VTT không cần giao diện.")
+    parser.add_argument('--api-key', default=os.environ.get('GEMINI_API_KEY'),
+                        help="Gemini API key (mặc định: biến môi trường GEMINI_API_KEY).")
+    parser.add_argument('--prediction-log', help="Thư mục nhật ký dự đoán để backtest sau (xem backtest.py).")
+    parser.add_argument('--squad-values', action='store_true',
+                        help="Thêm giá trị đội hình xuất phát (Transfermarkt) vào phân tích; cần thêm thời gian tra cứu.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    analyze = subparsers.add_parser('analyze', help="Phân tích một trận đấu.")
+    analyze.add_argument('matches', nargs=2, help="Hai URL hoặc ID trận đấu FotMob.")
+    analyze.add_argument('--home', required=True, help="ID đội nhà.")
+    analyze.add_argument('--away', required=True, help="ID đội khách.")
+    analyze.add_argument('--odds-euro', nargs=3, metavar=('HOME', 'DRAW', 'AWAY'))
+    analyze.add_argument('--odds-handicap', nargs=3, metavar=('LINE', 'HOME', 'AWAY'))
+    analyze.add_argument('--odds-ou', nargs=3, metavar=('LINE', 'OVER', 'UNDER'))
+    analyze.add_argument('--odds-file', help="File JSON chứa kèo (cùng định dạng với tác vụ batch).")
+    analyze.add_argument('-o', '--output', help="File JSON kết quả (mặc định: stdout).")
+    analyze.set_defaults(handler=command_analyze)
+
+    teams = subparsers.add_parser('teams', help="Liệt kê ID các đội trong hai trận đấu.")
+    teams.add_argument('matches', nargs=2, help="Hai URL hoặc ID trận đấu FotMob.")
+    teams.set_defaults(handler=command_teams)
+
+    batch = subparsers.add_parser('batch', help="Chạy nhiều phân tích song song.")
+    batch.add_argument('tasks', help="File JSON hoặc JSON lines chứa các tác vụ.")
+    batch.add_argument('--output-dir', required=True, help="Thư mục chứa một file JSON kết quả cho mỗi tác vụ.")
+    batch.add_argument('--jobs', type=int, default=None, help="Số tiến trình song song (mặc định: số CPU).")
+    batch.add_argument('--odds', help="File kèo (CSV/JSON) cho các tác vụ chưa có kèo, khớp theo tên tác vụ.")
+    batch.add_argument('--bookmaker', default='B365', help="Nhà cái khi đọc file football-data.co.uk.")
+    batch.set_defaults(handler=command_batch)
+
+    odds = subparsers.add_parser('odds', help="Tính xác suất thực từ file kèo và tìm kèo giá trị.")
+    odds.add_argument('odds_file', help="File kèo CSV hoặc JSON, mỗi dòng/bản ghi một trận.")
+    odds.add_argument('--predictions', help="Kết quả phân tích để so sánh: thư mục output của batch hoặc file JSON.")
+    odds.add_argument('--method', choices=('proportional', 'power'), default='proportional',
+                      help="Cách bỏ lợi nhuận nhà cái khỏi xác suất ngầm định.")
+    odds.add_argument('--min-edge', type=float, default=0.05, help="Lợi thế kỳ vọng tối thiểu để coi là kèo giá trị.")
+    odds.add_argument('--bookmaker', default='B365', help="Nhà cái khi đọc file football-data.co.uk.")
+    odds.add_argument('-o', '--output', help="File kết quả .csv hoặc .json (mặc định: CSV ra stdout).")
+    odds.set_defaults(handler=command_odds)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command in ('analyze', 'batch') and not args.api_key:
+        print("Thiếu Gemini API key: dùng --api-key hoặc biến môi trường GEMINI_API_KEY.", file=sys.stderr)
+        return 2
+    try:
+        return args.handler(args)
+    except AnalysisError as e:
+        print(f"Lỗi: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,573 @@
+"""
+GUI-free analysis pipeline: scrape two matches, summarize the selected teams, ask Gemini
+for the analysis and parse its prediction. Used by the desktop app (as scheduler jobs)
+and by analysis_cli.py for headless and batch runs.
+
+Heavy modules (pandas, Playwright, Gemini) are imported inside the functions, so importing
+this module stays cheap.
+"""
+import re
+import json
+
+from cancellation import CancelToken
+from tracing import span, traced
+
+ODDS_FIELDS = {
+    'euro': ('home', 'draw', 'away'),
+    'handicap': ('line', 'home', 'away'),
+    'ou': ('line', 'over', 'under'),
+}
+# Markdown code fences and "---" separators around the prediction JSON in AI responses
+_CODE_FENCE_PATTERN = re.compile(r'```(?:json)?', re.IGNORECASE)
+_SEPARATOR_PATTERN = re.compile(r'^\s*-{3,}\s*|\s*-{3,}\s*$')
+
+
+class AnalysisError(Exception):
+    """Raised when an analysis cannot be completed with the given matches or teams."""
+
+
+def _no_progress(percent, message=""):
+    pass
+
+
+def match_url_from_reference(reference) -> str:
+    """Accepts a FotMob match URL or a bare FotMob match ID and returns a match URL."""
+    from football_scraper import FOTMOB_BASE_URL
+
+    reference = str(reference).strip()
+    if reference.isdigit():
+        return f"{FOTMOB_BASE_URL}/match/{reference}"
+    if "fotmob.com" not in reference and not reference.startswith(FOTMOB_BASE_URL):
+        raise AnalysisError(f"Không phải URL hoặc ID trận đấu FotMob hợp lệ: {reference}")
+    return reference
+
+
+def match_key_from_reference(reference) -> str:
+    """Returns the FotMob match ID of a URL or ID when it can be read without scraping."""
+    reference = str(reference).strip()
+    if reference.isdigit():
+        return reference
+    fragment_match = re.search(r'#(\d+)$', reference)
+    return fragment_match.group(1) if fragment_match else reference
+
+
+def normalize_odds(odds) -> dict:
+    """Fills in every odds field the prompt expects; values are kept as given (strings or numbers)."""
+    odds = odds or {}
+    return {
+        market: {field: odds.get(market, {}).get(field) or "" for field in fields}
+        for market, fields in ODDS_FIELDS.items()
+    }
+
+
+def resolve_team(raw_data, team_id):
+    """Returns (team_id, team_name) for a team in the scraped matches; IDs may be given as strings."""
+    for known_id, team_name in raw_data.get('all_teams_for_selection', {}).items():
+        if str(known_id) == str(team_id):
+            return known_id, team_name
+    raise AnalysisError(f"Không tìm thấy đội có ID {team_id} trong các trận đấu đã cào.")
+
+
+# --- Pipeline stages ---
+# Each stage runs as fn(..., cancel_token, report_progress), so the desktop app can submit it
+# to its JobScheduler unchanged.
+
+def scrape_two_matches(match1_url, match2_url, cancel_token, report_progress):
+    from football_scraper import get_fotmob_match_data
+
+    with span('analysis.scrape_two_matches'):
+        report_progress(5, "Đang cào dữ liệu trận 1...")
+        match1_data = get_fotmob_match_data(match1_url, cancel_token=cancel_token)
+        cancel_token.raise_if_cancelled()
+        report_progress(50, "Đang cào dữ liệu trận 2...")
+        match2_data = get_fotmob_match_data(match2_url, cancel_token=cancel_token)
+        cancel_token.raise_if_cancelled()
+    
+    return combine_match_data(match1_data, match2_data)
+
+def combine_match_data(match1_data, match2_data):
+    """Builds the raw data of an analysis from two scraped matches."""
+    if not match1_data.get('team_data') or not match2_data.get('team_data'):
+        raise AnalysisError("Không thể lấy dữ liệu đội từ một hoặc cả hai trận đấu.")
+
+    all_teams_for_selection = {**match1_data['team_data'], **match2_data['team_data']}
+    
+    # Keep match data separate but provide a combined list of teams for the selection dialog
+    return {
+        'match1': match1_data,
+        'match2': match2_data,
+        'all_teams_for_selection': all_teams_for_selection
+    }
+
+def load_squad_values(raw_data, cancel_token=None, report_progress=None) -> dict:
+    """
+    Starting-XI market values of both matches (see squad_values.py); {} when they are unavailable.
+    Looking them up is network I/O with a time budget of its own, so it is a separate stage
+    and not part of precompute_analysis_data.
+    """
+    from squad_values import collect_squad_values
+
+    with span('analysis.squad_values') as squad_span:
+        try:
+            return collect_squad_values(raw_data)
+        except Exception as e:
+            # Squad values only add context to the prompt; the analysis goes on without them
+            squad_span.fail(e)
+            print(f"Could not load squad values: {e}")
+            return {}
+
+def summarize_teams(raw_data, squad_values=None, cancel_token=None) -> dict:
+    """{team_id: AI summary} for every team of both matches; `squad_values` as returned by load_squad_values."""
+    squad_values = squad_values or {}
+    summaries = {}
+    for match_key in ('match1', 'match2'):
+        match_data = raw_data[match_key]
+        for team_id, team_name in match_data.get('team_data', {}).items():
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            if team_id in summaries:
+                continue
+            summaries[team_id] = format_full_data_for_ai(match_data.get('full_data', {}), team_name,
+                                                         squad_values.get(match_key))
+    return summaries
+
+@traced('analysis.precompute')
+def precompute_analysis_data(raw_data, cancel_token, report_progress, squad_values=None):
+    """Prepares everything the analysis needs while the user is still in the dialogs; CPU work only."""
+    import pandas as pd
+
+    summaries = summarize_teams(raw_data, squad_values, cancel_token)
+
+    # Combine shots from both matches for the shotmap tab later
+    combined_shots_df = pd.concat(
+        [raw_data['match1']['shots_df'], raw_data['match2']['shots_df']],
+        ignore_index=True
+    )
+    team_shots = {}
+    if not combined_shots_df.empty and 'teamId' in combined_shots_df.columns:
+        team_shots = {team_id: group for team_id, group in combined_shots_df.groupby('teamId')}
+
+    return {
+        'summaries': summaries,
+        'combined_shots_df': combined_shots_df,
+        'team_shots': team_shots,
+    }
+
+class Worker:
+    """
+    Runs the Gemini analysis. With the odds known up front (CLI, service) `run` sends one
+    combined prompt in a single request. The desktop app asks for the odds while the AI
+    already works, using two turns of one chat, each run as its own job: `run_stats_turn`
+    starts right away, `run_odds_turn` once `provide_odds` has been called and the stats
+    turn is done. No job waits for the user, so no pool thread is held by an open dialog.
+    """
+
+    def __init__(self, data, odds, gemini_api_key):
+        self.data = data
+        self.odds = odds
+        self.gemini_api_key = gemini_api_key
+        self._chat = None
+        self._generation_config = None
+        self._stats_analysis = None
+
+    def provide_odds(self, odds):
+        """Called from the UI thread once the user has entered the odds."""
+        self.odds = odds
+
+    def _model(self):
+        if not self.gemini_api_key:
+            raise ValueError("Vui lòng nhập API Key của Gemini trong menu 'Cài đặt'.")
+        import google.generativeai as genai
+
+        genai.configure(api_key=self.gemini_api_key)
+        model = genai.GenerativeModel('models/gemini-2.5-flash')
+        return model, genai.types.GenerationConfig(temperature=0.7)
+
+    def run(self, cancel_token, report_progress):
+        with span('ai.worker_run'):
+            model, generation_config = self._model()
+            report_progress(10, "Đang phân tích dữ liệu và kèo...")
+            prompt = self.build_prompt()
+            with span('ai.gemini_single_turn', prompt_chars=len(prompt)):
+                response = model.generate_content(prompt, generation_config=generation_config)
+            return response.text
+
+    def run_stats_turn(self, cancel_token, report_progress):
+        """First turn: the stats-only analysis, run while the odds dialog is still open."""
+        model, self._generation_config = self._model()
+        self._chat = model.start_chat()
+        report_progress(10, "Đang phân tích dữ liệu thống kê...")
+        stats_prompt = self.build_stats_prompt()
+        with span('ai.gemini_stats_turn', prompt_chars=len(stats_prompt)):
+            stats_response = self._chat.send_message(stats_prompt, generation_config=self._generation_config)
+        self._stats_analysis = stats_response.text.strip()
+        return self._stats_analysis
+
+    def run_odds_turn(self, cancel_token, report_progress):
+        """Second turn: the odds and the prediction JSON, merged with the stats analysis."""
+        report_progress(10, "Đang phân tích kèo...")
+        odds_prompt = self.build_odds_prompt()
+        with span('ai.gemini_odds_turn', prompt_chars=len(odds_prompt)):
+            odds_response = self._chat.send_message(odds_prompt, generation_config=self._generation_config)
+        return self.merge_responses(self._stats_analysis, odds_response.text)
+
+    def _overview_block(self):
+        # The 'data' dictionary contains the detailed, formatted stats summaries
+        home_team_name = self.data.get("home_team_name", "Đội nhà")
+        away_team_name = self.data.get("away_team_name", "Đội khách")
+        home_stats_summary = self.data.get("home_team_stats_summary", "Không có dữ liệu.")
+        away_stats_summary = self.data.get("away_team_stats_summary", "Không có dữ liệu.")
+        return f"""**BÀI PHÂN TÍCH TRẬN ĐẤU**
+
+            **TRẬN ĐẤU:** {home_team_name} vs {away_team_name}
+
+            **DỮ LIỆU TỔNG QUAN:**
+            - **{home_team_name}:**
+            {home_stats_summary}
+            - **{away_team_name}:**
+            {away_stats_summary}"""
+
+    def build_stats_prompt(self):
+        return f"""
+            **YÊU CẦU:**
+            Bạn là một chuyên gia phân tích bóng đá. Dựa trên dữ liệu thống kê dưới đây, hãy viết phần đầu của bài phân tích trận đấu.
+            Chưa đưa ra dự đoán hay JSON, kèo nhà cái sẽ được cung cấp ở tin nhắn sau.
+
+            {self._overview_block()}
+
+            **PHÂN TÍCH:**
+            1.  **Phân tích Phong độ & BXH:** Dựa vào dữ liệu thống kê, lịch sử đối đầu và vị trí trên bảng xếp hạng, đội nào có lợi thế?
+            2.  **Phân tích Lối chơi & Đội hình:** Sơ đồ chiến thuật và các cầu thủ ra sân (nếu có) tiết lộ gì về lối chơi của họ?
+            """
+
+    def build_prompt(self):
+        """Stats and odds in one prompt, for a single request when the odds are known up front."""
+        return f"""
+            **YÊU CẦU:**
+            Bạn là một chuyên gia phân tích bóng đá. Dựa trên dữ liệu và kèo nhà cái, hãy cung cấp một JSON object chứa các dự đoán và một bài phân tích chi tiết.
+
+            **QUAN TRỌNG:** Luôn bắt đầu câu trả lời của bạn bằng một JSON object hợp lệ, theo sau là dấu phân cách "---" và sau đó là bài phân tích bằng văn bản.
+
+            {self._json_format_block()}
+            ---
+            {self._overview_block()}
+
+            {self._odds_block()}
+
+            **PHÂN TÍCH:**
+            1.  **Phân tích Phong độ & BXH:** Dựa vào dữ liệu thống kê, lịch sử đối đầu và vị trí trên bảng xếp hạng, đội nào có lợi thế?
+            2.  **Phân tích Lối chơi & Đội hình:** Sơ đồ chiến thuật và các cầu thủ ra sân (nếu có) tiết lộ gì về lối chơi của họ?
+            3.  **Phân tích Kèo:** So sánh nhận định của bạn với kèo nhà cái. Kèo có hợp lý không?
+            4.  **Kết luận & Lựa chọn Tốt nhất:** Tóm tắt nhận định và giải thích tại sao bạn lại đưa ra lựa chọn kèo ở trong phần JSON.
+            5.  **Dự đoán tỷ số:**
+            """
+
+    def _odds_block(self):
+        odds_euro_home = self.odds.get('euro', {}).get('home') or "N/A"
+        odds_euro_draw = self.odds.get('euro', {}).get('draw') or "N/A"
+        odds_euro_away = self.odds.get('euro', {}).get('away') or "N/A"
+        odds_handicap_line = self.odds.get('handicap', {}).get('line') or "N/A"
+        odds_handicap_home = self.odds.get('handicap', {}).get('home') or "N/A"
+        odds_handicap_away = self.odds.get('handicap', {}).get('away') or "N/A"
+        odds_ou_line = self.odds.get('ou', {}).get('line') or "N/A"
+        odds_ou_over = self.odds.get('ou', {}).get('over') or "N/A"
+        odds_ou_under = self.odds.get('ou', {}).get('under') or "N/A"
+        implied_line = ""
+        fair_probabilities = self.fair_euro_probabilities()
+        if fair_probabilities:
+            home_pct, draw_pct, away_pct = (f"{probability:.1%}" for probability in fair_probabilities)
+            implied_line = f"\n            - **Xác suất ngầm định 1x2 (đã bỏ lợi nhuận nhà cái):** Thắng: {home_pct} | Hòa: {draw_pct} | Thua: {away_pct}"
+        return f"""**Tỷ lệ kèo nhà cái:**
+            - **Kèo Châu Âu (1x2):** Thắng: {odds_euro_home} | Hòa: {odds_euro_draw} | Thua: {odds_euro_away}
+            - **Kèo Châu Á (Handicap):** Kèo: {odds_handicap_line} | Đội nhà: {odds_handicap_home} | Đội khách: {odds_handicap_away}
+            - **Kèo Tài Xỉu (O/U):** Mốc: {odds_ou_line} | Tài: {odds_ou_over} | Xỉu: {odds_ou_under}{implied_line}"""
+
+    def _json_format_block(self):
+        home_team_name = self.data.get("home_team_name", "Đội nhà")
+        return f"""**ĐỊNH DẠNG JSON:**
+            {{
+              "prediction": {{
+                "home_team_win_prob_pct": <số nguyên, xác suất thắng của đội nhà (0-100)>,
+                "draw_prob_pct": <số nguyên, xác suất hòa (0-100)>,
+                "away_team_win_prob_pct": <số nguyên, xác suất thắng của đội khách (0-100)>,
+                "expected_total_goals": <số thực, tổng số bàn thắng kỳ vọng trong trận đấu>,
+                "best_bet": "<lựa chọn kèo tốt nhất, ví dụ: {home_team_name} -0.5>",
+                "confidence_level": "<'High' | 'Medium' | 'Low', mức độ tự tin cho 'best_bet'>",
+                "score_probabilities": [
+                  {{ "score": "<dự đoán tỷ số 1, ví dụ: '2-1'>", "probability_pct": <số nguyên, xác suất cho tỷ số đó> }},
+                  {{ "score": "<dự đoán tỷ số 2, ví dụ: '1-1'>", "probability_pct": <số nguyên> }},
+                  {{ "score": "<dự đoán tỷ số 3, ví dụ: '1-0'>", "probability_pct": <số nguyên> }}
+                ]
+              }}
+            }}"""
+
+    def build_odds_prompt(self):
+        return f"""
+            **YÊU CẦU:**
+            Dựa trên phân tích thống kê ở trên và kèo nhà cái dưới đây, hãy cung cấp một JSON object chứa các dự đoán và phần còn lại của bài phân tích.
+
+            **QUAN TRỌNG:** Luôn bắt đầu câu trả lời của bạn bằng một JSON object hợp lệ, theo sau là dấu phân cách "---" và sau đó là bài phân tích bằng văn bản.
+            Không lặp lại phần 1 và 2 đã viết.
+
+            {self._json_format_block()}
+            ---
+            {self._odds_block()}
+
+            **PHÂN TÍCH (tiếp theo):**
+            3.  **Phân tích Kèo:** So sánh nhận định của bạn với kèo nhà cái. Kèo có hợp lý không?
+            4.  **Kết luận & Lựa chọn Tốt nhất:** Tóm tắt nhận định và giải thích tại sao bạn lại đưa ra lựa chọn kèo ở trong phần JSON.
+            5.  **Dự đoán tỷ số:**
+            """
+
+    def fair_euro_probabilities(self):
+        from odds_table import fair_euro_probabilities
+
+        return fair_euro_probabilities(self.odds)
+
+    @staticmethod
+    def merge_responses(stats_analysis, odds_result):
+        """
+        Puts the prediction JSON of the odds reply first, then the stats analysis and the
+        rest of the odds reply. The stats text may contain "---" itself, so the JSON block is
+        located in the odds reply rather than split off at a separator.
+        """
+        json_block = find_prediction_json(odds_result)
+        if json_block is None:
+            # Nothing to move; parse_ai_response reports the missing JSON
+            return f"{stats_analysis}\n\n{odds_result}"
+        start, end, _ = json_block
+        odds_analysis = _analysis_text_around(odds_result, start, end)
+        return f"{odds_result[start:end]}\n---\n{stats_analysis}\n\n{odds_analysis}"
+
+    def format_matches(self, matches):
+        # This function is no longer used in the new workflow but kept for now.
+        text = ""
+        if not matches:
+            return "Không có dữ liệu trận đấu.\n"
+        for i, match in enumerate(matches):
+            stats = match.get('stats', {})
+            total_shots_stats = stats.get('Tất cả các cú sút', {})
+            goals = total_shots_stats.get('Goals', 'N/A')
+            xg = total_shots_stats.get('Expected goals (xG)', 'N/A')
+            
+            overview_stats = stats.get('Tổng quan', {})
+            possession = overview_stats.get('Ball possession', 'N/A')
+            
+            text += f"- Trận vs {match['opponent_name']}: Ghi {goals} bàn, Sút (xG: {xg}), Kiểm soát bóng: {possession}\n"
+        return text
+
+@traced('analysis.format_full_data_for_ai')
+def format_full_data_for_ai(full_data, team_name, squad_values=None):
+    """
+    Formats all the new, detailed data into a string for the AI prompt.
+    `squad_values` ({team name: starting-XI value aggregate}) adds the team's Transfermarkt value.
+    """
+    if not full_data:
+        return "Không có dữ liệu chi tiết."
+
+    output = ""
+    
+    # 1. Goalscorers
+    facts = full_data.get('matchFacts', {})
+    if facts and 'goals' in facts and facts['goals']:
+        output += "Ghi bàn:\n"
+        for goal in facts['goals']:
+            scorer_line = f"- {goal.get('scorerName', 'N/A')} {goal.get('timeStr', '')}"
+            if goal.get('isOwnGoal'):
+                scorer_line += f" (Phản lưới nhà)"
+            output += scorer_line + "\n"
+    
+    # 2. Detailed Stats
+    stats_data = full_data.get('stats', {})
+    if stats_data and 'stats' in stats_data and stats_data.get('stats'):
+        output += "\nThống kê chi tiết:\n"
+        for section in stats_data['stats']:
+            if 'teamNames' not in section or len(section['teamNames']) < 2:
+                continue
+            
+            output += f"**{section['title']}**\n"
+            for stat in section['stats']:
+                home_val = stat['stats'][0]
+                away_val = stat['stats'][1]
+                
+                team_val = "N/A"
+                if section['teamNames'][0] == team_name:
+                    team_val = home_val
+                elif section['teamNames'][1] == team_name:
+                    team_val = away_val
+                
+                output += f"- {stat['key']}: {team_val}\n"
+    
+    # 3. Lineup
+    lineup_data = full_data.get('lineup', {})
+    if lineup_data and lineup_data.get('lineup'):
+        output += "\nĐội hình ra sân:\n"
+        for team_lineup in lineup_data['lineup']:
+            if team_lineup.get('teamName') == team_name:
+                output += f"- Sơ đồ: {team_lineup.get('formation', 'N/A')}\n"
+
+    # 3b. Starting XI market value
+    team_value = (squad_values or {}).get(team_name)
+    if team_value and team_value['valued']:
+        from squad_values import format_market_value
+
+        output += "\nGiá trị đội hình xuất phát (Transfermarkt):\n"
+        output += (f"- Tổng: {format_market_value(team_value['xi_value_eur'])} "
+                   f"({team_value['valued']}/{team_value['players']} cầu thủ có dữ liệu), "
+                   f"trung bình {format_market_value(team_value['average_eur'])}/cầu thủ\n")
+        output += f"- Đắt giá nhất: {team_value['top_player']} ({format_market_value(team_value['top_value_eur'])})\n"
+    
+    # 4. H2H
+    h2h_data = full_data.get('h2h', {})
+    if h2h_data and h2h_data.get('matches'):
+        output += "\nLịch sử đối đầu (3 trận gần nhất):\n"
+        for match in h2h_data['matches'][:3]:
+            home = match.get('home', {}).get('name')
+            away = match.get('away', {}).get('name')
+            winner = match.get('winner')
+            result = f"{home} {match.get('score')} {away}"
+            if winner == 'home':
+                result += f" (Thắng: {home})"
+            elif winner == 'away':
+                result += f" (Thắng: {away})"
+            else:
+                result += " (Hòa)"
+            output += f"- {result}\n"
+
+    # 5. Table position
+    table_data = full_data.get('table', {})
+    if table_data:
+        all_tables = table_data.get('tables', [])
+        if all_tables:
+            first_table = all_tables[0].get('table', {})
+            if 'all' in first_table:
+                output += "\nBảng xếp hạng:\n"
+                for team_stats in first_table['all']:
+                    if team_stats.get('name') == team_name:
+                        pos = team_stats.get('idx')
+                        pts = team_stats.get('pts')
+                        played = team_stats.get('played')
+                        wins = team_stats.get('wins')
+                        draws = team_stats.get('draws')
+                        losses = team_stats.get('losses')
+                        gd = team_stats.get('goalDifference')
+                        output += f"- Vị trí: {pos}, Điểm: {pts}, (Thắng: {wins}, Hòa: {draws}, Thua: {losses}), Hiệu số: {gd}\n"
+
+    return output.strip() if output else "Không có dữ liệu chi tiết."
+
+def build_analysis_data(precomputed, home_team, away_team) -> dict:
+    """Builds the Worker input for the selected (team_id, team_name) pairs."""
+    summaries = precomputed['summaries']
+    if home_team[0] not in summaries or away_team[0] not in summaries:
+        raise AnalysisError("Không thể tìm thấy dữ liệu trận đấu cho các đội đã chọn.")
+    return {
+        "home_team_name": home_team[1],
+        "away_team_name": away_team[1],
+        "home_team_stats_summary": summaries[home_team[0]],
+        "away_team_stats_summary": summaries[away_team[0]],
+    }
+
+def find_prediction_json(result):
+    """
+    Locates the prediction JSON object in an AI response by decoding at each '{' instead of
+    trusting the first "---", which the analysis text may contain as well. Returns
+    (start, end, data) for the first object with a 'prediction' key (else the first object
+    at all), or None.
+    """
+    decoder = json.JSONDecoder()
+    first_object = None
+    for brace in re.finditer(r'\{', result):
+        try:
+            data, end = decoder.raw_decode(result, brace.start())
+        except ValueError:
+            continue
+        if not isinstance(data, dict):
+            continue
+        if 'prediction' in data:
+            return brace.start(), end, data
+        if first_object is None:
+            first_object = (brace.start(), end, data)
+    return first_object
+
+
+def _analysis_text_around(result, start, end):
+    """The response text outside the JSON block, without code fences and "---" separators."""
+    parts = (_CODE_FENCE_PATTERN.sub('', part) for part in (result[:start], result[end:]))
+    parts = (_SEPARATOR_PATTERN.sub('', part).strip() for part in parts)
+    return "\n\n".join(part for part in parts if part)
+
+
+@traced('ai.parse_response')
+def parse_ai_response(result):
+    """
+    Splits the AI response into the prediction JSON and the analysis text.
+    Returns (analysis_text, prediction_data); raises ValueError if no valid JSON is found.
+    """
+    json_block = find_prediction_json(result)
+    if json_block is None:
+        raise ValueError("Không tìm thấy JSON hợp lệ trong phản hồi của AI.")
+    start, end, prediction_data = json_block
+    return _analysis_text_around(result, start, end), prediction_data
+
+def run_analysis(match_refs, home_team_id, away_team_id, odds, gemini_api_key,
+                 cancel_token=None, report_progress=None, with_squad_values=False) -> dict:
+    """
+    Runs the whole pipeline for two match URLs/IDs and the selected teams and returns a
+    JSON-serializable result. Raises AnalysisError (or JobCancelled) on failure.
+    `with_squad_values` adds the Transfermarkt starting-XI values to the prompt, at the cost
+    of their lookup.
+    """
+    cancel_token = cancel_token or CancelToken()
+    report_progress = report_progress or _no_progress
+    if len(match_refs) != 2:
+        raise AnalysisError("Cần đúng 2 trận đấu cho một phân tích.")
+    match1_url, match2_url = (match_url_from_reference(ref) for ref in match_refs)
+
+    raw_data = scrape_two_matches(
+        match1_url, match2_url, cancel_token,
+        lambda percent, message: report_progress(percent * 0.4, message),
+    )
+    return analyze_raw_data(raw_data, home_team_id, away_team_id, odds, gemini_api_key,
+                            cancel_token, report_progress, with_squad_values)
+
+def analyze_raw_data(raw_data, home_team_id, away_team_id, odds, gemini_api_key,
+                     cancel_token=None, report_progress=None, with_squad_values=False) -> dict:
+    """The part of run_analysis after scraping, for callers that fetch the matches themselves."""
+    cancel_token = cancel_token or CancelToken()
+    report_progress = report_progress or _no_progress
+    home_team = resolve_team(raw_data, home_team_id)
+    away_team = resolve_team(raw_data, away_team_id)
+    if home_team[0] == away_team[0]:
+        raise AnalysisError("Đội nhà và đội khách phải khác nhau.")
+
+    squad_values = None
+    if with_squad_values:
+        report_progress(38, "Đang lấy giá trị đội hình...")
+        squad_values = load_squad_values(raw_data)
+        cancel_token.raise_if_cancelled()
+    report_progress(40, "Đang chuẩn bị dữ liệu phân tích...")
+    precomputed = precompute_analysis_data(raw_data, cancel_token, _no_progress, squad_values)
+    analysis_data = build_analysis_data(precomputed, home_team, away_team)
+
+    worker = Worker(analysis_data, odds, gemini_api_key)
+    ai_response = worker.run(
+        cancel_token,
+        lambda percent, message: report_progress(45 + percent * 0.55, message),
+    )
+
+    result = {
+        'home_team': {'id': home_team[0], 'name': home_team[1]},
+        'away_team': {'id': away_team[0], 'name': away_team[1]},
+        'match_ids': [raw_data['match1']['match_id'], raw_data['match2']['match_id']],
+        'odds': odds,
+        'prediction': None,
+        'analysis_text': None,
+        'ai_response': ai_response,
+    }
+    try:
+        result['analysis_text'], ai_data = parse_ai_response(ai_response)
+        result['prediction'] = ai_data.get('prediction')
+    except (ValueError, json.JSONDecodeError) as e:
+        raise AnalysisError(f"Lỗi khi xử lý phản hồi từ AI: {e}") from e
+    report_progress(100, "Hoàn tất")
+    return result
@@ -0,0 +1,272 @@
+"""
+Local HTTP service sharing one scraping/AI backend between several clients.
+
+Endpoints (JSON):
+    GET  /health
+    GET  /metrics                  per-stage timings in the Prometheus text format
+    GET  /matches/{match}          teams, match facts, stats, lineup, h2h and table of a match
+    GET  /matches/{match}/shots    shotmap of a match; with ?sofascore={event ID or URL} the FotMob
+                                   and SofaScore shots are fetched together and merged
+    POST /predictions              {"matches": [m1, m2], "home_team_id": .., "away_team_id": .., "odds": {..}}
+
+`{match}` is a FotMob match ID or a URL-encoded match URL. Concurrent requests for the same
+match, or for the same fixture and odds, are coalesced: they wait on one scrape and one
+Gemini call instead of starting their own. Scraped matches are also kept in a small cache.
+
+Usage:
+    GEMINI_API_KEY=... python analysis_service.py [--host 127.0.0.1] [--port 8765]
+"""
+import argparse
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from functools import partial
+
+from aiohttp import web
+
+from analysis_core import (
+    AnalysisError, analyze_raw_data, combine_match_data, match_key_from_reference,
+    match_url_from_reference, normalize_odds
+)
+import tracing
+from cancellation import CancelToken
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# Each scrape runs its own Chromium, each prediction a Gemini request
+MAX_CONCURRENT_SCRAPES = 4
+MAX_CONCURRENT_PREDICTIONS = 4
+MATCH_CACHE_SIZE = 64
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; callers arriving while it runs await the
+    same result (or exception). A caller going away does not cancel the shared call.
+    """
+
+    def __init__(self):
+        self._in_flight = {} # key -> asyncio.Task
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key, coro_factory):
+        task = self._in_flight.get(key)
+        if task is None:
+            self.started += 1
+            task = asyncio.ensure_future(coro_factory())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda finished_task: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+
+class AnalysisService:
+    def __init__(self, gemini_api_key, max_scrapes=MAX_CONCURRENT_SCRAPES,
+                 max_predictions=MAX_CONCURRENT_PREDICTIONS):
+        self.gemini_api_key = gemini_api_key
+        self.match_flights = SingleFlight()
+        self.prediction_flights = SingleFlight()
+        self._scrape_slots = asyncio.Semaphore(max_scrapes)
+        self._prediction_slots = asyncio.Semaphore(max_predictions)
+        self._match_cache = OrderedDict() # match key -> scraped match data
+
+    async def get_match(self, reference) -> dict:
+        """Returns the scraped data of a match, sharing one scrape between concurrent callers."""
+        match_key = match_key_from_reference(reference)
+        if match_key in self._match_cache:
+            self._match_cache.move_to_end(match_key)
+            return self._match_cache[match_key]
+        match_url = match_url_from_reference(reference)
+        return await self.match_flights.do(match_key, partial(self._scrape_match, match_key, match_url))
+
+    async def _scrape_match(self, match_key, match_url) -> dict:
+        from football_scraper import get_fotmob_match_data
+
+        async with self._scrape_slots:
+            # The Playwright sync API cannot run on the event loop thread
+            match_data = await asyncio.get_running_loop().run_in_executor(None, get_fotmob_match_data, match_url)
+        if not match_data.get('match_id'):
+            raise AnalysisError(f"Không thể cào dữ liệu trận đấu {match_url}.")
+        # URLs without a #matchId fragment are also cached under the ID found while scraping
+        for key in {match_key, str(match_data['match_id'])}:
+            self._match_cache[key] = match_data
+        while len(self._match_cache) > MATCH_CACHE_SIZE:
+            self._match_cache.popitem(last=False)
+        return match_data
+
+    async def get_merged_shots(self, match_id, sofascore_event_id) -> dict:
+        """FotMob and SofaScore shots of a match merged into one list, shared between concurrent callers."""
+        return await self.match_flights.do(
+            ('merged_shots', match_id, sofascore_event_id),
+            partial(self._fetch_merged_shots, match_id, sofascore_event_id),
+        )
+
+    async def _fetch_merged_shots(self, match_id, sofascore_event_id) -> dict:
+        from football_scraper import fetch_match_shots
+
+        async with self._scrape_slots:
+            try:
+                result = await fetch_match_shots(match_id, sofascore_event_id)
+            except ValueError as e:
+                raise AnalysisError(str(e)) from e
+        return {
+            'match_id': result['match_id'],
+            'sources': result['sources'],
+            # to_json turns the frame's missing values into nulls
+            'shots': json.loads(result['shots_df'].to_json(orient='records')),
+        }
+
+    async def predict(self, match_refs, home_team_id, away_team_id, odds) -> dict:
+        """Runs (or joins) the analysis of a fixture with the given odds."""
+        if len(match_refs) != 2:
+            raise AnalysisError("Cần đúng 2 trận đấu cho một phân tích.")
+        odds = normalize_odds(odds)
+        fixture_key = (
+            tuple(match_key_from_reference(ref) for ref in match_refs),
+            str(home_team_id), str(away_team_id),
+            json.dumps(odds, sort_keys=True),
+        )
+        return await self.prediction_flights.do(
+            fixture_key, partial(self._predict, match_refs, home_team_id, away_team_id, odds)
+        )
+
+    async def _predict(self, match_refs, home_team_id, away_team_id, odds) -> dict:
+        # The two matches go through get_match, so they are shared with /matches requests too
+        match1_data, match2_data = await asyncio.gather(*(self.get_match(ref) for ref in match_refs))
+        raw_data = combine_match_data(match1_data, match2_data)
+        async with self._prediction_slots:
+            return await asyncio.get_running_loop().run_in_executor(None, partial(
+                analyze_raw_data, raw_data, home_team_id, away_team_id, odds,
+                self.gemini_api_key, CancelToken(),
+            ))
+
+    def stats(self) -> dict:
+        return {
+            'cached_matches': len(self._match_cache),
+            'scrapes': {'started': self.match_flights.started, 'coalesced': self.match_flights.coalesced,
+                        'in_flight': self.match_flights.in_flight()},
+            'predictions': {'started': self.prediction_flights.started, 'coalesced': self.prediction_flights.coalesced,
+                            'in_flight': self.prediction_flights.in_flight()},
+        }
+
+
+def _json_response(data, status=200):
+    return web.json_response(data, status=status, dumps=partial(json.dumps, ensure_ascii=False))
+
+
+def _error_response(message, status):
+    return _json_response({'error': message}, status=status)
+
+
+def _match_summary(match_data) -> dict:
+    return {
+        'match_id': match_data['match_id'],
+        'teams': [{'id': team_id, 'name': team_name} for team_id, team_name in match_data['team_data'].items()],
+        'full_data': match_data['full_data'],
+    }
+
+
+async def handle_health(request):
+    return _json_response({'status': 'ok', **request.app['service'].stats()})
+
+
+async def handle_metrics(request):
+    return web.Response(text=tracing.tracer.prometheus_text(), content_type='text/plain', charset='utf-8')
+
+
+async def _fetch_match(request):
+    """Returns (match_data, None) or (None, error response) for the {match} of the request."""
+    reference = request.match_info['match']
+    try:
+        match_url_from_reference(reference)
+    except AnalysisError as e:
+        return None, _error_response(str(e), 400)
+    try:
+        return await request.app['service'].get_match(reference), None
+    except AnalysisError as e:
+        return None, _error_response(str(e), 502)
+
+
+async def handle_match(request):
+    match_data, error = await _fetch_match(request)
+    return error or _json_response(_match_summary(match_data))
+
+
+async def handle_shots(request):
+    if 'sofascore' in request.query:
+        return await handle_merged_shots(request)
+    match_data, error = await _fetch_match(request)
+    return error or _json_response({'match_id': match_data['match_id'], 'shots': match_data['shotmap']})
+
+
+async def handle_merged_shots(request):
+    from football_scraper import get_sofascore_event_id
+
+    match_id = match_key_from_reference(request.match_info['match'])
+    event_id = get_sofascore_event_id(request.query['sofascore'])
+    if not match_id.isdigit() or not event_id:
+        return _error_response("Cần ID (hoặc URL có #matchId) của trận FotMob và ID (hoặc URL có #id:) của trận SofaScore.", 400)
+    try:
+        return _json_response(await request.app['service'].get_merged_shots(match_id, event_id))
+    except AnalysisError as e:
+        return _error_response(str(e), 502)
+
+
+async def handle_prediction(request):
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return _error_response("Nội dung yêu cầu không phải JSON hợp lệ.", 400)
+    if not isinstance(body, dict):
+        return _error_response("Nội dung yêu cầu phải là một JSON object.", 400)
+    missing = [key for key in ('matches', 'home_team_id', 'away_team_id') if key not in body]
+    if missing:
+        return _error_response(f"Thiếu trường: {', '.join(missing)}", 400)
+    try:
+        result = await request.app['service'].predict(
+            body['matches'], body['home_team_id'], body['away_team_id'], body.get('odds')
+        )
+    except AnalysisError as e:
+        return _error_response(str(e), 422)
+    except Exception as e:
+        return _error_response(f"Lỗi khi phân tích: {e}", 500)
+    return _json_response(result)
+
+
+def create_app(gemini_api_key) -> web.Application:
+    app = web.Application()
+
+    async def start_service(app):
+        # Created inside the running loop so its semaphores bind to it
+        app['service'] = AnalysisService(gemini_api_key)
+
+    app.on_startup.append(start_service)
+    app.router.add_get('/health', handle_health)
+    app.router.add_get('/metrics', handle_metrics)
+    app.router.add_get('/matches/{match}', handle_match)
+    app.router.add_get('/matches/{match}/shots', handle_shots)
+    app.router.add_post('/predictions', handle_prediction)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dịch vụ phân tích kèo bóng VTT qua HTTP cục bộ.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--api-key', default=os.environ.get('GEMINI_API_KEY'),
+                        help="Gemini API key (mặc định: biến môi trường GEMINI_API_KEY).")
+    args = parser.parse_args()
+    tracing.configure_from_env()
+    if not args.api_key:
+        print("Cảnh báo: chưa có Gemini API key, /predictions sẽ trả về lỗi.")
+    web.run_app(create_app(args.api_key), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
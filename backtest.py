@@ -0,0 +1,229 @@
+"""
+Scores logged predictions against final results, per prediction engine.
+
+    python backtest.py report [--log data/predictions] [--min-edge 0.05] [--bins 10] [--json]
+    python backtest.py import predictions/            # analysis_cli batch output
+    python backtest.py results 4446402 4446410        # final scores from FotMob
+    python backtest.py result "AC Milan - Roma" 2 1 --played-at 2023-11-12T19:45   # or by hand
+    python backtest.py compact
+
+For every engine (plus 'bookmaker', the fair 1X2 probabilities of the logged odds) the
+report gives the Brier score, log loss, hit rate of the most likely outcome and of the top
+scoreline, a calibration table, and the ROI of staking one unit on every 1X2 selection whose
+expected value is above --min-edge. Everything is computed on whole columns, so 100k+
+predictions take well under a second.
+"""
+import argparse
+import datetime
+import json
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from prediction_log import DEFAULT_LOG_DIR, PredictionLog, prediction_record, settle
+
+OUTCOMES = ('home', 'draw', 'away')
+DEFAULT_CALIBRATION_BINS = 10
+BOOKMAKER_ENGINE = 'bookmaker'
+PROBABILITY_FLOOR = 1e-15 # Keeps log loss finite for outcomes given 0%
+
+
+def with_bookmaker_baseline(settled) -> pd.DataFrame:
+    """Adds a 'bookmaker' row per settled prediction, using the fair probabilities of its 1X2 odds."""
+    from odds_table import remove_overround
+
+    odds = settled[[f'odds_euro_{outcome}' for outcome in OUTCOMES]].to_numpy(dtype=float)
+    priced = ~np.isnan(odds).any(axis=1)
+    if not priced.any():
+        return settled
+    # One baseline per fixture and set of odds, however many engines predicted it
+    baseline = settled[priced].drop_duplicates(['fixture', 'home_goals', 'away_goals', *[f'odds_euro_{outcome}' for outcome in OUTCOMES]]).copy()
+    probabilities, _ = remove_overround(baseline[[f'odds_euro_{outcome}' for outcome in OUTCOMES]].to_numpy(dtype=float))
+    baseline[['p_home', 'p_draw', 'p_away']] = probabilities
+    baseline['engine'] = BOOKMAKER_ENGINE
+    baseline['score_1'] = pd.NA
+    baseline['expected_total_goals'] = np.nan
+    return pd.concat([settled, baseline], ignore_index=True)
+
+
+def evaluate(settled, min_edge=0.0, bins=DEFAULT_CALIBRATION_BINS) -> dict:
+    """{engine: metrics} for settled predictions (see `settle`)."""
+    if settled.empty:
+        return {}
+    settled = settled.dropna(subset=['p_home', 'p_draw', 'p_away']).reset_index(drop=True)
+    probabilities = settled[['p_home', 'p_draw', 'p_away']].to_numpy(dtype=float)
+    outcome = settled['outcome'].to_numpy(dtype=int)
+    rows = np.arange(len(settled))
+    actual = np.zeros_like(probabilities)
+    actual[rows, outcome] = 1.0
+
+    odds = settled[[f'odds_euro_{name}' for name in OUTCOMES]].to_numpy(dtype=float)
+    with np.errstate(invalid='ignore'):
+        # Strictly above: with the default 0 a selection at zero edge is not a value bet
+        stakes = (probabilities * odds - 1 > min_edge) & ~np.isnan(odds)
+    profit = np.where(stakes, np.where(actual == 1, odds - 1, -1.0), 0.0)
+    actual_score = settled['home_goals'].astype('string') + '-' + settled['away_goals'].astype('string')
+
+    per_row = pd.DataFrame({
+        'engine': settled['engine'].fillna('unknown').to_numpy(),
+        'brier': ((probabilities - actual) ** 2).sum(axis=1),
+        'log_loss': -np.log(np.clip(probabilities[rows, outcome], PROBABILITY_FLOOR, 1.0)),
+        'hit': probabilities.argmax(axis=1) == outcome,
+        'score_predicted': settled['score_1'].notna().to_numpy(),
+        'score_hit': (settled['score_1'].str.replace(' ', '', regex=False) == actual_score).fillna(False).to_numpy(dtype=bool),
+        'bets': stakes.sum(axis=1),
+        'profit': profit.sum(axis=1),
+    })
+    grouped = per_row.groupby('engine', sort=True)
+    summary = grouped.agg(
+        predictions=('brier', 'size'), brier=('brier', 'mean'), log_loss=('log_loss', 'mean'), accuracy=('hit', 'mean'),
+        scores_predicted=('score_predicted', 'sum'), score_hits=('score_hit', 'sum'), bets=('bets', 'sum'), profit=('profit', 'sum'),
+    )
+
+    # Calibration pools the three outcome probabilities of every prediction
+    flat_engine = np.repeat(per_row['engine'].to_numpy(), len(OUTCOMES))
+    flat_probability = probabilities.ravel()
+    calibration = pd.DataFrame({
+        'engine': flat_engine,
+        'bin': np.minimum((flat_probability * bins).astype(int), bins - 1),
+        'predicted': flat_probability,
+        'observed': actual.ravel(),
+    }).groupby(['engine', 'bin']).agg(count=('predicted', 'size'), predicted=('predicted', 'mean'), observed=('observed', 'mean'))
+
+    report = {}
+    for engine, metrics in summary.iterrows():
+        engine_calibration = calibration.loc[engine].reset_index()
+        report[engine] = {
+            'predictions': int(metrics['predictions']),
+            'brier': round(float(metrics['brier']), 4),
+            'log_loss': round(float(metrics['log_loss']), 4),
+            'accuracy': round(float(metrics['accuracy']), 4),
+            'score_hit_rate': round(float(metrics['score_hits'] / metrics['scores_predicted']), 4) if metrics['scores_predicted'] else None,
+            'bets': int(metrics['bets']),
+            'profit': round(float(metrics['profit']), 2),
+            'roi': round(float(metrics['profit'] / metrics['bets']), 4) if metrics['bets'] else None,
+            'calibration': [
+                {'bin': f"{row.bin / bins:.2f}-{(row.bin + 1) / bins:.2f}", 'count': int(row.count),
+                 'predicted': round(float(row.predicted), 4), 'observed': round(float(row.observed), 4)}
+                for row in engine_calibration.itertuples()
+            ],
+        }
+    return report
+
+
+def format_report(report, min_edge) -> str:
+    if not report:
+        return "Chưa có dự đoán nào có kết quả để đánh giá."
+    lines = [f"{'Engine':<14}{'Số dự đoán':>11}{'Brier':>8}{'Log loss':>10}{'Đúng 1X2':>10}{'Đúng tỷ số':>12}{'Cược':>7}{'ROI':>9}"]
+    for engine, metrics in report.items():
+        score_hit_rate = f"{metrics['score_hit_rate']:.1%}" if metrics['score_hit_rate'] is not None else "-"
+        roi = f"{metrics['roi']:+.1%}" if metrics['roi'] is not None else "-"
+        lines.append(f"{engine:<14}{metrics['predictions']:>11}{metrics['brier']:>8.4f}{metrics['log_loss']:>10.4f}"
+                     f"{metrics['accuracy']:>10.1%}{score_hit_rate:>12}{metrics['bets']:>7}{roi:>9}")
+    lines.append(f"(ROI: cược 1 đơn vị cho mỗi lựa chọn 1X2 có lợi thế kỳ vọng > {min_edge:.0%})")
+    for engine, metrics in report.items():
+        lines.append(f"\nHiệu chỉnh xác suất - {engine}:")
+        for row in metrics['calibration']:
+            lines.append(f"  {row['bin']}: dự đoán {row['predicted']:.1%}, thực tế {row['observed']:.1%} ({row['count']})")
+    return "\n".join(lines)
+
+
+def command_report(args) -> int:
+    log = PredictionLog(args.log)
+    started = time.perf_counter()
+    settled = settle(log.read(), log.read_results())
+    report = evaluate(with_bookmaker_baseline(settled), args.min_edge, args.bins)
+    elapsed = time.perf_counter() - started
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print(format_report(report, args.min_edge))
+    print(f"{len(settled)} dự đoán đã có kết quả, đánh giá trong {elapsed * 1000:.0f} ms", file=sys.stderr)
+    return 0
+
+
+def command_import(args) -> int:
+    from analysis_cli import load_results
+
+    records = [
+        prediction_record(result['prediction'], result['home_team'], result['away_team'], result.get('odds'), args.engine)
+        for path in args.paths for result in load_results(path)
+        if result.get('prediction') and result.get('home_team') and result.get('away_team')
+    ]
+    count = PredictionLog(args.log).append(records)
+    print(f"Đã ghi {count} dự đoán vào {args.log}", file=sys.stderr)
+    return 0
+
+
+def command_results(args) -> int:
+    from analysis_core import match_key_from_reference
+    from prediction_log import fetch_results
+
+    results, problems = fetch_results([match_key_from_reference(match) for match in args.matches])
+    PredictionLog(args.log).record_results(results)
+    for result in results:
+        print(f"{result['fixture']}: {result['home_goals']}-{result['away_goals']}", file=sys.stderr)
+    for match_id, problem in sorted(problems.items()):
+        print(f"{match_id}: {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+def utc_timestamp(text) -> float:
+    """Unix time of an ISO date/time; times without a zone are UTC."""
+    moment = datetime.datetime.fromisoformat(text)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment.timestamp()
+
+
+def command_result(args) -> int:
+    PredictionLog(args.log).record_results([{
+        'fixture': args.fixture, 'played_at': args.played_at, 'home_goals': args.home_goals, 'away_goals': args.away_goals,
+    }])
+    return 0
+
+
+def command_compact(args) -> int:
+    PredictionLog(args.log).compact()
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Đánh giá các dự đoán đã lưu so với kết quả thực tế.")
+    parser.add_argument('--log', default=DEFAULT_LOG_DIR, help="Thư mục nhật ký dự đoán.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    report = subparsers.add_parser('report', help="Brier, log loss, hiệu chỉnh xác suất và ROI theo từng engine.")
+    report.add_argument('--min-edge', type=float, default=0.0, help="Chỉ mô phỏng cược khi lợi thế kỳ vọng lớn hơn mức này.")
+    report.add_argument('--bins', type=int, default=DEFAULT_CALIBRATION_BINS, help="Số khoảng xác suất của bảng hiệu chỉnh.")
+    report.add_argument('--json', action='store_true', help="In báo cáo dạng JSON.")
+    report.set_defaults(handler=command_report)
+
+    import_ = subparsers.add_parser('import', help="Ghi các kết quả phân tích (output của analysis_cli) vào nhật ký.")
+    import_.add_argument('paths', nargs='+', help="Thư mục output của batch hoặc file JSON kết quả.")
+    import_.add_argument('--engine', default='gemini', help="Tên engine đã tạo các dự đoán.")
+    import_.set_defaults(handler=command_import)
+
+    results = subparsers.add_parser('results', help="Lấy tỷ số chung cuộc từ FotMob.")
+    results.add_argument('matches', nargs='+', help="ID hoặc URL trận FotMob đã kết thúc.")
+    results.set_defaults(handler=command_results)
+
+    result = subparsers.add_parser('result', help="Nhập tay tỷ số chung cuộc của một trận.")
+    result.add_argument('fixture', help='Tên trận dạng "Đội nhà - Đội khách".')
+    result.add_argument('home_goals', type=int)
+    result.add_argument('away_goals', type=int)
+    result.add_argument('--played-at', type=utc_timestamp, required=True,
+                        help="Thời điểm bắt đầu trận (UTC nếu không ghi múi giờ), ví dụ 2023-11-12T19:45.")
+    result.set_defaults(handler=command_result)
+
+    compact = subparsers.add_parser('compact', help="Gộp các phân đoạn nhỏ của nhật ký.")
+    compact.set_defaults(handler=command_compact)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""
+Times each stage of the analysis pipeline on the recorded fixtures, without touching the
+live sites: page/JSON extraction, DataFrame build, format_full_data_for_ai, prompt build,
+AI response parsing, chart rendering and Transfermarkt profile parsing, plus fetches
+through the local stand-in server.
+
+Every run is appended to benchmarks/results/pipeline.jsonl and compared with the previous
+run, so performance changes come with numbers.
+
+Usage:
+    python benchmarks/pipeline_benchmark.py [--repeat 20] [--stages page_extraction,chart_rendering]
+                                            [--browser] [--threshold 10] [--fail-on-regression]
+
+Fixtures are created with benchmarks/record_fixtures.py.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+from record_fixtures import load_manifest, read_fixture
+from standin_server import start_standin_server
+
+DEFAULT_HISTORY = os.path.join(BENCHMARKS_DIR, 'results', 'pipeline.jsonl')
+SAMPLE_ODDS = {
+    'euro': {'home': '2.10', 'draw': '3.40', 'away': '3.30'},
+    'handicap': {'line': '-0.25', 'home': '1.95', 'away': '1.90'},
+    'ou': {'line': '2.5', 'over': '1.90', 'under': '1.95'},
+}
+
+
+class Fixtures:
+    """Loads every recorded payload once, outside the timed sections."""
+
+    def __init__(self):
+        self.manifest = load_manifest()
+        self.match_ids = [match['match_id'] for match in self.manifest['fotmob_matches']][:2]
+        self.match_pages = [read_fixture(f"fotmob_match_{match_id}.html.gz") for match_id in self.match_ids]
+        self.match_details = [read_fixture(f"fotmob_matchDetails_{match_id}.json.gz") for match_id in self.match_ids]
+        event_ids = [event['event_id'] for event in self.manifest['sofascore_events']]
+        self.sofascore_shotmaps = [read_fixture(f"sofascore_shotmap_{event_id}.json.gz") for event_id in event_ids]
+        self.players = self.manifest['transfermarkt_players']
+        self.player_pages = [read_fixture(f"transfermarkt_profile_{player['player_id']}.html.gz") for player in self.players]
+        self.ai_response = read_fixture("ai_response.txt.gz")
+
+
+def build_stages(fixtures: Fixtures, base_url: str, with_browser: bool) -> dict:
+    """Returns {stage name: zero-argument callable}; inputs of a stage are prepared up front."""
+    import pandas as pd
+    import football_scraper
+    from football_scraper import extract_next_data, parse_fotmob_match_page, parse_transfermarkt_profile
+    from analysis_core import Worker, format_full_data_for_ai, parse_ai_response
+    from football_charts import (
+        build_shotmap_figure, build_shot_density_figure, build_win_prob_figure, bin_shots, figure_to_png
+    )
+
+    next_data = [extract_next_data(page) for page in fixtures.match_pages]
+    matches = [parse_fotmob_match_page(data) for data in next_data]
+    home_id, home_name = next(iter(matches[0]['team_data'].items()))
+    away_id, away_name = list(matches[0]['team_data'].items())[-1]
+    summaries = {team_id: format_full_data_for_ai(match['full_data'], team_name)
+                 for match in matches for team_id, team_name in match['team_data'].items()}
+    analysis_data = {
+        'home_team_name': home_name, 'away_team_name': away_name,
+        'home_team_stats_summary': summaries[home_id], 'away_team_stats_summary': summaries[away_id],
+    }
+    combined_shots = pd.concat([match['shots_df'] for match in matches], ignore_index=True)
+    home_shots = combined_shots[combined_shots['teamId'] == home_id]
+    _, prediction_data = parse_ai_response(fixtures.ai_response)
+
+    def page_extraction():
+        for page in fixtures.match_pages:
+            extract_next_data(page)
+
+    def api_json_decode():
+        for payload in fixtures.match_details + fixtures.sofascore_shotmaps:
+            json.loads(payload)
+
+    def match_parse():
+        for data in next_data:
+            parse_fotmob_match_page(data)
+
+    def dataframe_build():
+        frames = [pd.DataFrame(match['shotmap']) for match in matches]
+        combined = pd.concat(frames, ignore_index=True)
+        {team_id: group for team_id, group in combined.groupby('teamId')}
+
+    def format_for_ai():
+        for match in matches:
+            for team_name in match['team_data'].values():
+                format_full_data_for_ai(match['full_data'], team_name)
+
+    def prompt_build():
+        worker = Worker(analysis_data, SAMPLE_ODDS, None)
+        worker.build_stats_prompt()
+        worker.build_odds_prompt()
+        worker.build_prompt()
+
+    def response_parsing():
+        parse_ai_response(fixtures.ai_response)
+
+    def chart_rendering():
+        # Builders are called directly so the chart image cache does not hide the work
+        figure_to_png(build_shotmap_figure(home_shots, home_name, "benchmark"))
+        figure_to_png(build_shot_density_figure(bin_shots(home_shots), home_name, "benchmark", 'xg'))
+        figure_to_png(build_win_prob_figure(prediction_data['prediction'], home_name, away_name))
+
+    def transfermarkt_profile():
+        for player, page in zip(fixtures.players, fixtures.player_pages):
+            parse_transfermarkt_profile(page, player['player_id'])
+
+    def standin_fetch():
+        import requests
+
+        football_scraper.TRANSFERMARKT_BASE_URL = base_url
+        for match_id in fixtures.match_ids:
+            requests.get(f"{base_url}/api/matchDetails?matchId={match_id}").json()
+        for event in fixtures.manifest['sofascore_events']:
+            requests.get(f"{base_url}/api/v1/event/{event['event_id']}/shotmap").json()
+        for player in fixtures.players:
+            football_scraper.get_transfermarkt_player_data(f"{base_url}/{player['slug']}/profil/spieler/{player['player_id']}")
+
+    stages = {
+        'page_extraction': page_extraction,
+        'api_json_decode': api_json_decode,
+        'match_parse': match_parse,
+        'dataframe_build': dataframe_build,
+        'format_full_data_for_ai': format_for_ai,
+        'prompt_build': prompt_build,
+        'response_parsing': response_parsing,
+        'chart_rendering': chart_rendering,
+        'transfermarkt_profile': transfermarkt_profile,
+        'standin_fetch': standin_fetch,
+    }
+    if with_browser:
+        def browser_scrape():
+            for match_id in fixtures.match_ids:
+                football_scraper.get_fotmob_match_data(f"{base_url}/match/{match_id}")
+        stages['browser_scrape'] = browser_scrape
+    return stages
+
+
+def time_stage(fn, repeat: int, warmup: int = 1) -> dict:
+    # Scrapers print progress; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(warmup):
+            fn()
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'median_ms': round(statistics.median(samples), 4),
+        'min_ms': round(samples[0], 4),
+        'p90_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.9))], 4),
+        'repeat': repeat,
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _load_previous(history_path: str):
+    if not os.path.exists(history_path):
+        return None
+    with open(history_path, encoding='utf-8') as f:
+        lines = [line for line in f if line.strip()]
+    return json.loads(lines[-1]) if lines else None
+
+
+def print_report(stages: dict, previous: dict = None, threshold: float = 10.0) -> list:
+    """Prints the stage timings next to the previous run; returns the regressed stage names."""
+    previous_stages = (previous or {}).get('stages', {})
+    regressions = []
+    print(f"{'stage':<26}{'median (ms)':>13}{'min (ms)':>11}{'prev (ms)':>11}{'change':>10}")
+    for name, result in stages.items():
+        if result.get('error'):
+            print(f"{name:<26}{'skipped: ' + result['error']:>45}")
+            continue
+        prev = previous_stages.get(name, {}).get('median_ms')
+        change = ""
+        if prev:
+            percent = (result['median_ms'] - prev) / prev * 100
+            change = f"{percent:+.1f}%"
+            if percent > threshold:
+                change += " !"
+                regressions.append(name)
+        prev_text = f"{prev:.3f}" if prev else "-"
+        print(f"{name:<26}{result['median_ms']:>13.3f}{result['min_ms']:>11.3f}{prev_text:>11}{change:>10}")
+    if regressions:
+        print(f"\nSlower than the previous run by more than {threshold:g}%: {', '.join(regressions)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline per-stage benchmark of the analysis pipeline.")
+    parser.add_argument('--repeat', type=int, default=20, help="Timed runs per stage.")
+    parser.add_argument('--stages', help="Comma-separated subset of stages to run.")
+    parser.add_argument('--browser', action='store_true',
+                        help="Also time get_fotmob_match_data through Chromium against the stand-in.")
+    parser.add_argument('--history', default=DEFAULT_HISTORY, help="JSON lines file the results are appended to.")
+    parser.add_argument('--threshold', type=float, default=10.0, help="Percent slowdown reported as a regression.")
+    parser.add_argument('--fail-on-regression', action='store_true', help="Exit with status 1 on a regression.")
+    args = parser.parse_args()
+
+    fixtures = Fixtures()
+    server, base_url = start_standin_server()
+    try:
+        stages = build_stages(fixtures, base_url, args.browser)
+        selected = args.stages.split(',') if args.stages else list(stages)
+        results = {}
+        for name in selected:
+            if name not in stages:
+                parser.error(f"Unknown stage '{name}'. Available: {', '.join(stages)}")
+            try:
+                results[name] = time_stage(stages[name], 1 if name == 'browser_scrape' else args.repeat)
+            except Exception as e:
+                results[name] = {'error': f"{type(e).__name__}: {str(e).strip().splitlines()[0]}"[:200]}
+    finally:
+        server.shutdown()
+
+    previous = _load_previous(args.history)
+    regressions = print_report(results, previous, args.threshold)
+
+    record = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'revision': _git_revision(),
+        'python': sys.version.split()[0], 'synthetic_fixtures': fixtures.manifest.get('synthetic', False),
+        'stages': results,
+    }
+    os.makedirs(os.path.dirname(args.history), exist_ok=True)
+    with open(args.history, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+
+    if args.fail_on_regression and regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,390 @@
+"""
+Creates the payload fixtures used by the offline benchmarks in benchmarks/fixtures/.
+
+    python benchmarks/record_fixtures.py --synthetic
+        Writes deterministic sample payloads shaped like the FotMob, SofaScore and
+        Transfermarkt responses the scrapers read. Enough to run the suite anywhere.
+
+    python benchmarks/record_fixtures.py --live --fotmob-url URL [--fotmob-url URL]
+                                         [--sofascore-url URL] [--transfermarkt-url URL]
+        Records the real responses (needs network access and a Playwright Chromium).
+
+Every fixture is stored gzip-compressed and listed in fixtures/manifest.json, which the
+stand-in server and the benchmark read.
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARKS_DIR)
+FIXTURES_DIR = os.path.join(BENCHMARKS_DIR, 'fixtures')
+MANIFEST_PATH = os.path.join(FIXTURES_DIR, 'manifest.json')
+
+TEAM_NAMES = [
+    "AC Milan", "Roma", "Inter", "Juventus", "Napoli", "Lazio", "Atalanta", "Fiorentina",
+    "Bologna", "Torino", "Monza", "Genoa", "Lecce", "Udinese", "Cagliari", "Empoli",
+    "Verona", "Frosinone", "Sassuolo", "Salernitana",
+]
+SHOT_EVENT_TYPES = ['Miss', 'AttemptSaved', 'Miss', 'AttemptSaved', 'Post', 'Goal']
+STAT_SECTIONS = {
+    'Top stats': ['Ball possession', 'Expected goals (xG)', 'Total shots', 'Big chances', 'Accurate passes', 'Fouls committed', 'Corners'],
+    'Shots': ['Total shots', 'Shots off target', 'Shots on target', 'Blocked shots', 'Hit woodwork', 'Shots inside box', 'Shots outside box'],
+    'Expected goals (xG)': ['Expected goals (xG)', 'xG open play', 'xG set play', 'Non-penalty xG', 'xG on target (xGOT)'],
+    'Passes': ['Passes', 'Accurate passes', 'Own half', 'Opposition half', 'Accurate long balls', 'Accurate crosses', 'Throws'],
+    'Defence': ['Tackles won', 'Interceptions', 'Blocks', 'Clearances', 'Keeper saves'],
+    'Duels': ['Duels won', 'Ground duels won', 'Aerial duels won', 'Successful dribbles'],
+    'Discipline': ['Yellow cards', 'Red cards'],
+}
+
+
+def fixture_path(name: str) -> str:
+    return os.path.join(FIXTURES_DIR, name)
+
+
+def write_fixture(name: str, content):
+    """Stores `content` (str, bytes or JSON-serializable) gzip-compressed."""
+    if not isinstance(content, (str, bytes)):
+        content = json.dumps(content, ensure_ascii=False, separators=(',', ':'))
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    with gzip.open(fixture_path(name), 'wb', compresslevel=9) as f:
+        f.write(content)
+
+
+def read_fixture(name: str, as_json: bool = False):
+    with gzip.open(fixture_path(name), 'rb') as f:
+        content = f.read()
+    return json.loads(content) if as_json else content.decode('utf-8')
+
+
+def load_manifest() -> dict:
+    with open(MANIFEST_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def next_data_page(next_data: dict, title: str) -> str:
+    """Wraps a `__NEXT_DATA__` payload in a minimal Next.js page."""
+    return (
+        f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{title}</title></head><body>"
+        f"<div id=\"__next\"><main><h1>{title}</h1></main></div>"
+        f"<script id=\"__NEXT_DATA__\" type=\"application/json\">{json.dumps(next_data, ensure_ascii=False)}</script>"
+        f"</body></html>"
+    )
+
+
+# --- Synthetic payloads ---
+
+def _player(rng, player_id, team_id, shirt):
+    first, last = rng.choice(["Marco", "Luca", "Rafael", "Theo", "Paulo", "Romelu"]), f"Player{player_id}"
+    return {
+        'id': player_id, 'name': f"{first} {last}", 'firstName': first, 'lastName': last,
+        'teamId': team_id, 'shirtNumber': str(shirt), 'positionId': rng.randint(1, 11),
+        'usualPlayingPositionId': rng.randint(0, 3), 'isCaptain': shirt == 10,
+        'rating': {'num': f"{rng.uniform(5.5, 9.0):.1f}", 'isTop': {'isMatchFinished': True}},
+        'performance': {'events': [], 'substitutionEvents': [], 'playerOfTheMatch': False},
+        'horizontalLayout': {'x': rng.random(), 'y': rng.random(), 'height': 0.2, 'width': 0.2},
+        'verticalLayout': {'x': rng.random(), 'y': rng.random(), 'height': 0.2, 'width': 0.2},
+        'countryName': rng.choice(["Italy", "Brazil", "France", "Portugal"]), 'countryCode': "ITA",
+    }
+
+
+def _fotmob_shots(rng, match_id, home, away, count):
+    shots = []
+    for index in range(count):
+        team_id, player_id = (home['id'], rng.randint(1000, 1010)) if rng.random() < 0.55 else (away['id'], rng.randint(2000, 2010))
+        event_type = rng.choice(SHOT_EVENT_TYPES)
+        xg = round(min(0.95, rng.expovariate(1 / 0.11)), 4)
+        shots.append({
+            'id': match_id * 1000 + index, 'eventType': event_type, 'teamId': team_id,
+            'playerId': player_id, 'playerName': f"Player{player_id}",
+            'x': round(rng.uniform(62, 99.5), 2), 'y': round(rng.uniform(8, 92), 2),
+            'min': rng.randint(1, 90), 'minAdded': None, 'isBlocked': event_type == 'Miss' and rng.random() < 0.3,
+            'isOnTarget': event_type in ('Goal', 'AttemptSaved'), 'blockedX': None, 'blockedY': None,
+            'goalCrossedY': round(rng.uniform(30, 40), 2), 'goalCrossedZ': round(rng.uniform(0, 3), 2),
+            'expectedGoals': xg, 'expectedGoalsOnTarget': xg * 1.3 if event_type in ('Goal', 'AttemptSaved') else None,
+            'shotType': rng.choice(['RightFoot', 'LeftFoot', 'Header']),
+            'situation': rng.choice(['RegularPlay', 'FromCorner', 'SetPiece', 'FastBreak']),
+            'period': 'FirstHalf' if index < count / 2 else 'SecondHalf', 'isOwnGoal': False,
+            'onGoalShot': {'x': round(rng.uniform(0, 2), 3), 'y': round(rng.uniform(0, 0.66), 3), 'zoomRatio': 1},
+            'isSavedOffLine': False, 'isFromInsideBox': rng.random() < 0.7,
+            'firstName': "Player", 'lastName': str(player_id), 'fullName': f"Player{player_id}",
+            'teamColor': '#c8102e' if team_id == home['id'] else '#8b0304',
+        })
+    return shots
+
+
+def _fotmob_content(rng, match_id, home, away, table_teams):
+    shots = _fotmob_shots(rng, match_id, home, away, rng.randint(22, 34))
+    goals = [shot for shot in shots if shot['eventType'] == 'Goal']
+    stats_sections = []
+    for title, keys in STAT_SECTIONS.items():
+        stats_sections.append({
+            'title': title, 'key': title.lower().replace(' ', '_'),
+            'teamNames': [home['name'], away['name']], 'teamColors': {'home': '#c8102e', 'away': '#8b0304'},
+            'stats': [{'title': key, 'key': key, 'stats': [rng.randint(0, 600), rng.randint(0, 600)],
+                       'type': 'text', 'highlighted': rng.choice(['home', 'away', 'equal'])} for key in keys],
+        })
+    lineup = []
+    for team, first_player_id in ((home, 1000), (away, 2000)):
+        players = [_player(rng, first_player_id + shirt, team['id'], shirt) for shirt in range(1, 21)]
+        lineup.append({
+            'teamId': team['id'], 'teamName': team['name'], 'formation': rng.choice(['4-3-3', '4-2-3-1', '3-5-2']),
+            'players': [players[:1], players[1:5], players[5:8], players[8:11]], 'bench': players[11:],
+            'coach': {'id': team['id'] + 9000, 'name': f"Coach {team['name']}"},
+        })
+    player_stats = {
+        str(player_id): {
+            'name': f"Player{player_id}", 'id': player_id, 'teamId': home['id'] if player_id < 2000 else away['id'],
+            'stats': [{'title': section, 'key': section.lower(), 'stats': {
+                stat: {'key': stat, 'stat': {'value': rng.randint(0, 90), 'total': rng.randint(0, 90), 'type': 'fractionWithPercentage'}}
+                for stat in STAT_SECTIONS['Top stats'] + STAT_SECTIONS['Passes']
+            }} for section in ('Top stats', 'Attack', 'Defense', 'Duels')],
+        }
+        for player_id in list(range(1001, 1015)) + list(range(2001, 2015))
+    }
+    h2h_matches = []
+    for index in range(20):
+        first, second = (home, away) if index % 2 else (away, home)
+        h2h_matches.append({
+            'time': {'utcTime': f"20{10 + index // 2}-0{1 + index % 9}-15T18:45:00Z"},
+            'matchUrl': f"/matches/{index}", 'home': {'id': first['id'], 'name': first['name']},
+            'away': {'id': second['id'], 'name': second['name']},
+            'score': f"{rng.randint(0, 3)} - {rng.randint(0, 3)}", 'winner': rng.choice(['home', 'away', None]),
+            'league': {'name': "Serie A", 'id': 55},
+        })
+    table_rows = []
+    for position, team in enumerate(table_teams, start=1):
+        wins, draws = rng.randint(5, 25), rng.randint(2, 12)
+        table_rows.append({
+            'name': team['name'], 'shortName': team['name'][:3].upper(), 'id': team['id'], 'idx': position,
+            'played': 38, 'wins': wins, 'draws': draws, 'losses': 38 - wins - draws,
+            'scoresStr': f"{rng.randint(20, 80)}-{rng.randint(20, 80)}", 'goalConDiff': rng.randint(-40, 50),
+            'goalDifference': rng.randint(-40, 50), 'pts': wins * 3 + draws, 'qualColor': None,
+        })
+    content = {
+        'matchFacts': {
+            'matchId': match_id, 'goals': [{'scorerName': shot['playerName'], 'timeStr': f"{shot['min']}'",
+                                            'isOwnGoal': False, 'teamId': shot['teamId']} for shot in goals],
+            'events': {'events': [{'type': rng.choice(['Card', 'Substitution', 'Goal']), 'time': minute,
+                                   'playerId': rng.randint(1000, 2020)} for minute in range(1, 91, 3)]},
+            'momentum': {'main': {'data': [{'minute': minute, 'value': rng.randint(-100, 100)} for minute in range(1, 91)]}},
+        },
+        'stats': {'stats': stats_sections},
+        'lineup': {'lineup': lineup},
+        'h2h': {'summary': [8, 6, 6], 'matches': h2h_matches},
+        'shotmap': {'shots': shots, 'Periods': {'All': shots}},
+        'playerStats': player_stats,
+    }
+    table = {'tables': [{'leagueName': "Serie A", 'table': {'all': table_rows, 'home': table_rows, 'away': table_rows}}]}
+    return content, table
+
+
+def synthetic_fotmob_match(rng, match_id, home, away, table_teams):
+    """Returns (next_data, match_details) for one synthetic FotMob match."""
+    content, table = _fotmob_content(rng, match_id, home, away, table_teams)
+    general = {
+        'matchId': str(match_id), 'matchName': f"{home['name']}-vs-{away['name']}", 'matchRound': "12",
+        'leagueId': 55, 'leagueName': "Serie A", 'homeTeam': home, 'awayTeam': away,
+        'matchTimeUTC': "Sun, Nov 12, 2023, 19:45 UTC", 'started': True, 'finished': True,
+    }
+    next_data = {
+        'props': {'pageProps': {'general': general, 'content': content, 'tableData': table,
+                                'header': {'teams': [home, away], 'status': {'finished': True}}}},
+        'page': "/matches/[...slug]", 'query': {'slug': [str(match_id)]}, 'buildId': "synthetic",
+    }
+    match_details = {'general': general, 'content': content, 'header': next_data['props']['pageProps']['header']}
+    return next_data, match_details
+
+
+def synthetic_sofascore_shotmap(rng, count):
+    shots = []
+    for index in range(count):
+        shot_type = rng.choice(['miss', 'save', 'block', 'post', 'goal', 'miss'])
+        time_minute = rng.randint(1, 90)
+        shots.append({
+            'player': {'name': f"Player{index % 11}", 'slug': f"player{index % 11}", 'shortName': f"P. {index % 11}",
+                       'position': rng.choice(['F', 'M', 'D']), 'id': 800000 + index % 22},
+            'isHome': rng.random() < 0.5, 'shotType': shot_type,
+            'situation': rng.choice(['regular', 'assisted', 'corner', 'set-piece', 'fast-break']),
+            'playerCoordinates': {'x': round(rng.uniform(1, 35), 1), 'y': round(rng.uniform(10, 90), 1), 'z': 0},
+            'bodyPart': rng.choice(['right-foot', 'left-foot', 'head']),
+            'goalMouthLocation': rng.choice(['low-centre', 'high-left', 'close-right']),
+            'goalMouthCoordinates': {'x': 0, 'y': round(rng.uniform(40, 60), 1), 'z': round(rng.uniform(0, 40), 1)},
+            'xg': round(min(0.95, rng.expovariate(1 / 0.11)), 4), 'xgot': round(rng.random() * 0.5, 4),
+            'id': 4000000 + index, 'time': time_minute, 'timeSeconds': time_minute * 60,
+            'incidentType': 'shot',
+        })
+    return {'shotmap': shots}
+
+
+def synthetic_transfermarkt_profile(rng, player_id, player_name) -> str:
+    """A profile page with the header and info-box the scraper reads, plus typical page bulk."""
+    navigation = '\n'.join(f'<li class="navigation__item"><a href="/section/{i}">Section {i}</a><ul>'
+                         + '\n'.join(f'<li><a href="/section/{i}/{j}">Entry {j}</a></li>' for j in range(25))
+                         + '</ul></li>' for i in range(30))
+    info_rows = [
+        ("Date of birth/Age:", "Jul 21, 2000 (23)"), ("Place of birth:", "Leeds ,"),
+        ("Height:", "1,95m"), ("Citizenship:", "Norway England"), ("Position:", "Attack - Centre-Forward"),
+        ("Foot:", "left"), ("Player agent:", "Rafaela Pimenta\n"), ("Current club:", "Manchester City"),
+        ("Joined:", "Jul 1, 2022"), ("Contract expires: ", "Jun 30, 2034"), ("Outfitter:", "Nike"),
+    ]
+    info_box = '\n'.join(f'<span class="info-table__content info-table__content--regular">{label}</span>'
+                       f'\n<span class="info-table__content info-table__content--bold">{value}</span>'
+                       for label, value in info_rows)
+    tables = '\n'.join(f'<div class="box"><h2>Stats {i}</h2><table class="items"><tbody>'
+                     + '\n'.join(f'<tr><td>{rng.randint(0, 50)}</td><td>Competition {j}</td><td>{rng.randint(0, 3000)}\'</td></tr>'
+                               for j in range(40))
+                     + '</tbody></table></div>' for i in range(12))
+    scripts = ''.join(f'<script>window.__chunk{i} = "{"x" * 2000}";</script>' for i in range(20))
+    return (
+        f'<!DOCTYPE html><html lang="en"><head><title>{player_name} - Player profile</title>{scripts}</head><body>'
+        f'<header><nav><ul>{navigation}</ul></nav></header><main>'
+        f'<header class="data-header"><h1 class="data-header__headline-wrapper">'
+        f'<span class="data-header__shirt-number">#9</span>\n{player_name}</h1></header>'
+        f'<div class="info-table info-table--right-space">{info_box}</div>{tables}</main>'
+        f'<footer>{navigation}</footer></body></html>'
+    )
+
+
+def synthetic_ceapi(rng, player_id):
+    market_values = [{'x': 1500000000000 + i * 15552000000, 'y': 5000000 * (i + 1), 'mw': f"€{5 * (i + 1)}.00m",
+                      'datum_mw': f"Jan 1, {2016 + i // 2}", 'verein': "Club", 'age': str(16 + i // 2), 'wappen': ""}
+                     for i in range(16)]
+    return {
+        'marketValueDevelopment/graph': {'list': market_values, 'current': market_values[-1]['mw'],
+                                         'highest': market_values[-1]['mw'], 'highest_date': market_values[-1]['datum_mw']},
+        'transferHistory/list': {'transfers': [{'url': f"/transfer/{i}", 'season': f"{16 + i}/{17 + i}",
+                                                'date': f"Jul 1, {2016 + i}", 'from': {'clubName': f"Club {i}"},
+                                                'to': {'clubName': f"Club {i + 1}"}, 'marketValue': "€50.00m",
+                                                'fee': "€60.00m"} for i in range(6)]},
+        'performance': [{'competitionId': f"C{i}", 'season': f"{16 + i // 3}/{17 + i // 3}", 'gamesPlayed': rng.randint(0, 38),
+                         'goalsScored': rng.randint(0, 36), 'assists': rng.randint(0, 10)} for i in range(24)],
+    }
+
+
+AI_RESPONSE = """```json
+{
+  "prediction": {
+    "home_team_win_prob_pct": 46,
+    "draw_prob_pct": 27,
+    "away_team_win_prob_pct": 27,
+    "expected_total_goals": 2.7,
+    "best_bet": "AC Milan -0.5",
+    "confidence_level": "Medium",
+    "score_probabilities": [
+      { "score": "2-1", "probability_pct": 12 },
+      { "score": "1-1", "probability_pct": 11 },
+      { "score": "1-0", "probability_pct": 9 }
+    ]
+  }
+}
+```
+---
+""" + "\n\n".join(f"{i}. **Phần {i}:** " + "Phân tích chi tiết về phong độ, lối chơi và kèo. " * 40 for i in range(1, 6))
+
+
+def record_synthetic():
+    rng = random.Random(20231112)
+    teams = [{'id': 8564 + index * 7, 'name': name, 'shortName': name[:3].upper()} for index, name in enumerate(TEAM_NAMES)]
+    manifest = {'synthetic': True, 'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'fotmob_matches': [],
+                'sofascore_events': [], 'transfermarkt_players': []}
+
+    for match_id, (home, away) in ((4446402, (teams[0], teams[1])), (4446410, (teams[2], teams[0]))):
+        next_data, match_details = synthetic_fotmob_match(rng, match_id, home, away, teams)
+        write_fixture(f"fotmob_match_{match_id}.html.gz", next_data_page(next_data, f"{home['name']} vs {away['name']}"))
+        write_fixture(f"fotmob_matchDetails_{match_id}.json.gz", match_details)
+        manifest['fotmob_matches'].append({'match_id': match_id, 'home_team_id': home['id'], 'away_team_id': away['id']})
+
+    event_id = 11369362
+    write_fixture(f"sofascore_shotmap_{event_id}.json.gz", synthetic_sofascore_shotmap(rng, 28))
+    manifest['sofascore_events'].append({'event_id': event_id, 'fotmob_match_id': 4446402})
+
+    player_id, player_name = '418560', "Erling Haaland"
+    write_fixture(f"transfermarkt_profile_{player_id}.html.gz", synthetic_transfermarkt_profile(rng, player_id, player_name))
+    for endpoint, payload in synthetic_ceapi(rng, player_id).items():
+        write_fixture(f"transfermarkt_ceapi_{endpoint.replace('/', '_')}_{player_id}.json.gz", payload)
+    manifest['transfermarkt_players'].append({'player_id': player_id, 'slug': 'erling-haaland'})
+
+    write_fixture("ai_response.txt.gz", AI_RESPONSE)
+    return manifest
+
+
+def record_live(fotmob_urls, sofascore_urls, transfermarkt_urls):
+    """Records real responses; needs network access and `playwright install chromium`."""
+    import requests
+    from playwright.sync_api import sync_playwright
+
+    sys.path.insert(0, REPO_ROOT)
+    from football_scraper import extract_next_data, parse_fotmob_match_page
+
+    manifest = {'synthetic': False, 'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'fotmob_matches': [],
+                'sofascore_events': [], 'transfermarkt_players': []}
+    headers = {'user-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36'}
+    with sync_playwright() as p:
+        browser = p.chromium.launch()
+        page = browser.new_page()
+        for url in fotmob_urls:
+            page.goto(url, wait_until="domcontentloaded", timeout=60000)
+            html = page.content()
+            match_data = parse_fotmob_match_page(extract_next_data(html))
+            match_id = int(match_data['match_id'])
+            write_fixture(f"fotmob_match_{match_id}.html.gz", html)
+            page.goto(f"https://www.fotmob.com/api/matchDetails?matchId={match_id}", timeout=60000)
+            write_fixture(f"fotmob_matchDetails_{match_id}.json.gz", page.locator('body').inner_text())
+            team_ids = list(match_data['team_data'])
+            manifest['fotmob_matches'].append({'match_id': match_id, 'home_team_id': team_ids[0], 'away_team_id': team_ids[-1]})
+        for url in sofascore_urls:
+            page.goto(url, wait_until="domcontentloaded", timeout=30000)
+            event_id = extract_next_data(page.content())['props']['pageProps']['event']['id']
+            api_data = page.evaluate("async (url) => { const r = await fetch(url); return await r.json(); }",
+                                     f"https://api.sofascore.com/api/v1/event/{event_id}/shotmap")
+            write_fixture(f"sofascore_shotmap_{event_id}.json.gz", api_data)
+            manifest['sofascore_events'].append({'event_id': event_id, 'fotmob_match_id': None})
+        browser.close()
+
+    for url in transfermarkt_urls:
+        player_id, slug = url.rstrip('/').split('/')[-1], url.split('/')[3]
+        write_fixture(f"transfermarkt_profile_{player_id}.html.gz", requests.get(url, headers=headers).content)
+        for endpoint, api_url in (
+            ('marketValueDevelopment/graph', f"https://www.transfermarkt.us/ceapi/marketValueDevelopment/graph/{player_id}"),
+            ('transferHistory/list', f"https://www.transfermarkt.us/ceapi/transferHistory/list/{player_id}"),
+            ('performance', f"https://www.transfermarkt.us/ceapi/player/{player_id}/performance"),
+        ):
+            write_fixture(f"transfermarkt_ceapi_{endpoint.replace('/', '_')}_{player_id}.json.gz",
+                          requests.get(api_url, headers=headers).content)
+        manifest['transfermarkt_players'].append({'player_id': player_id, 'slug': slug})
+
+    if not os.path.exists(fixture_path("ai_response.txt.gz")):
+        write_fixture("ai_response.txt.gz", AI_RESPONSE)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record payload fixtures for the offline benchmarks.")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--synthetic', action='store_true', help="Write deterministic sample payloads.")
+    mode.add_argument('--live', action='store_true', help="Record the real sites (needs network).")
+    parser.add_argument('--fotmob-url', action='append', default=[])
+    parser.add_argument('--sofascore-url', action='append', default=[])
+    parser.add_argument('--transfermarkt-url', action='append', default=[])
+    args = parser.parse_args()
+
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    if args.synthetic:
+        manifest = record_synthetic()
+    else:
+        if len(args.fotmob_url) < 2:
+            parser.error("--live needs at least two --fotmob-url values (one analysis uses two matches).")
+        manifest = record_live(args.fotmob_url, args.sofascore_url, args.transfermarkt_url)
+    with open(MANIFEST_PATH, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Fixtures written to {FIXTURES_DIR}")
+
+
+if __name__ == '__main__':
+    main()
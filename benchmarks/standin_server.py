@@ -0,0 +1,105 @@
+"""
+Local stand-in for FotMob, SofaScore and Transfermarkt that serves the recorded fixtures,
+so the scrapers can be exercised without touching the live sites.
+
+    python benchmarks/standin_server.py [--port 8799]
+
+then point the scrapers at it:
+
+    FOTMOB_BASE_URL=http://127.0.0.1:8799 SOFASCORE_API_BASE_URL=http://127.0.0.1:8799 \\
+    TRANSFERMARKT_BASE_URL=http://127.0.0.1:8799 python ...
+
+Routes:
+    /match/{matchId}, /matches/{slug}/{code}#{matchId}   FotMob match page (__NEXT_DATA__)
+    /api/matchDetails?matchId={matchId}                  FotMob matchDetails JSON
+    /api/v1/event/{eventId}/shotmap                      SofaScore shotmap JSON
+    /{slug}/profil/spieler/{playerId}                    Transfermarkt profile page
+    /ceapi/marketValueDevelopment/graph/{playerId}       Transfermarkt ceapi JSON
+    /ceapi/transferHistory/list/{playerId}
+    /ceapi/player/{playerId}/performance
+"""
+import argparse
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from record_fixtures import fixture_path, load_manifest
+
+DEFAULT_PORT = 8799
+
+# (path pattern, fixture name template, content type)
+ROUTES = [
+    (re.compile(r'^/match/(?P<id>\d+)$'), "fotmob_match_{id}.html.gz", 'text/html; charset=utf-8'),
+    (re.compile(r'^/api/v1/event/(?P<id>\d+)/shotmap$'), "sofascore_shotmap_{id}.json.gz", 'application/json'),
+    (re.compile(r'^/[^/]+/profil/spieler/(?P<id>\d+)$'), "transfermarkt_profile_{id}.html.gz", 'text/html; charset=utf-8'),
+    (re.compile(r'^/ceapi/marketValueDevelopment/graph/(?P<id>\d+)$'),
+     "transfermarkt_ceapi_marketValueDevelopment_graph_{id}.json.gz", 'application/json'),
+    (re.compile(r'^/ceapi/transferHistory/list/(?P<id>\d+)$'),
+     "transfermarkt_ceapi_transferHistory_list_{id}.json.gz", 'application/json'),
+    (re.compile(r'^/ceapi/player/(?P<id>\d+)/performance$'),
+     "transfermarkt_ceapi_performance_{id}.json.gz", 'application/json'),
+]
+
+
+def _resolve(path: str, query: dict, known_match_ids):
+    """Returns (fixture name, content type) for a request, or None."""
+    if path == '/api/matchDetails' and query.get('matchId'):
+        return f"fotmob_matchDetails_{query['matchId'][0]}.json.gz", 'application/json'
+    # Browsers do not send the #matchId fragment, so slug URLs map to the only or first recorded match
+    if path.startswith('/matches/') and known_match_ids:
+        return f"fotmob_match_{known_match_ids[0]}.html.gz", 'text/html; charset=utf-8'
+    for pattern, name_template, content_type in ROUTES:
+        match = pattern.match(path)
+        if match:
+            return name_template.format(**match.groupdict()), content_type
+    return None
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    known_match_ids = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        resolved = _resolve(url.path, parse_qs(url.query), self.known_match_ids)
+        if not resolved or not os.path.exists(fixture_path(resolved[0])):
+            self.send_error(404, "No recorded fixture for this URL")
+            return
+        name, content_type = resolved
+        with open(fixture_path(name), 'rb') as f:
+            body = f.read()
+        # Fixtures are stored gzipped; serve them as-is with Content-Encoding like the real sites
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_standin_server(port: int = 0):
+    """Starts the server on a background thread; returns (server, base_url). Port 0 picks a free port."""
+    StandInHandler.known_match_ids = [match['match_id'] for match in load_manifest().get('fotmob_matches', [])]
+    server = ThreadingHTTPServer(('127.0.0.1', port), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the recorded fixtures as a local stand-in for the live sites.")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    server, base_url = start_standin_server(args.port)
+    print(f"Stand-in server on {base_url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
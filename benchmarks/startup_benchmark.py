@@ -0,0 +1,120 @@
+"""
+Measures the cold start cost of the app: import time of each heavy module in a fresh
+interpreter and the time until the main window is shown.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--repeat 5] [--history benchmarks/results/startup.jsonl]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    'PyQt6.QtWidgets',
+    'numpy',
+    'pandas',
+    'matplotlib',
+    'mplsoccer',
+    'bs4',
+    'requests',
+    'playwright.sync_api',
+    'playwright.async_api',
+    'google.generativeai',
+    'football_charts',
+    'football_scraper',
+    'main_app_v2',
+]
+
+IMPORT_SNIPPET = """
+import time, warnings
+warnings.simplefilter('ignore')
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+WINDOW_SNIPPET = """
+import time
+start = time.perf_counter()
+import sys
+from PyQt6.QtWidgets import QApplication
+import main_app_v2
+app = QApplication(sys.argv)
+window = main_app_v2.ScraperApp()
+window.show()
+app.processEvents()
+print(time.perf_counter() - start)
+"""
+
+
+def _run_snippet(snippet: str) -> float:
+    """Runs a snippet in a fresh interpreter and returns the number of seconds it printed."""
+    env = dict(os.environ)
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    result = subprocess.run(
+        [sys.executable, '-c', snippet], cwd=REPO_ROOT, env=env,
+        capture_output=True, text=True, check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def measure(repeat: int) -> dict:
+    results = {'imports': {}, 'window_shown': None}
+    for module in MODULES:
+        try:
+            samples = [_run_snippet(IMPORT_SNIPPET.format(module=module)) for _ in range(repeat)]
+            results['imports'][module] = statistics.median(samples)
+        except subprocess.CalledProcessError:
+            results['imports'][module] = None # Not installed in this environment
+    try:
+        results['window_shown'] = statistics.median(_run_snippet(WINDOW_SNIPPET) for _ in range(repeat))
+    except subprocess.CalledProcessError as e:
+        print(f"Could not start the window: {e.stderr.strip().splitlines()[-1] if e.stderr else e}")
+    return results
+
+
+def _load_previous(history_path: str):
+    if not history_path or not os.path.exists(history_path):
+        return None
+    with open(history_path, encoding='utf-8') as f:
+        lines = [line for line in f if line.strip()]
+    return json.loads(lines[-1]) if lines else None
+
+
+def print_report(results: dict, previous: dict = None):
+    previous_imports = (previous or {}).get('imports', {})
+    print(f"{'module':<24}{'import (ms)':>14}{'prev (ms)':>12}")
+    for module, seconds in results['imports'].items():
+        current = f"{seconds * 1000:.1f}" if seconds is not None else "n/a"
+        prev_seconds = previous_imports.get(module)
+        prev = f"{prev_seconds * 1000:.1f}" if prev_seconds is not None else "-"
+        print(f"{module:<24}{current:>14}{prev:>12}")
+    if results['window_shown'] is not None:
+        print(f"\nWindow shown after {results['window_shown'] * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time benchmark for kèo bóng VTT.")
+    parser.add_argument('--repeat', type=int, default=5, help="Fresh interpreter runs per measurement.")
+    parser.add_argument('--history', default=os.path.join(REPO_ROOT, 'benchmarks', 'results', 'startup.jsonl'),
+                        help="JSON lines file the results are appended to.")
+    args = parser.parse_args()
+
+    previous = _load_previous(args.history)
+    results = measure(args.repeat)
+    print_report(results, previous)
+
+    record = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': sys.version.split()[0], **results}
+    os.makedirs(os.path.dirname(args.history), exist_ok=True)
+    with open(args.history, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+if __name__ == '__main__':
+    main()
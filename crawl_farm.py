@@ -0,0 +1,225 @@
+"""
+Crawls many FotMob matches in parallel into a local MatchStore, e.g. a whole league season.
+
+    python crawl_farm.py match_ids.txt [--store data/matches] [--workers 16]
+
+Each worker process owns one Chromium and pulls match IDs from a shared queue, so faster
+workers simply take more matches. The coordinator tracks which match every worker is on,
+restarts workers that crash (re-queuing their match up to --max-attempts times), recycles
+workers after --matches-per-worker matches to bound browser memory, and reports throughput.
+Matches already in the store are skipped, so an interrupted crawl can be resumed.
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from collections import Counter
+
+from analysis_core import match_key_from_reference
+from match_store import MatchStore
+
+DEFAULT_STORE_DIR = os.path.join('data', 'matches')
+# Chromium grows over hundreds of pages; a fresh worker process releases everything
+DEFAULT_MATCHES_PER_WORKER = 200
+DEFAULT_MAX_ATTEMPTS = 3
+PROGRESS_INTERVAL = 10 # Seconds between progress reports
+SHUTDOWN_TIMEOUT = 30
+
+
+def _worker_main(worker_index, tasks, events, store_dir, max_matches):
+    """Worker process: scrapes match IDs from `tasks` with one browser and reports on `events`."""
+    from playwright.sync_api import sync_playwright
+    import football_scraper
+
+    store = MatchStore(store_dir)
+    # The scraper prints every step; with dozens of workers that is only noise
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), sync_playwright() as p:
+        browser = p.chromium.launch()
+        for _ in range(max_matches):
+            match_id = tasks.get()
+            if match_id is None:
+                break
+            events.put(('started', worker_index, match_id))
+            if not browser.is_connected():
+                browser = p.chromium.launch()
+            start = time.perf_counter()
+            match_data = football_scraper.get_fotmob_match_data(
+                f"{football_scraper.FOTMOB_BASE_URL}/match/{match_id}", browser=browser
+            )
+            if match_data.get('match_id'):
+                store.save(match_data)
+                events.put(('done', worker_index, match_id, time.perf_counter() - start))
+            else:
+                events.put(('failed', worker_index, match_id, "Không lấy được dữ liệu trận đấu."))
+        browser.close()
+
+
+class CrawlFarm:
+    def __init__(self, store_dir=DEFAULT_STORE_DIR, workers=None, matches_per_worker=DEFAULT_MATCHES_PER_WORKER,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, report=print):
+        self.store = MatchStore(store_dir)
+        self.workers = workers or os.cpu_count() or 1
+        self.matches_per_worker = matches_per_worker
+        self.max_attempts = max_attempts
+        self.report = report
+        # Spawned workers do not inherit the coordinator's threads and locks
+        self._context = multiprocessing.get_context('spawn')
+
+    def run(self, match_ids) -> dict:
+        """Crawls the matches not in the store yet; returns a summary of the crawl."""
+        requested = list(dict.fromkeys(str(match_id) for match_id in match_ids))
+        pending = [match_id for match_id in requested if match_id not in self.store]
+        summary = {
+            'requested': len(requested), 'skipped': len(requested) - len(pending), 'scraped': 0,
+            'failed': {}, 'restarts': 0, 'elapsed_s': 0.0, 'matches_per_minute': 0.0, 'workers': {},
+        }
+        if not pending:
+            return summary
+
+        self._tasks = self._context.Queue()
+        self._events = self._context.Queue()
+        for match_id in pending:
+            self._tasks.put(match_id)
+        self._remaining = set(pending)
+        self._attempts = Counter()
+        self._in_flight = {} # Worker index -> match ID it is scraping
+        self._processes = {} # Worker index -> process
+        self._crashes_since_progress = 0
+        self._summary = summary
+        per_worker = summary['workers']
+
+        start = last_report = time.monotonic()
+        for worker_index in range(min(self.workers, len(pending))):
+            per_worker[worker_index] = {'scraped': 0, 'failed': 0, 'seconds': 0.0}
+            self._start_worker(worker_index)
+        try:
+            while self._remaining:
+                self._drain_events(timeout=1.0)
+                dead_workers = [index for index, process in self._processes.items() if not process.is_alive()]
+                if dead_workers:
+                    # Read what they reported before exiting, so a finished match is not retried
+                    self._drain_events(timeout=0)
+                    for worker_index in dead_workers:
+                        self._handle_worker_exit(worker_index)
+                if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                    last_report = time.monotonic()
+                    self._report_progress(len(pending), last_report - start)
+        finally:
+            self._stop_workers()
+
+        summary['elapsed_s'] = round(time.monotonic() - start, 1)
+        for worker_stats in per_worker.values():
+            worker_stats['seconds'] = round(worker_stats['seconds'], 1)
+        summary['matches_per_minute'] = round(summary['scraped'] / max(summary['elapsed_s'], 1e-9) * 60, 1)
+        return summary
+
+    def _start_worker(self, worker_index):
+        process = self._context.Process(
+            target=_worker_main, name=f"crawl-worker-{worker_index}", daemon=True,
+            args=(worker_index, self._tasks, self._events, self.store.directory, self.matches_per_worker),
+        )
+        process.start()
+        self._processes[worker_index] = process
+
+    def _drain_events(self, timeout):
+        try:
+            event = self._events.get(timeout=timeout) if timeout else self._events.get_nowait()
+            while True:
+                self._handle_event(event)
+                event = self._events.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _handle_event(self, event):
+        kind, worker_index, match_id = event[:3]
+        worker_stats = self._summary['workers'][worker_index]
+        if kind == 'started':
+            self._in_flight[worker_index] = match_id
+        elif kind == 'done':
+            self._in_flight.pop(worker_index, None)
+            self._remaining.discard(match_id)
+            self._crashes_since_progress = 0
+            self._summary['scraped'] += 1
+            worker_stats['scraped'] += 1
+            worker_stats['seconds'] += event[3]
+        elif kind == 'failed':
+            self._in_flight.pop(worker_index, None)
+            worker_stats['failed'] += 1
+            self._retry_or_give_up(match_id, event[3])
+
+    def _retry_or_give_up(self, match_id, reason):
+        self._attempts[match_id] += 1
+        if self._attempts[match_id] < self.max_attempts:
+            self._tasks.put(match_id)
+        else:
+            self._remaining.discard(match_id)
+            self._summary['failed'][match_id] = reason
+
+    def _handle_worker_exit(self, worker_index):
+        process = self._processes.pop(worker_index)
+        process.join()
+        crashed_on = self._in_flight.pop(worker_index, None)
+        if crashed_on is not None:
+            self._retry_or_give_up(crashed_on, f"Tiến trình cào bị dừng (mã thoát {process.exitcode}).")
+        if process.exitcode != 0:
+            self._summary['restarts'] += 1
+            self._crashes_since_progress += 1
+            if self._crashes_since_progress > self.workers * self.max_attempts:
+                # Workers die before finishing anything (e.g. Chromium is not installed); stop instead of looping
+                for match_id in self._remaining:
+                    self._summary['failed'][match_id] = f"Các tiến trình cào liên tục bị dừng (mã thoát {process.exitcode})."
+                self._remaining.clear()
+                return
+            self.report(f"Tiến trình {worker_index} bị dừng (mã thoát {process.exitcode}), đang khởi động lại...")
+        # Workers also exit on their own after matches_per_worker matches
+        if self._remaining:
+            self._start_worker(worker_index)
+
+    def _stop_workers(self):
+        for _ in self._processes:
+            self._tasks.put(None)
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        for process in self._processes.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self._processes.clear()
+
+    def _report_progress(self, total, elapsed):
+        done = self._summary['scraped'] + len(self._summary['failed'])
+        rate = self._summary['scraped'] / elapsed * 60 if elapsed else 0.0
+        self.report(f"{done}/{total} trận ({len(self._summary['failed'])} lỗi), "
+                    f"{rate:.1f} trận/phút, {len(self._processes)} tiến trình")
+
+
+def load_match_ids(path) -> list:
+    """Reads match IDs or FotMob match URLs (with #matchId), one per line; '#' starts a comment line."""
+    with open(path, encoding='utf-8') as f:
+        lines = [line.strip() for line in f]
+    return [match_key_from_reference(line) for line in lines if line and not line.startswith('#')]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Cào song song nhiều trận FotMob vào kho dữ liệu cục bộ.")
+    parser.add_argument('match_ids', help="File chứa ID hoặc URL trận FotMob, mỗi dòng một trận.")
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help="Thư mục kho dữ liệu trận đấu.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Số tiến trình cào (mặc định: số lõi CPU).")
+    parser.add_argument('--matches-per-worker', type=int, default=DEFAULT_MATCHES_PER_WORKER,
+                        help="Khởi động lại tiến trình sau từng này trận để giải phóng bộ nhớ trình duyệt.")
+    parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS, help="Số lần thử tối đa cho mỗi trận.")
+    args = parser.parse_args(argv)
+
+    farm = CrawlFarm(args.store, args.workers, args.matches_per_worker, args.max_attempts)
+    summary = farm.run(load_match_ids(args.match_ids))
+    json.dump(summary, sys.stdout, indent=2, ensure_ascii=False)
+    print()
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
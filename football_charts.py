@@ -0,0 +1,351 @@
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from mplsoccer import Pitch
+
+from tracing import span
+
+PITCH_COLOR = '#22312b'
+LINE_COLOR = '#c7d5cc'
+
+# Rendered pitch images keyed by (pitch_color, line_color, dpi)
+_pitch_background_cache = {}
+_pitch_background_lock = threading.Lock()
+
+# PNG bytes of rendered charts keyed by (chart kind, team, match set, style)
+CHART_IMAGE_CACHE_SIZE = 64
+_chart_image_cache = OrderedDict()
+_chart_image_lock = threading.Lock()
+
+# Zones along the length and across the width of the Opta 100x100 pitch
+DENSITY_BINS = (12, 8)
+DENSITY_METRICS = {
+    'count': "Số cú sút",
+    'xg': "Tổng xG",
+    'conversion': "Tỷ lệ chuyển hóa",
+}
+# Binned shot grids keyed by (caller cache key, bins)
+BINNED_GRID_CACHE_SIZE = 128
+_binned_grid_cache = OrderedDict()
+_binned_grid_lock = threading.Lock()
+
+
+def get_pitch_background(pitch_color: str = PITCH_COLOR, line_color: str = LINE_COLOR, dpi: int = 150):
+    """
+    Returns the Opta pitch drawn once with mplsoccer as a cached RGBA image:
+    a tuple (image, extent, aspect) ready to be passed to `ax.imshow`.
+    """
+    key = (pitch_color, line_color, dpi)
+    with _pitch_background_lock:
+        if key not in _pitch_background_cache:
+            _pitch_background_cache[key] = _render_pitch_background(pitch_color, line_color, dpi)
+        return _pitch_background_cache[key]
+
+
+def _render_pitch_background(pitch_color: str, line_color: str, dpi: int):
+    """Draws the pitch on an Agg figure and crops the buffer to the pitch axes."""
+    # Use Opta pitch type which is 100x100, matching FotMob's coordinate system
+    pitch = Pitch(pitch_type='opta', pitch_color=pitch_color, line_color=line_color)
+    fig = Figure(figsize=(8, 5), dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_axes([0, 0, 1, 1])
+    pitch.draw(ax=ax)
+    fig.set_facecolor(pitch_color)
+    canvas.draw()
+
+    # Crop the figure buffer to the axes box so the image maps exactly onto the axis limits
+    buffer = np.asarray(canvas.buffer_rgba())
+    bbox = ax.get_window_extent()
+    height = buffer.shape[0]
+    x0, x1 = int(round(bbox.x0)), int(round(bbox.x1))
+    y0, y1 = height - int(round(bbox.y1)), height - int(round(bbox.y0))
+    image = buffer[y0:y1, x0:x1].copy()
+
+    xlim, ylim = ax.get_xlim(), ax.get_ylim()
+    extent = (xlim[0], xlim[1], ylim[0], ylim[1])
+    # Data aspect that keeps the cached pixels square
+    aspect = (image.shape[0] / abs(ylim[1] - ylim[0])) / (image.shape[1] / abs(xlim[1] - xlim[0]))
+
+    return image, extent, aspect
+
+
+def draw_pitch_background(ax, pitch_color: str = PITCH_COLOR, line_color: str = LINE_COLOR):
+    """Paints the cached pitch image on an axes and sets the matching limits."""
+    image, extent, aspect = get_pitch_background(pitch_color, line_color)
+    ax.imshow(image, extent=extent, aspect=aspect, interpolation='bilinear', zorder=0)
+    ax.set_xlim(extent[0], extent[1])
+    ax.set_ylim(extent[2], extent[3])
+    ax.axis('off')
+
+
+def draw_shotmap(ax, shots_df, size_by_xg: bool = False):
+    """
+    Draws all shots with one scatter call per category (goal / non-goal).
+    If `size_by_xg` is set, marker area scales with the shot's expected goals.
+    """
+    draw_pitch_background(ax)
+
+    if shots_df is None or shots_df.empty:
+        ax.text(50, 50, 'Không có dữ liệu shotmap', ha='center', va='center', fontsize=12, color='white')
+        return
+
+    x = shots_df['x'].to_numpy(dtype=float)
+    y = shots_df['y'].to_numpy(dtype=float)
+    if 'eventType' in shots_df.columns:
+        is_goal = (shots_df['eventType'] == 'Goal').to_numpy()
+    else:
+        is_goal = np.zeros(len(shots_df), dtype=bool)
+
+    if size_by_xg and 'expectedGoals' in shots_df.columns:
+        xg = shots_df['expectedGoals'].fillna(0).to_numpy(dtype=float)
+        sizes = np.clip(xg, 0.02, 1.0) * 800
+        goal_sizes, miss_sizes = sizes[is_goal], sizes[~is_goal]
+    else:
+        goal_sizes, miss_sizes = 200, 70
+
+    ax.scatter(x[~is_goal], y[~is_goal], s=miss_sizes, c='red', marker='o', edgecolors='black', alpha=0.9, zorder=2)
+    ax.scatter(x[is_goal], y[is_goal], s=goal_sizes, c='yellow', marker='*', edgecolors='black', alpha=0.9, zorder=3)
+
+
+def _histogram_shots(shots_df, bins) -> dict:
+    x_edges = np.linspace(0, 100, bins[0] + 1)
+    y_edges = np.linspace(0, 100, bins[1] + 1)
+    grid = {'x_edges': x_edges, 'y_edges': y_edges, 'n_teams': 1}
+    if shots_df is None or shots_df.empty:
+        zeros = np.zeros(bins)
+        grid.update(count=zeros, xg=zeros.copy(), goals=zeros.copy())
+        return grid
+
+    x = np.clip(shots_df['x'].to_numpy(dtype=float), 0, 100)
+    y = np.clip(shots_df['y'].to_numpy(dtype=float), 0, 100)
+    if 'expectedGoals' in shots_df.columns:
+        xg = shots_df['expectedGoals'].fillna(0).to_numpy(dtype=float)
+    else:
+        xg = np.zeros(len(shots_df))
+    if 'eventType' in shots_df.columns:
+        goals = (shots_df['eventType'] == 'Goal').to_numpy(dtype=float)
+    else:
+        goals = np.zeros(len(shots_df))
+
+    edges = [x_edges, y_edges]
+    grid['count'] = np.histogram2d(x, y, bins=edges)[0]
+    grid['xg'] = np.histogram2d(x, y, bins=edges, weights=xg)[0]
+    grid['goals'] = np.histogram2d(x, y, bins=edges, weights=goals)[0]
+    return grid
+
+
+def bin_shots(shots_df, bins=DENSITY_BINS, cache_key=None) -> dict:
+    """
+    Bins shots on the Opta 100x100 grid with vectorized 2D histograms.
+    Returns per-zone arrays 'count', 'xg' (sum) and 'goals' plus the bin edges.
+    Grids are cached under `cache_key` when one is given.
+    """
+    key = (cache_key, tuple(bins))
+    if cache_key is not None:
+        with _binned_grid_lock:
+            if key in _binned_grid_cache:
+                _binned_grid_cache.move_to_end(key)
+                return _binned_grid_cache[key]
+
+    grid = _histogram_shots(shots_df, bins)
+
+    if cache_key is not None:
+        with _binned_grid_lock:
+            _binned_grid_cache[key] = grid
+            while len(_binned_grid_cache) > BINNED_GRID_CACHE_SIZE:
+                _binned_grid_cache.popitem(last=False)
+    return grid
+
+
+def loaded_matches_average_grid(shots_df, bins=DENSITY_BINS, cache_key=None) -> dict:
+    """
+    Per-team average of the binned grids over every team present in `shots_df`. This is the
+    average of the loaded matches only, not a league-wide baseline.
+    """
+    grid = bin_shots(shots_df, bins, cache_key)
+    n_teams = shots_df['teamId'].nunique() if shots_df is not None and 'teamId' in shots_df.columns else 1
+    n_teams = max(n_teams, 1)
+    average = dict(grid)
+    average.update(
+        count=grid['count'] / n_teams,
+        xg=grid['xg'] / n_teams,
+        goals=grid['goals'] / n_teams,
+        n_teams=n_teams,
+    )
+    return average
+
+
+def grid_metric(grid: dict, metric: str):
+    """Returns the per-zone values of `metric`; conversion rate is NaN where there are no shots."""
+    if metric == 'conversion':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(grid['count'] > 0, grid['goals'] / grid['count'], np.nan)
+    return grid[metric]
+
+
+def build_shot_density_figure(grid: dict, team_name: str, title_suffix: str, metric: str = 'count',
+                              compare_grid: dict = None, compare_label: str = None) -> Figure:
+    """
+    Draws a binned shot map of `metric`. With `compare_grid`, draws the per-zone
+    difference (team minus comparison) on a diverging color scale instead.
+    """
+    fig = Figure(figsize=(8, 5), dpi=100)
+    ax = fig.add_subplot(111)
+    draw_pitch_background(ax)
+
+    values = grid_metric(grid, metric)
+    if compare_grid is not None:
+        values = values - grid_metric(compare_grid, metric)
+        # Zones where neither side shot stay transparent so the pitch shows through
+        values = np.where((grid['count'] > 0) | (compare_grid['count'] > 0), values, np.nan)
+        limit = np.nanmax(np.abs(values)) if np.isfinite(values).any() else 1
+        limit = limit or 1
+        mesh = ax.pcolormesh(grid['x_edges'], grid['y_edges'], values.T, cmap='RdBu_r',
+                             vmin=-limit, vmax=limit, alpha=0.75, zorder=1)
+        title = f"{DENSITY_METRICS[metric]}: {team_name} so với {compare_label}"
+    else:
+        values = np.where(values > 0, values, np.nan) if metric != 'conversion' else values
+        mesh = ax.pcolormesh(grid['x_edges'], grid['y_edges'], values.T, cmap='hot',
+                             alpha=0.75, zorder=1)
+        title = f"{DENSITY_METRICS[metric]} của {team_name}"
+
+    colorbar = fig.colorbar(mesh, ax=ax, fraction=0.03, pad=0.02)
+    colorbar.ax.tick_params(colors='white')
+    ax.set_title(f"{title}\n({title_suffix})", color="white", fontsize=14)
+    fig.set_facecolor(PITCH_COLOR)
+    return fig
+
+
+def build_shotmap_figure(shots_df, team_name: str, title_suffix: str, size_by_xg: bool = False) -> Figure:
+    """Builds a standalone shotmap figure, usable from any thread."""
+    fig = Figure(figsize=(8, 5), dpi=100)
+    ax = fig.add_subplot(111)
+
+    draw_shotmap(ax, shots_df, size_by_xg=size_by_xg)
+
+    ax.set_title(f"Tổng hợp Shotmap của {team_name}\n({title_suffix})", color="white", fontsize=14)
+    fig.set_facecolor(PITCH_COLOR)
+    return fig
+
+
+class LiveShotmap:
+    """
+    Shotmap of a live match that is drawn once and then updated shot by shot. Every shot is
+    its own artist, so a poll only adds, replaces or removes the markers that changed.
+    Home shots attack the right-hand goal; away shots are mirrored to the left.
+    """
+
+    def __init__(self, home_team: dict, away_team: dict):
+        self.home_team = home_team
+        self.away_team = away_team
+        self.figure = Figure(figsize=(8, 5), dpi=100)
+        self.ax = self.figure.add_subplot(111)
+        draw_pitch_background(self.ax)
+        self.figure.set_facecolor(PITCH_COLOR)
+        self._artists = {} # Shot key -> scatter artist
+        self.set_status(None)
+
+    def set_status(self, status):
+        score = (status or {}).get('score') or "-"
+        minute = (status or {}).get('minute')
+        title = f"{self.home_team['name']} {score} {self.away_team['name']}"
+        self.ax.set_title(f"{title} ({minute})" if minute else title, color="white", fontsize=14)
+
+    def apply_delta(self, delta, key_of):
+        """Applies the shot changes of a live_tracker delta; `key_of(shot)` gives a shot's key."""
+        for key in delta['shots_removed']:
+            self._remove(key)
+        for shot in delta['shots_updated'] + delta['shots_added']:
+            key = key_of(shot)
+            self._remove(key)
+            self._artists[key] = self._draw_shot(shot)
+        if delta['status']:
+            self.set_status(delta['status'])
+
+    def _remove(self, key):
+        artist = self._artists.pop(key, None)
+        if artist is not None:
+            artist.remove()
+
+    def _draw_shot(self, shot):
+        x, y = float(shot.get('x', 0)), float(shot.get('y', 0))
+        if shot.get('teamId') == self.away_team['id']:
+            x, y = 100 - x, 100 - y
+        if shot.get('eventType') == 'Goal':
+            return self.ax.scatter([x], [y], s=200, c='yellow', marker='*', edgecolors='black', alpha=0.9, zorder=3)
+        color = 'red' if shot.get('teamId') == self.home_team['id'] else '#4da6ff'
+        return self.ax.scatter([x], [y], s=70, c=color, marker='o', edgecolors='black', alpha=0.9, zorder=2)
+
+
+def build_win_prob_figure(prediction_data: dict, home_team_name: str, away_team_name: str) -> Figure:
+    """Builds the horizontal bar chart of the 1X2 probabilities predicted by the AI."""
+    fig = Figure(figsize=(6, 4), dpi=100)
+    ax = fig.add_subplot(111)
+
+    home_prob = prediction_data.get('home_team_win_prob_pct', 0)
+    draw_prob = prediction_data.get('draw_prob_pct', 0)
+    away_prob = prediction_data.get('away_team_win_prob_pct', 0)
+    
+    teams = [away_team_name, 'Hòa', home_team_name]
+    probs = [away_prob, draw_prob, home_prob]
+    colors = ['#d9534f', '#f0ad4e', '#5cb85c'] # Red, Orange, Green
+
+    bars = ax.barh(teams, probs, color=colors, height=0.6)
+    ax.set_xlabel('Xác suất (%)', color='white', fontsize=12)
+    ax.set_title('Dự đoán Kết quả Trận đấu', color='white', fontsize=16)
+    ax.tick_params(axis='x', colors='white')
+    ax.tick_params(axis='y', colors='white', labelsize=12)
+    ax.set_xlim(0, 100)
+
+    # Add percentage labels on bars
+    for bar in bars:
+        width = bar.get_width()
+        label_x_pos = width + 1
+        ax.text(label_x_pos, bar.get_y() + bar.get_height()/2, f'{width}%', ha='left', va='center', color='white', fontsize=11, fontweight='bold')
+
+    fig.set_facecolor(PITCH_COLOR)
+    ax.set_facecolor(PITCH_COLOR)
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+    ax.spines['left'].set_color('white')
+    ax.spines['bottom'].set_color('white')
+    
+    fig.tight_layout()
+    return fig
+
+
+def figure_to_png(fig: Figure) -> bytes:
+    """Renders a figure with the Agg backend into PNG bytes."""
+    FigureCanvasAgg(fig)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', facecolor=fig.get_facecolor())
+    return buffer.getvalue()
+
+
+def render_chart_image(cache_key, build_figure, *args, **kwargs) -> bytes:
+    """
+    Returns the PNG for `cache_key`, building the figure with `build_figure(*args, **kwargs)`
+    only on a cache miss. Safe to call from worker threads.
+    """
+    with span('chart.render', figure=build_figure.__name__) as render_span:
+        with _chart_image_lock:
+            if cache_key in _chart_image_cache:
+                _chart_image_cache.move_to_end(cache_key)
+                render_span.set(cache_hit=True)
+                return _chart_image_cache[cache_key]
+
+        render_span.set(cache_hit=False)
+        with span('chart.build_figure'):
+            fig = build_figure(*args, **kwargs)
+        with span('chart.png_encode'):
+            png_bytes = figure_to_png(fig)
+
+        with _chart_image_lock:
+            _chart_image_cache[cache_key] = png_bytes
+            while len(_chart_image_cache) > CHART_IMAGE_CACHE_SIZE:
+                _chart_image_cache.popitem(last=False)
+        return png_bytes
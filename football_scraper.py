@@ -1,83 +1,165 @@
+import asyncio
+import os
 import re
 import json
 import requests
 import pandas as pd
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
 from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
 
-
-def get_fotmob_match_data(match_url: str) -> dict:
+from tracing import span
+
+# Overridable so the offline benchmarks can point the scrapers at a local stand-in server
+FOTMOB_BASE_URL = os.environ.get('FOTMOB_BASE_URL', 'https://www.fotmob.com')
+SOFASCORE_API_BASE_URL = os.environ.get('SOFASCORE_API_BASE_URL', 'https://api.sofascore.com')
+TRANSFERMARKT_BASE_URL = os.environ.get('TRANSFERMARKT_BASE_URL', 'https://www.transfermarkt.us')
+
+_NEXT_DATA_PATTERN = re.compile(r'<script id="__NEXT_DATA__"[^>]*>(.*?)</script>', re.DOTALL)
+
+# Transfermarkt profile pages: only the player header and the info box are parsed. Each
+# region is cut out of the raw HTML from its opening tag to the matching closing tag, with
+# nested tags of the same name counted, so BeautifulSoup never sees the navigation, scripts
+# and stats tables around them.
+_TM_HEADER_START = re.compile(r'<header[^>]*\bclass="data-header[\s"][^>]*>')
+_TM_HEADER_TAGS = re.compile(r'<(/?)header\b[^>]*>', re.IGNORECASE)
+_TM_INFO_BOX_START = re.compile(r'<div[^>]*\bclass="info-table[\s"][^>]*>')
+_TM_INFO_BOX_TAGS = re.compile(r'<(/?)div\b[^>]*>', re.IGNORECASE)
+# Class tokens of the same regions, for straining the whole page when they can not be cut out
+_TM_HEADER_CLASS = re.compile(r'(?:^|\s)data-header(?:\s|$)')
+_TM_INFO_BOX_CLASS = re.compile(r'(?:^|\s)info-table(?:\s|$)')
+_TM_INFO_LABEL_SUFFIX = re.compile(r'\s*:\s*$')
+# Profile field -> pattern for its info box label; the value is the bold span after the label
+_TM_INFO_LABELS = {
+    'contract_expiry': re.compile(r'^Contract expires$', re.IGNORECASE),
+    'birthplace': re.compile(r'^Place of birth$', re.IGNORECASE),
+    'agent': re.compile(r'^(?:Player )?agent$', re.IGNORECASE),
+    'height': re.compile(r'^Height$', re.IGNORECASE),
+}
+# Field -> (pattern applied to the label's value, template the match is expanded to)
+_TM_INFO_VALUES = {
+    'birthplace': (re.compile(r'^([^,]+?)\s*(?:,|$)'), r'\1'),
+    'height': (re.compile(r'^(\d,\d{2})\s?m\b'), r'\1m'),
+}
+
+
+class ScrapeCancelled(Exception):
+    """Raised inside a scraper when its cancel token has been triggered."""
+
+
+def _check_cancelled(cancel_token):
+    if cancel_token is not None and cancel_token.cancelled:
+        raise ScrapeCancelled("Scrape was cancelled.")
+
+
+def get_fotmob_match_data(match_url: str, cancel_token=None, browser=None) -> dict:
     """
     Scrapes shotmap and team data from a single FotMob match page.
     This is the primary function for fetching data for analysis.
-    """
-    with sync_playwright() as p:
-        browser = p.chromium.launch()
-        page = browser.new_page()
-        try:
-            print(f"Navigating to match: {match_url}")
-            page.goto(match_url, wait_until="domcontentloaded", timeout=60000)
 
-            page_data_str = page.locator('script#__NEXT_DATA__').inner_text(timeout=15000)
-            data = json.loads(page_data_str)
-            
-            general_props = data.get('props', {}).get('pageProps', {}).get('general', {})
-            if not general_props:
-                raise ValueError("Could not find 'general' properties in page data.")
-
-            match_id = general_props.get('matchId')
-            if not match_id:
-                raise ValueError("Could not determine match ID from page data.")
-            
-            content_props = data.get('props', {}).get('pageProps', {}).get('content', {})
-            if not content_props:
-                raise ValueError("Could not find 'content' properties in page data.")
-
-            # Extract data from all relevant tabs
-            shots_list = content_props.get('shotmap', {}).get('shots', [])
-            shots_df = pd.DataFrame(shots_list) if shots_list else pd.DataFrame()
-            stats_data = content_props.get('stats', {})
-            match_facts = content_props.get('matchFacts', {})
-            lineup_data = content_props.get('lineup', {})
-            h2h_data = content_props.get('h2h', {})
-            table_data = data.get('props', {}).get('pageProps', {}).get('tableData', {})
-
-            full_data = {
-                "stats": stats_data,
-                "matchFacts": match_facts,
-                "lineup": lineup_data,
-                "h2h": h2h_data,
-                "table": table_data
-            }
-            
-            home_team_data = general_props.get('homeTeam', {})
-            away_team_data = general_props.get('awayTeam', {})
-            
-            team_data = {
-                home_team_data.get('id'): home_team_data.get('name'),
-                away_team_data.get('id'): away_team_data.get('name'),
-            }
-            # Clean out any entries where ID or name might be missing
-            team_data = {k: v for k, v in team_data.items() if k and v}
+    `cancel_token` is any object with a `cancelled` attribute; once it is set the scrape
+    stops at the next checkpoint, closes the page and returns an empty result.
+    `browser` is an already launched Playwright browser to open the page in, for callers
+    scraping many matches; without it a browser is launched and closed for this match.
+    """
+    with span('scrape.fotmob_match', url=match_url) as scrape_span:
+        if browser is not None:
+            return _scrape_fotmob_match_page(browser, match_url, cancel_token, scrape_span)
+        with sync_playwright() as p:
+            _check_cancelled(cancel_token)
+            with span('scrape.browser_launch'):
+                browser = p.chromium.launch()
+            try:
+                return _scrape_fotmob_match_page(browser, match_url, cancel_token, scrape_span)
+            finally:
+                with span('scrape.browser_close'):
+                    browser.close()
 
-            print(f"  - Successfully scraped match {match_id}. Found {len(shots_df)} shots.")
-            return {'shots_df': shots_df, 'team_data': team_data, 'shotmap': shots_list, 'full_data': full_data}
 
-        except Exception as e:
-            print(f"  - Could not scrape match {match_url}. Reason: {e}")
-            return {'shots_df': pd.DataFrame(), 'team_data': {}, 'shotmap': [], 'full_data': {}}
-        finally:
-            browser.close()
+def _scrape_fotmob_match_page(browser, match_url: str, cancel_token, scrape_span) -> dict:
+    page = browser.new_page()
+    try:
+        _check_cancelled(cancel_token)
+        print(f"Navigating to match: {match_url}")
+        with span('scrape.page_goto'):
+            page.goto(match_url, wait_until="domcontentloaded", timeout=60000)
 
+        _check_cancelled(cancel_token)
+        with span('scrape.next_data_locator'):
+            page_data_str = page.locator('script#__NEXT_DATA__').inner_text(timeout=15000)
+        page.close()
+        with span('scrape.json_parse', size=len(page_data_str)):
+            page_data = json.loads(page_data_str)
+        with span('scrape.parse_match'):
+            match_data = parse_fotmob_match_page(page_data)
+        scrape_span.set(match_id=match_data['match_id'], shots=len(match_data['shots_df']))
+        print(f"  - Successfully scraped match {match_data['match_id']}. Found {len(match_data['shots_df'])} shots.")
+        return match_data
+
+    except ScrapeCancelled:
+        scrape_span.set(cancelled=True)
+        print(f"  - Scrape of {match_url} was cancelled.")
+        return {'match_id': None, 'shots_df': pd.DataFrame(), 'team_data': {}, 'shotmap': [], 'full_data': {}}
+    except Exception as e:
+        scrape_span.fail(e)
+        print(f"  - Could not scrape match {match_url}. Reason: {e}")
+        return {'match_id': None, 'shots_df': pd.DataFrame(), 'team_data': {}, 'shotmap': [], 'full_data': {}}
+    finally:
+        # A shared browser outlives this match, so its page must not be left open
+        if not page.is_closed():
+            page.close()
+
+
+def extract_next_data(html: str) -> dict:
+    """Returns the parsed `__NEXT_DATA__` JSON embedded in a saved Next.js page."""
+    match = _NEXT_DATA_PATTERN.search(html)
+    if not match:
+        raise ValueError("Could not find the __NEXT_DATA__ script in the page.")
+    return json.loads(match.group(1))
+
+
+def parse_fotmob_match_page(data: dict) -> dict:
+    """Builds the match result of get_fotmob_match_data from a FotMob page's `__NEXT_DATA__`."""
+    general_props = data.get('props', {}).get('pageProps', {}).get('general', {})
+    if not general_props:
+        raise ValueError("Could not find 'general' properties in page data.")
+
+    match_id = general_props.get('matchId')
+    if not match_id:
+        raise ValueError("Could not determine match ID from page data.")
+    
+    content_props = data.get('props', {}).get('pageProps', {}).get('content', {})
+    if not content_props:
+        raise ValueError("Could not find 'content' properties in page data.")
+
+    # Extract data from all relevant tabs
+    shots_list = content_props.get('shotmap', {}).get('shots', [])
+    shots_df = pd.DataFrame(shots_list) if shots_list else pd.DataFrame()
+    stats_data = content_props.get('stats', {})
+    match_facts = content_props.get('matchFacts', {})
+    lineup_data = content_props.get('lineup', {})
+    h2h_data = content_props.get('h2h', {})
+    table_data = data.get('props', {}).get('pageProps', {}).get('tableData', {})
+
+    full_data = {
+        "stats": stats_data,
+        "matchFacts": match_facts,
+        "lineup": lineup_data,
+        "h2h": h2h_data,
+        "table": table_data
+    }
+    
+    home_team_data = general_props.get('homeTeam', {})
+    away_team_data = general_props.get('awayTeam', {})
+    
+    team_data = {
+        home_team_data.get('id'): home_team_data.get('name'),
+        away_team_data.get('id'): away_team_data.get('name'),
+    }
+    # Clean out any entries where ID or name might be missing
+    team_data = {k: v for k, v in team_data.items() if k and v}
 
-def _safe_regex_search(pattern: str, text: str) -> str:
-    """Helper function to safely perform a regex search, returning 'N/A' if not found."""
-    match = re.search(pattern, text, re.DOTALL)
-    if match:
-        # Handle cases where the main group is optional
-        return (match.group(1) or 'N/A').strip()
-    return "N/A"
+    return {'match_id': match_id, 'shots_df': shots_df, 'team_data': team_data, 'shotmap': shots_list, 'full_data': full_data}
 
 
 def get_transfermarkt_player_data(player_url: str) -> dict:
@@ -99,20 +181,7 @@ def get_transfermarkt_player_data(player_url: str) -> dict:
     try:
         response = requests.get(player_url, headers=headers)
         response.raise_for_status()
-        soup = BeautifulSoup(response.content, "html.parser")
-
-        player_data = {
-            "player_id": player_id,
-            "player_name": soup.select_one('h1.data-header__headline-wrapper').text.split('\\n')[-1].strip(),
-            "player_number": (soup.select_one('span.data-header__shirt-number').text.strip().replace('#', '')) if soup.select_one('span.data-header__shirt-number') else "N/A"
-        }
-
-        # Use the safe regex helper to prevent crashes on missing data
-        soup_text = soup.text
-        player_data["contract_expiry"] = _safe_regex_search(r"Contract expires: (.*)", soup_text)
-        player_data["birthplace"] = _safe_regex_search(r"Place of birth:.*?([A-z\s]+\,)", soup_text).rstrip(',')
-        player_data["agent"] = _safe_regex_search(r"Agent:.*?([A-z\s\./-]+?)\n", soup_text)
-        player_data["height"] = _safe_regex_search(r"Height:.*?(\d,\d{2}m)", soup_text)
+        player_data = parse_transfermarkt_profile(response.content, player_id)
 
         # Fetching API data
         player_data["market_value_history"] = _get_transfermarkt_api_data(player_id, "marketValueDevelopment/graph", headers)
@@ -129,9 +198,75 @@ def get_transfermarkt_player_data(player_url: str) -> dict:
         return {}
 
 
+def _tm_cut(start_pattern, tag_pattern, html: str):
+    """HTML from the opening tag matched by `start_pattern` to its own closing tag, or None."""
+    start = start_pattern.search(html)
+    if not start:
+        return None
+    depth = 1
+    for tag in tag_pattern.finditer(html, start.end()):
+        depth += -1 if tag.group(1) else 1
+        if depth == 0:
+            return html[start.start():tag.end()]
+    return None
+
+
+def _tm_region(start_pattern, tag_pattern, class_pattern, selector: str, html: str):
+    """
+    Soup of one region of a profile page. Falls back to straining the whole page when the
+    region can not be cut out or the cut does not contain `selector`.
+    """
+    region = _tm_cut(start_pattern, tag_pattern, html)
+    if region is not None:
+        soup = BeautifulSoup(region, "html.parser")
+        if soup.select_one(selector) is not None:
+            return soup
+    return BeautifulSoup(html, "html.parser", parse_only=SoupStrainer(class_=class_pattern))
+
+
+def _tm_info_box(soup) -> dict:
+    """{label without colon: value} of the info box, whitespace collapsed."""
+    info = {}
+    for label in soup.select('span.info-table__content--regular'):
+        value = label.find_next_sibling('span', class_='info-table__content--bold')
+        if value is not None:
+            info[_TM_INFO_LABEL_SUFFIX.sub('', ' '.join(label.get_text(' ').split()))] = ' '.join(value.get_text(' ').split())
+    return info
+
+
+def parse_transfermarkt_profile(html_content, player_id: str) -> dict:
+    """
+    Extracts the profile fields of get_transfermarkt_player_data from a saved profile page.
+    Missing fields are 'N/A'.
+    """
+    html = html_content.decode('utf-8', errors='replace') if isinstance(html_content, bytes) else html_content
+
+    header = _tm_region(_TM_HEADER_START, _TM_HEADER_TAGS, _TM_HEADER_CLASS, 'h1.data-header__headline-wrapper', html)
+    headline = header.select_one('h1.data-header__headline-wrapper')
+    shirt_number = header.select_one('span.data-header__shirt-number')
+    if shirt_number is not None:
+        shirt_number = shirt_number.extract().get_text().strip().replace('#', '')
+    player_data = {
+        "player_id": player_id,
+        "player_name": ' '.join(headline.get_text(' ').split()),
+        "player_number": shirt_number or "N/A",
+    }
+
+    info = _tm_info_box(_tm_region(_TM_INFO_BOX_START, _TM_INFO_BOX_TAGS, _TM_INFO_BOX_CLASS,
+                                    'span.info-table__content--regular', html))
+    for field, label_pattern in _TM_INFO_LABELS.items():
+        value = next((value for label, value in info.items() if label_pattern.match(label)), None)
+        if value and field in _TM_INFO_VALUES:
+            value_pattern, template = _TM_INFO_VALUES[field]
+            match = value_pattern.match(value)
+            value = match.expand(template) if match else None
+        player_data[field] = value or "N/A"
+    return player_data
+
+
 def _get_transfermarkt_api_data(player_id: str, endpoint: str, headers: dict, is_player_performance: bool = False) -> dict:
     """Helper function to fetch data from Transfermarkt's API."""
-    base_url = 'https://www.transfermarkt.us/ceapi/'
+    base_url = f'{TRANSFERMARKT_BASE_URL}/ceapi/'
     url = f"{base_url}{endpoint}" if is_player_performance else f"{base_url}{endpoint}/{player_id}"
     
     try:
@@ -189,7 +324,7 @@ def get_sofascore_shotmap(match_url: str) -> dict:
             teams_map = {k: v for k, v in teams_map.items() if k and v} # Clean out empty entries
 
             # --- Fetch Shotmap Data ---
-            api_url = f"https://api.sofascore.com/api/v1/event/{event_id}/shotmap"
+            api_url = f"{SOFASCORE_API_BASE_URL}/api/v1/event/{event_id}/shotmap"
             api_data = page.evaluate(f"async (url) => {{ const response = await fetch(url); return await response.json(); }}", api_url)
             
             shots = pd.DataFrame(api_data.get('shotmap', []))
@@ -206,45 +341,99 @@ def get_sofascore_shotmap(match_url: str) -> dict:
                 browser.close()
 
 
+async def _fetch_json_in_page(browser, url: str):
+    """Opens a JSON API URL in a new page of `browser` and returns the decoded body."""
+    page = await browser.new_page()
+    try:
+        await page.goto(url, timeout=60000)
+        return json.loads(await page.locator('body').inner_text())
+    finally:
+        await page.close()
+
+
 async def scrape_fotmob_match(match_id: str):
     """
     Asynchronously scrapes all match data (general, stats, shotmap) from FotMob's API.
     """
     async with async_playwright() as p:
         browser = await p.chromium.launch()
-        page = await browser.new_page()
         try:
-            api_url = f"https://www.fotmob.com/api/matchDetails?matchId={match_id}"
-            await page.goto(api_url, timeout=60000)
-            json_text = await page.locator('body').inner_text()
-            data = json.loads(json_text)
-            return data
+            return await _fetch_json_in_page(browser, f"{FOTMOB_BASE_URL}/api/matchDetails?matchId={match_id}")
         except Exception as e:
             print(f"Lỗi khi cào dữ liệu FotMob cho trận {match_id}: {e}")
             return None
         finally:
             await browser.close()
 
-async def scrape_sofascore_match(fotmob_url: str):
+def get_sofascore_event_id(reference) -> str:
+    """Extracts the event ID from a SofaScore match URL ('...#id:11911622'), or returns an ID as is."""
+    reference = str(reference).strip()
+    if reference.isdigit():
+        return reference
+    match = re.search(r'#id:(\d+)', reference)
+    return match.group(1) if match else None
+
+async def scrape_sofascore_match(sofascore_url: str):
     """
-    Trích xuất dữ liệu shotmap. 
-    Lưu ý: Để tăng tốc độ và độ tin cậy, hàm này cũng lấy dữ liệu từ API của FotMob,
-    thay vì phải tìm và cào link của SofaScore.
+    Lấy shotmap của một trận từ API của SofaScore.
+    `sofascore_url` là URL trận trên SofaScore (có dạng ...#id:11911622) hoặc ID sự kiện.
     """
-    match_id = get_match_id_from_url(fotmob_url)
-    if not match_id:
-        return {'shotmap': []}
+    event_id = get_sofascore_event_id(sofascore_url)
+    if not event_id:
+        return {'event_id': None, 'shotmap': []}
 
-    try:
-        data = await scrape_fotmob_match(match_id)
-        if data and 'content' in data and 'shotmap' in data['content']:
-            # Trả về theo cấu trúc mà main_app mong đợi
-            return {'shotmap': data['content']['shotmap']['shots']}
+    async with async_playwright() as p:
+        browser = await p.chromium.launch()
+        try:
+            data = await _fetch_json_in_page(browser, f"{SOFASCORE_API_BASE_URL}/api/v1/event/{event_id}/shotmap")
+            return {'event_id': event_id, 'shotmap': data.get('shotmap', [])}
+        except Exception as e:
+            print(f"Lỗi khi lấy shotmap từ SofaScore cho {sofascore_url}: {e}")
+            return {'event_id': event_id, 'shotmap': []}
+        finally:
+            await browser.close()
+
+async def fetch_match_shots(fotmob_match_id, sofascore_url=None) -> dict:
+    """
+    Fetches the shots of one match from FotMob and SofaScore at the same time (two pages of
+    one browser) and merges them into one typed frame with shot_data.merge_shots.
+    Returns {'match_id', 'team_data', 'shots_df', 'sources'}; 'sources' counts the shots of
+    each source, and a failed SofaScore fetch is reported there instead of raising.
+    """
+    from shot_data import merge_shots
+
+    event_id = get_sofascore_event_id(sofascore_url) if sofascore_url else None
+    async with async_playwright() as p:
+        browser = await p.chromium.launch()
+        try:
+            fetches = [_fetch_json_in_page(browser, f"{FOTMOB_BASE_URL}/api/matchDetails?matchId={fotmob_match_id}")]
+            if event_id:
+                fetches.append(_fetch_json_in_page(browser, f"{SOFASCORE_API_BASE_URL}/api/v1/event/{event_id}/shotmap"))
+            results = await asyncio.gather(*fetches, return_exceptions=True)
+        finally:
+            await browser.close()
+
+    details = results[0]
+    if isinstance(details, Exception):
+        raise ValueError(f"Could not fetch FotMob match {fotmob_match_id}: {details}")
+    general = details.get('general', {})
+    home_team, away_team = general.get('homeTeam', {}), general.get('awayTeam', {})
+    fotmob_shots = details.get('content', {}).get('shotmap', {}).get('shots', []) or []
+    sources = {'fotmob': len(fotmob_shots)}
+
+    sofascore_shots = []
+    if event_id:
+        if isinstance(results[1], Exception):
+            print(f"  - SofaScore shotmap of event {event_id} unavailable: {results[1]}")
+            sources['sofascore_error'] = str(results[1])
         else:
-            return {'shotmap': []}
-    except Exception as e:
-        print(f"Lỗi khi lấy shotmap từ FotMob cho URL {fotmob_url}: {e}")
-        return {'shotmap': []}
+            sofascore_shots = results[1].get('shotmap', []) or []
+            sources['sofascore'] = len(sofascore_shots)
+
+    shots_df = merge_shots(fotmob_shots, sofascore_shots, home_team.get('id'), away_team.get('id'))
+    sources['merged'] = len(shots_df)
+    team_data = {team.get('id'): team.get('name') for team in (home_team, away_team) if team.get('id') and team.get('name')}
+    return {'match_id': general.get('matchId', fotmob_match_id), 'team_data': team_data, 'shots_df': shots_df, 'sources': sources}
 
 
 async def get_fotmob_team_recent_match_ids(team_name: str, num_matches: int = 3):
@@ -255,7 +444,7 @@ async def get_fotmob_team_recent_match_ids(team_name: str, num_matches: int = 3)
         browser = await p.chromium.launch()
         page = await browser.new_page()
         try:
-            await page.goto("https://www.fotmob.com/", wait_until="domcontentloaded")
+            await page.goto(f"{FOTMOB_BASE_URL}/", wait_until="domcontentloaded")
 
             search_input = page.get_by_placeholder("Search for team, player or league")
             await search_input.fill(team_name)
@@ -270,7 +459,7 @@ async def get_fotmob_team_recent_match_ids(team_name: str, num_matches: int = 3)
             if not team_url_path:
                 raise ValueError(f"Không thể tìm thấy trang của đội '{team_name}'")
 
-            team_page_url = f"https://www.fotmob.com{team_url_path}"
+            team_page_url = f"{FOTMOB_BASE_URL}{team_url_path}"
             await page.goto(team_page_url, wait_until="domcontentloaded")
 
             # Trích xuất dữ liệu JSON __NEXT_DATA__ từ mã nguồn trang
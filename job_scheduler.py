@@ -0,0 +1,190 @@
+import itertools
+import threading
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from cancellation import CancelToken, JobCancelled
+
+# QThreadPool runs higher priorities first
+PRIORITY_RENDER = 30
+PRIORITY_FORMAT = 20
+PRIORITY_AI = 10
+PRIORITY_SCRAPE = 0
+
+# How many finished jobs stay visible in the queue view
+JOB_HISTORY_SIZE = 50
+
+
+class JobSignals(QObject):
+    progress = pyqtSignal(int, str)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    status_changed = pyqtSignal()
+
+
+class Job(QRunnable):
+    """
+    A unit of work run on the scheduler's thread pool. `fn(cancel_token, report_progress)`
+    returns the job result; `report_progress(percent, message)` may be called from the job thread.
+    """
+
+    def __init__(self, job_id, name, kind, fn, priority, key=None):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.job_id = job_id
+        self.name = name
+        self.kind = kind
+        self.fn = fn
+        self.priority = priority
+        self.key = key
+        self.status = 'queued'
+        self.percent = 0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.cancel_token = CancelToken()
+        self.signals = JobSignals()
+        self._done = threading.Event()
+        # Held while a terminal status is set and signalled, so `subscribe` sees either
+        # the old status (and gets the signal) or the new one (and gets a replay)
+        self._state_lock = threading.RLock()
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in ('queued', 'running')
+
+    def report_progress(self, percent, message=""):
+        self.percent = percent
+        self.message = message
+        self.signals.progress.emit(percent, message)
+
+    def wait(self, timeout=None) -> bool:
+        """Blocks until the job has finished, failed or been cancelled."""
+        return self._done.wait(timeout)
+
+    def subscribe(self, on_finished=None, on_failed=None, on_cancelled=None):
+        """
+        Connects the callbacks to the job's outcome signals. A job that already finished,
+        failed or was cancelled (e.g. a de-duplicated job returned by `submit`) calls the
+        matching callback right away instead, so every subscriber hears the outcome once.
+        """
+        with self._state_lock:
+            if self.is_active:
+                for signal, callback in ((self.signals.finished, on_finished),
+                                         (self.signals.failed, on_failed),
+                                         (self.signals.cancelled, on_cancelled)):
+                    if callback is not None:
+                        signal.connect(callback)
+                return
+            status = self.status
+        if status == 'done' and on_finished is not None:
+            on_finished(self.result)
+        elif status == 'failed' and on_failed is not None:
+            on_failed(self.error)
+        elif status == 'cancelled' and on_cancelled is not None:
+            on_cancelled()
+
+    def run(self):
+        if self.cancel_token.cancelled:
+            self._set_cancelled()
+            self.signals.status_changed.emit()
+            return
+        self.status = 'running'
+        self.signals.status_changed.emit()
+        try:
+            result = self.fn(self.cancel_token, self.report_progress)
+            if self.cancel_token.cancelled:
+                self._set_cancelled()
+                return
+            with self._state_lock:
+                self.result = result
+                self.status = 'done'
+                self.percent = 100
+                self._done.set()
+                self.signals.finished.emit(result)
+        except JobCancelled:
+            self._set_cancelled()
+        except Exception as e:
+            with self._state_lock:
+                self.error = str(e)
+                self.status = 'failed'
+                self._done.set()
+                self.signals.failed.emit(self.error)
+        finally:
+            self.signals.status_changed.emit()
+
+    def _set_cancelled(self):
+        with self._state_lock:
+            self.status = 'cancelled'
+            self._done.set()
+            self.signals.cancelled.emit()
+
+
+class JobScheduler(QObject):
+    """
+    Runs scraping, formatting, AI and rendering jobs on a thread pool with priorities,
+    cancellation and de-duplication of identical active jobs.
+    """
+    jobs_changed = pyqtSignal()
+
+    def __init__(self, max_threads=None, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        if max_threads:
+            self.pool.setMaxThreadCount(max_threads)
+        self._ids = itertools.count(1)
+        self.jobs = {} # job_id -> Job, active jobs and recent history
+
+    def submit(self, name, kind, fn, priority=PRIORITY_FORMAT, key=None) -> Job:
+        """
+        Queues `fn` as a job. If an active job with the same `key` exists, that job is
+        returned instead so identical work is only done once.
+        """
+        existing_job = self.find_active(key)
+        if existing_job:
+            return existing_job
+
+        job = Job(next(self._ids), name, kind, fn, priority, key)
+        job.signals.status_changed.connect(self._on_job_status_changed)
+        job.signals.progress.connect(lambda percent, message: self.jobs_changed.emit())
+        self.jobs[job.job_id] = job
+        self.pool.start(job, priority)
+        self.jobs_changed.emit()
+        return job
+
+    def find_active(self, key):
+        """Returns the queued or running job submitted with `key`, if any."""
+        if key is None:
+            return None
+        for job in self.jobs.values():
+            if job.key == key and job.is_active:
+                return job
+        return None
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if not job or not job.is_active:
+            return
+        job.cancel_token.cancel()
+        # A job that has not started yet can be taken off the queue right away
+        if job.status == 'queued' and self.pool.tryTake(job):
+            job._set_cancelled()
+            self._on_job_status_changed()
+
+    def cancel_all(self):
+        for job_id in list(self.jobs):
+            self.cancel(job_id)
+
+    def active_jobs(self):
+        return [job for job in self.jobs.values() if job.is_active]
+
+    def shutdown(self, timeout_ms=5000):
+        self.cancel_all()
+        self.pool.waitForDone(timeout_ms)
+
+    def _on_job_status_changed(self):
+        finished = [job_id for job_id, job in self.jobs.items() if not job.is_active]
+        for job_id in finished[:-JOB_HISTORY_SIZE]:
+            del self.jobs[job_id]
+        self.jobs_changed.emit()
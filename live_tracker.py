@@ -0,0 +1,319 @@
+"""
+Follows live FotMob matches by polling `matchDetails` and emitting only what changed.
+
+    python live_tracker.py 4446402 4446410 [--interval 30]
+
+Every tracked match is polled by its own task on one asyncio loop running in a background
+thread, so following 10+ matches costs one thread and one HTTP connection pool. Polls use
+the previous ETag, and a body identical to the last one is not parsed again. Each poll is
+diffed against the previous snapshot; `on_delta` receives a delta dict only when something
+changed:
+
+    match_id, polled_at, teams ({'home': {id, name}, 'away': {..}}),
+    status (started/finished/score/minute/kickoff, or None if unchanged),
+    shots_added, shots_updated (full shot dicts), shots_removed (shot keys),
+    events_added, events_removed (event keys),
+    stats_changed ({(section title, stat key): [home, away]}), error (or None)
+
+The first poll of a match reports its whole state as additions.
+"""
+import argparse
+import asyncio
+import datetime
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+
+DEFAULT_POLL_INTERVAL = 30 # Seconds
+MIN_POLL_INTERVAL = 5
+MAX_ERROR_BACKOFF = 300
+MAX_CONCURRENT_POLLS = 8
+REQUEST_TIMEOUT = 20
+REQUEST_HEADERS = {
+    'user-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+}
+
+
+def shot_key(shot):
+    if shot.get('id') is not None:
+        return shot['id']
+    return (shot.get('teamId'), shot.get('playerId'), shot.get('min'), shot.get('x'), shot.get('y'))
+
+
+def event_key(event):
+    for field in ('eventId', 'id'):
+        if event.get(field) is not None:
+            return event[field]
+    return json.dumps(event, sort_keys=True, ensure_ascii=False)
+
+
+def flatten_stats(stats_data) -> dict:
+    """{(section title, stat key): [home value, away value]} from FotMob's stats sections."""
+    flat = {}
+    for section in (stats_data or {}).get('stats', []) or []:
+        for stat in section.get('stats', []):
+            flat[(section.get('title'), stat.get('key') or stat.get('title'))] = stat.get('stats')
+    return flat
+
+
+def kickoff_time(details):
+    """Unix time of the scheduled kickoff from a matchDetails payload, or None."""
+    general = details.get('general', {})
+    for text in (details.get('header', {}).get('status', {}).get('utcTime'), general.get('matchTimeUTCDate')):
+        if text:
+            try:
+                return datetime.datetime.fromisoformat(text.replace('Z', '+00:00')).timestamp()
+            except ValueError:
+                pass
+    if general.get('matchTimeUTC'):
+        try:
+            kickoff = datetime.datetime.strptime(general['matchTimeUTC'], '%a, %b %d, %Y, %H:%M UTC')
+            return kickoff.replace(tzinfo=datetime.timezone.utc).timestamp()
+        except ValueError:
+            pass
+    return None
+
+
+def match_status(details) -> dict:
+    header = details.get('header', {})
+    status = header.get('status', {})
+    teams = header.get('teams', [])
+    score = status.get('scoreStr')
+    if score is None and len(teams) == 2 and None not in (teams[0].get('score'), teams[1].get('score')):
+        score = f"{teams[0]['score']} - {teams[1]['score']}"
+    return {
+        'started': bool(status.get('started', details.get('general', {}).get('started'))),
+        'finished': bool(status.get('finished', details.get('general', {}).get('finished'))),
+        'score': score,
+        'minute': (status.get('liveTime') or {}).get('short'),
+        'kickoff': kickoff_time(details),
+    }
+
+
+class LiveMatchState:
+    """The last snapshot of one match, indexed for diffing."""
+
+    def __init__(self, match_id):
+        self.match_id = match_id
+        self.teams = None
+        self.status = None
+        self.shots = {} # Shot key -> shot
+        self.events = {} # Event key -> event
+        self.stats = {}
+        self.etag = None
+        self.body_digest = None
+
+    def apply(self, details) -> dict:
+        """Replaces the snapshot with `details` (a matchDetails JSON) and returns the delta."""
+        general = details.get('general', {})
+        content = details.get('content', {})
+        self.teams = {
+            'home': {'id': general.get('homeTeam', {}).get('id'), 'name': general.get('homeTeam', {}).get('name')},
+            'away': {'id': general.get('awayTeam', {}).get('id'), 'name': general.get('awayTeam', {}).get('name')},
+        }
+        delta = self.empty_delta()
+
+        status = match_status(details)
+        if status != self.status:
+            delta['status'] = self.status = status
+
+        shots = {shot_key(shot): shot for shot in (content.get('shotmap') or {}).get('shots', []) or []}
+        for key, shot in shots.items():
+            previous = self.shots.get(key)
+            if previous is None:
+                delta['shots_added'].append(shot)
+            elif previous != shot: # e.g. xG or the outcome revised after a review
+                delta['shots_updated'].append(shot)
+        delta['shots_removed'] = [key for key in self.shots if key not in shots]
+        self.shots = shots
+
+        match_events = ((content.get('matchFacts') or {}).get('events') or {}).get('events', []) or []
+        events = {event_key(event): event for event in match_events}
+        delta['events_added'] = [event for key, event in events.items() if key not in self.events]
+        delta['events_removed'] = [key for key in self.events if key not in events]
+        self.events = events
+
+        stats = flatten_stats(content.get('stats'))
+        delta['stats_changed'] = {key: values for key, values in stats.items() if self.stats.get(key) != values}
+        self.stats = stats
+        return delta
+
+    def empty_delta(self) -> dict:
+        return {
+            'match_id': self.match_id, 'polled_at': time.time(), 'teams': self.teams, 'status': None,
+            'shots_added': [], 'shots_updated': [], 'shots_removed': [],
+            'events_added': [], 'events_removed': [], 'stats_changed': {}, 'error': None,
+        }
+
+
+def delta_is_empty(delta) -> bool:
+    return not (delta['status'] or delta['error'] or delta['stats_changed'] or any(
+        delta[field] for field in ('shots_added', 'shots_updated', 'shots_removed', 'events_added', 'events_removed')
+    ))
+
+
+class LiveTracker:
+    """
+    Polls the tracked matches on a background event loop. `on_delta(delta)` is called on that
+    loop's thread; GUI callers hand the delta over to their own thread.
+    """
+
+    def __init__(self, on_delta, interval=DEFAULT_POLL_INTERVAL, max_concurrent=MAX_CONCURRENT_POLLS):
+        self.on_delta = on_delta
+        self.interval = max(MIN_POLL_INTERVAL, interval)
+        self.max_concurrent = max_concurrent
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._poll_slots = None
+        self._tasks = {} # Match ID -> polling task, only touched on the loop thread
+        self._idle = threading.Event()
+        self._idle.set()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        started = threading.Event()
+
+        def run_loop():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._poll_slots = asyncio.Semaphore(self.max_concurrent)
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run_loop, name='live-tracker', daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def track(self, match_id, interval=None):
+        """Starts following a match (no-op if it is already followed). Thread-safe."""
+        self.start()
+        self._idle.clear()
+        self._loop.call_soon_threadsafe(self._track, str(match_id), max(MIN_POLL_INTERVAL, interval or self.interval))
+
+    def untrack(self, match_id):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._untrack, str(match_id))
+
+    def wait_until_idle(self, timeout=None) -> bool:
+        """Blocks until every tracked match has finished or been untracked."""
+        return self._idle.wait(timeout)
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = self._thread = None
+
+    def _track(self, match_id, interval):
+        if match_id in self._tasks:
+            return
+        task = self._loop.create_task(self._follow(match_id, interval))
+        self._tasks[match_id] = task
+        task.add_done_callback(lambda finished_task: self._on_task_done(match_id, finished_task))
+
+    def _untrack(self, match_id):
+        task = self._tasks.get(match_id)
+        if task:
+            task.cancel()
+
+    def _on_task_done(self, match_id, task):
+        if self._tasks.get(match_id) is task:
+            del self._tasks[match_id]
+        if not self._tasks:
+            self._idle.set()
+
+    async def _shutdown(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _get_session(self):
+        import aiohttp
+
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                headers=REQUEST_HEADERS, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+            )
+        return self._session
+
+    async def _follow(self, match_id, interval):
+        state = LiveMatchState(match_id)
+        # Spread the first polls so many matches added at once do not poll in lockstep
+        await asyncio.sleep(random.uniform(0, min(interval, 2.0)))
+        backoff = interval
+        while True:
+            try:
+                delta = await self._poll(state)
+                backoff = interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                delta = state.empty_delta()
+                delta['error'] = f"{type(e).__name__}: {e}"
+                backoff = min(backoff * 2, MAX_ERROR_BACKOFF)
+            if not delta_is_empty(delta):
+                self.on_delta(delta)
+            if state.status and state.status['finished']:
+                return
+            await asyncio.sleep(backoff * random.uniform(0.9, 1.1))
+
+    async def _poll(self, state) -> dict:
+        from football_scraper import FOTMOB_BASE_URL
+
+        session = await self._get_session()
+        headers = {'If-None-Match': state.etag} if state.etag else {}
+        async with self._poll_slots:
+            async with session.get(f"{FOTMOB_BASE_URL}/api/matchDetails",
+                                   params={'matchId': state.match_id}, headers=headers) as response:
+                if response.status == 304:
+                    return state.empty_delta()
+                response.raise_for_status()
+                body = await response.read()
+                state.etag = response.headers.get('ETag')
+        digest = hashlib.blake2b(body, digest_size=16).digest()
+        if digest == state.body_digest:
+            return state.empty_delta()
+        state.body_digest = digest
+        return state.apply(json.loads(body))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Theo dõi trực tiếp các trận FotMob và in ra các thay đổi (JSON lines).")
+    parser.add_argument('matches', nargs='+', help="ID hoặc URL trận FotMob.")
+    parser.add_argument('--interval', type=float, default=DEFAULT_POLL_INTERVAL, help="Số giây giữa hai lần cập nhật.")
+    args = parser.parse_args(argv)
+
+    from analysis_core import match_key_from_reference
+
+    print_lock = threading.Lock()
+
+    def print_delta(delta):
+        record = {**delta, 'stats_changed': [[*key, values] for key, values in delta['stats_changed'].items()]}
+        with print_lock:
+            print(json.dumps(record, ensure_ascii=False, default=str), flush=True)
+
+    tracker = LiveTracker(print_delta, interval=args.interval)
+    for reference in args.matches:
+        tracker.track(match_key_from_reference(reference))
+    try:
+        while not tracker.wait_until_idle(timeout=1.0):
+            pass
+    except KeyboardInterrupt:
+        pass
+    tracker.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
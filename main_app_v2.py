@@ -1,36 +1,43 @@
 import sys
 import os
-import re
 import json
-import pandas as pd
-import numpy as np
-import google.generativeai as genai
-from mplsoccer import Pitch
-import matplotlib.pyplot as plt
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
+import importlib
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QTextEdit, QInputDialog, QMessageBox,
     QVBoxLayout, QWidget, QMenuBar, QTabWidget, QPushButton, QHBoxLayout,
     QDialog, QLineEdit, QFormLayout, QDialogButtonBox, QComboBox, QLabel, QGroupBox,
-    QFileDialog, QProgressDialog
+    QFileDialog, QProgressDialog, QSplitter, QTableWidget, QTableWidgetItem, QAbstractItemView,
+    QHeaderView, QTreeWidget, QTreeWidgetItem, QListWidget, QListWidgetItem, QStackedWidget, QPlainTextEdit
 )
-from PyQt6.QtGui import QAction
+from PyQt6.QtGui import QAction, QPixmap
 from PyQt6.QtCore import (
-    QThread, pyqtSignal, Qt, QObject, QSize
+    QThread, pyqtSignal, Qt, QObject, QSize, QTimer
 )
-import asyncio
-from mplsoccer import Pitch
-
-from football_scraper import (
-    get_fotmob_match_data,
-    get_transfermarkt_player_data,
-    get_match_id_from_url, 
-    scrape_fotmob_match, 
-    scrape_sofascore_match,
-    get_fotmob_team_recent_match_ids,
-    get_sofascore_shotmap,
+from functools import partial
+
+from raw_data_tree import RawDataBrowser
+from session_store import AnalysisSession
+from snapshot import PAYLOAD_SECTIONS, SNAPSHOT_SUFFIX, SnapshotError, load_lazy_fields, open_analysis, write_snapshot
+from analysis_core import (
+    AnalysisError, Worker, scrape_two_matches, precompute_analysis_data, load_squad_values, summarize_teams,
+    build_analysis_data, parse_ai_response, match_key_from_reference
 )
+from job_scheduler import JobScheduler, PRIORITY_SCRAPE, PRIORITY_FORMAT, PRIORITY_AI, PRIORITY_RENDER
+import tracing
+from tracing import span
+
+# Heavy modules (pandas, matplotlib, mplsoccer, Gemini, Playwright...) are imported where
+# they are first needed so the window shows with only PyQt loaded. They are pre-warmed in
+# this order by ImportPrewarmWorker once the window is visible.
+PREWARM_MODULES = [
+    'numpy',
+    'pandas',
+    'matplotlib',
+    'football_charts',
+    'football_scraper',
+    'google.generativeai',
+]
+SNAPSHOT_FILE_FILTER = f"Phân tích kèo bóng (*{SNAPSHOT_SUFFIX});;All Files (*)"
 
 # --- Dialog for URL Input ---
 class TwoMatchUrlDialog(QDialog):
@@ -95,35 +102,20 @@ class TeamSelectionDialog(QDialog):
         return team1_id, team1_name, team2_id, team2_name
 
 # --- Worker Threads ---
-class MultiMatchScraperWorker(QThread):
-    finished = pyqtSignal(object, str)
+class ImportPrewarmWorker(QThread):
+    """Imports the heavy modules in the background after the window is shown."""
 
-    def __init__(self, match1_url, match2_url):
+    def __init__(self, module_names):
         super().__init__()
-        self.match1_url = match1_url
-        self.match2_url = match2_url
+        self.module_names = module_names
 
     def run(self):
-        try:
-            match1_data = get_fotmob_match_data(self.match1_url)
-            match2_data = get_fotmob_match_data(self.match2_url)
-            
-            if not match1_data.get('team_data') or not match2_data.get('team_data'):
-                 self.finished.emit(None, "Không thể lấy dữ liệu đội từ một hoặc cả hai trận đấu.")
-                 return
-
-            all_teams_for_selection = {**match1_data['team_data'], **match2_data['team_data']}
-            
-            # Keep match data separate but provide a combined list of teams for the selection dialog
-            processed_data = {
-                'match1': match1_data,
-                'match2': match2_data,
-                'all_teams_for_selection': all_teams_for_selection
-            }
-
-            self.finished.emit(processed_data, None)
-        except Exception as e:
-            self.finished.emit(None, str(e))
+        for module_name in self.module_names:
+            try:
+                importlib.import_module(module_name)
+            except ImportError as e:
+                # The real import site will report the error when the feature is used
+                print(f"Không thể tải trước module {module_name}: {e}")
 
 class SingleScraperWorker(QThread):
     finished = pyqtSignal(object, str)
@@ -140,110 +132,23 @@ class SingleScraperWorker(QThread):
         except Exception as e:
             self.finished.emit(None, str(e))
 
-class Worker(QObject):
-    finished = pyqtSignal(str)
-    error = pyqtSignal(str)
+# --- Job Functions ---
+# Each function runs on the JobScheduler pool as fn(cancel_token, report_progress).
+# The analysis pipeline stages themselves live in analysis_core.
+def render_chart_job(cache_key, build_figure, args, cancel_token, report_progress):
+    """Renders a chart with the Agg backend off the UI thread and returns PNG bytes."""
+    from football_charts import render_chart_image
 
-    def __init__(self, data, odds, gemini_api_key, parent=None):
-        super().__init__(parent)
-        self.data = data
-        self.odds = odds
-        self.gemini_api_key = gemini_api_key
+    return render_chart_image(cache_key, build_figure, *args)
 
-    def run(self):
-        try:
-            if not self.gemini_api_key:
-                raise ValueError("Vui lòng nhập API Key của Gemini trong menu 'Cài đặt'.")
-
-            genai.configure(api_key=self.gemini_api_key)
-            model = genai.GenerativeModel('models/gemini-2.5-flash')
-
-            # The 'data' dictionary now contains the detailed, formatted stats summaries
-            home_team_name = self.data.get("home_team_name", "Đội nhà")
-            away_team_name = self.data.get("away_team_name", "Đội khách")
-            home_stats_summary = self.data.get("home_team_stats_summary", "Không có dữ liệu.")
-            away_stats_summary = self.data.get("away_team_stats_summary", "Không có dữ liệu.")
-
-            odds_euro_home = self.odds.get('euro', {}).get('home') or "N/A"
-            odds_euro_draw = self.odds.get('euro', {}).get('draw') or "N/A"
-            odds_euro_away = self.odds.get('euro', {}).get('away') or "N/A"
-            odds_handicap_line = self.odds.get('handicap', {}).get('line') or "N/A"
-            odds_handicap_home = self.odds.get('handicap', {}).get('home') or "N/A"
-            odds_handicap_away = self.odds.get('handicap', {}).get('away') or "N/A"
-            odds_ou_line = self.odds.get('ou', {}).get('line') or "N/A"
-            odds_ou_over = self.odds.get('ou', {}).get('over') or "N/A"
-            odds_ou_under = self.odds.get('ou', {}).get('under') or "N/A"
-
-            prompt = f"""
-            **YÊU CẦU:**
-            Bạn là một chuyên gia phân tích bóng đá. Dựa trên dữ liệu và kèo nhà cái, hãy cung cấp một JSON object chứa các dự đoán và một bài phân tích chi tiết.
-
-            **QUAN TRỌNG:** Luôn bắt đầu câu trả lời của bạn bằng một JSON object hợp lệ, theo sau là dấu phân cách "---" và sau đó là bài phân tích bằng văn bản.
-
-            **ĐỊNH DẠNG JSON:**
-            {{
-              "prediction": {{
-                "home_team_win_prob_pct": <số nguyên, xác suất thắng của đội nhà (0-100)>,
-                "draw_prob_pct": <số nguyên, xác suất hòa (0-100)>,
-                "away_team_win_prob_pct": <số nguyên, xác suất thắng của đội khách (0-100)>,
-                "expected_total_goals": <số thực, tổng số bàn thắng kỳ vọng trong trận đấu>,
-                "best_bet": "<lựa chọn kèo tốt nhất, ví dụ: {home_team_name} -0.5>",
-                "confidence_level": "<'High' | 'Medium' | 'Low', mức độ tự tin cho 'best_bet'>",
-                "score_probabilities": [
-                  {{ "score": "<dự đoán tỷ số 1, ví dụ: '2-1'>", "probability_pct": <số nguyên, xác suất cho tỷ số đó> }},
-                  {{ "score": "<dự đoán tỷ số 2, ví dụ: '1-1'>", "probability_pct": <số nguyên> }},
-                  {{ "score": "<dự đoán tỷ số 3, ví dụ: '1-0'>", "probability_pct": <số nguyên> }}
-                ]
-              }}
-            }}
-            ---
-            **BÀI PHÂN TÍCH TRẬN ĐẤU**
-
-            **TRẬN ĐẤU:** {home_team_name} vs {away_team_name}
-
-            **DỮ LIỆU TỔNG QUAN:**
-            - **{home_team_name}:**
-            {home_stats_summary}
-            - **{away_team_name}:**
-            {away_stats_summary}
-            
-            **Tỷ lệ kèo nhà cái:**
-            - **Kèo Châu Âu (1x2):** Thắng: {odds_euro_home} | Hòa: {odds_euro_draw} | Thua: {odds_euro_away}
-            - **Kèo Châu Á (Handicap):** Kèo: {odds_handicap_line}
-            - **Kèo Tài Xỉu (O/U):** Mốc: {odds_ou_line}
-
-            **PHÂN TÍCH:**
-            1.  **Phân tích Phong độ & BXH:** Dựa vào dữ liệu thống kê, lịch sử đối đầu và vị trí trên bảng xếp hạng, đội nào có lợi thế?
-            2.  **Phân tích Lối chơi & Đội hình:** Sơ đồ chiến thuật và các cầu thủ ra sân (nếu có) tiết lộ gì về lối chơi của họ?
-            3.  **Phân tích Kèo:** So sánh nhận định của bạn với kèo nhà cái. Kèo có hợp lý không?
-            4.  **Kết luận & Lựa chọn Tốt nhất:** Tóm tắt nhận định và giải thích tại sao bạn lại đưa ra lựa chọn kèo ở trong phần JSON.
-            5.  **Dự đoán tỷ số:**
-            """
-            
-            response = model.generate_content(prompt, generation_config=genai.types.GenerationConfig(temperature=0.7))
-            self.finished.emit(response.text)
-        except Exception as e:
-            self.error.emit(str(e))
-
-    def format_matches(self, matches):
-        # This function is no longer used in the new workflow but kept for now.
-        text = ""
-        if not matches:
-            return "Không có dữ liệu trận đấu.\n"
-        for i, match in enumerate(matches):
-            stats = match.get('stats', {})
-            total_shots_stats = stats.get('Tất cả các cú sút', {})
-            goals = total_shots_stats.get('Goals', 'N/A')
-            xg = total_shots_stats.get('Expected goals (xG)', 'N/A')
-            
-            overview_stats = stats.get('Tổng quan', {})
-            possession = overview_stats.get('Ball possession', 'N/A')
-            
-            text += f"- Trận vs {match['opponent_name']}: Ghi {goals} bàn, Sút (xG: {xg}), Kiểm soát bóng: {possession}\n"
-        return text
+def summarize_teams_job(raw_data, squad_values, cancel_token, report_progress):
+    """Rebuilds the team summaries with the squad values once they have arrived."""
+    return summarize_teams(raw_data, squad_values, cancel_token)
 
 def draw_pitch(ax):
     """Draws a football pitch on a matplotlib axes."""
+    import matplotlib.pyplot as plt
+
     ax.add_patch(plt.Rectangle((0, 0), 120, 80, facecolor='#228B22', edgecolor='white', lw=2))
     ax.plot([60, 60], [0, 80], color="white", lw=2)
     ax.add_patch(plt.Circle((60, 40), 9.15, ec='white', fc='none', lw=2))
@@ -308,7 +213,408 @@ class OddsInputDialog(QDialog):
             }
         }
 
+# --- Chart Widgets ---
+class ChartView(QWidget):
+    """
+    Shows a pre-rendered chart as a pixmap and is reused across analyses by swapping its source.
+    The interactive canvas is only built on request.
+    """
+
+    def __init__(self, placeholder="Chưa có dữ liệu.", parent=None):
+        super().__init__(parent)
+        self.build_figure = None
+        self.args = None
+        self.cache_key = None
+        self.pixmap = None
+
+        layout = QVBoxLayout(self)
+        self.image_label = QLabel(placeholder)
+        self.image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.image_label.setMinimumSize(200, 150)
+        self.interactive_button = QPushButton("Mở biểu đồ tương tác")
+        self.interactive_button.setEnabled(False)
+        self.interactive_button.clicked.connect(self.open_interactive)
+        layout.addWidget(self.image_label, 1)
+        layout.addWidget(self.interactive_button)
+
+    def set_source(self, build_figure, args):
+        """Points the view at new chart data; the image arrives later through `set_image`."""
+        self.build_figure = build_figure
+        self.args = args
+        self.show_message("Đang vẽ biểu đồ...")
+
+    def set_image(self, png_bytes):
+        self.pixmap = QPixmap()
+        self.pixmap.loadFromData(png_bytes, "PNG")
+        self.interactive_button.setEnabled(self.build_figure is not None)
+        self._rescale()
+
+    def show_message(self, message):
+        self.pixmap = None
+        self.image_label.clear()
+        self.image_label.setText(message)
+        self.interactive_button.setEnabled(False)
+
+    def set_error(self, message):
+        self.show_message(f"Lỗi khi vẽ biểu đồ: {message}")
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._rescale()
+
+    def _rescale(self):
+        if self.pixmap is None:
+            return
+        self.image_label.setPixmap(self.pixmap.scaled(
+            self.image_label.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation
+        ))
+
+    def open_interactive(self):
+        dialog = InteractiveChartDialog(self.build_figure(*self.args), self)
+        dialog.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose) # Frees the figure and canvas
+        dialog.exec()
+
+class InteractiveChartDialog(QDialog):
+    def __init__(self, fig, parent=None):
+        from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
+        from matplotlib.backends.backend_qtagg import NavigationToolbar2QT as NavigationToolbar
+
+        super().__init__(parent)
+        self.setWindowTitle("Biểu đồ tương tác")
+        self.resize(900, 650)
+        layout = QVBoxLayout(self)
+        canvas = FigureCanvas(fig)
+        layout.addWidget(NavigationToolbar(canvas, self))
+        layout.addWidget(canvas)
+
+class PredictionDetailsBox(QGroupBox):
+    """Detailed AI predictions; the labels are updated in place for each analysis."""
+
+    def __init__(self, parent=None):
+        super().__init__("Dự đoán Chi tiết", parent)
+        layout = QFormLayout()
+
+        self.expected_goals_label = QLabel()
+        self.best_bet_label = QLabel()
+        self.confidence_label = QLabel()
+        self.scores_label = QLabel()
+        self.scores_label.setWordWrap(True)
+
+        layout.addRow(QLabel("Tổng số bàn thắng kỳ vọng:"), self.expected_goals_label)
+        layout.addRow(QLabel("Lựa chọn Tốt nhất (Best Bet):"), self.best_bet_label)
+        layout.addRow(QLabel("Mức độ tự tin:"), self.confidence_label)
+        
+        # Add a separator
+        separator = QWidget()
+        separator.setFixedHeight(1)
+        separator.setStyleSheet("background-color: #5A6A72;")
+        layout.addRow(separator)
+        layout.addRow(QLabel("Dự đoán Tỷ số:"), self.scores_label)
+        
+        self.setLayout(layout)
+        
+        self.setStyleSheet("""
+            QGroupBox {
+                background-color: #2E4045;
+                color: white;
+                font-size: 16px;
+                font-weight: bold;
+                border: 1px solid #5A6A72;
+                border-radius: 8px;
+                margin-top: 1ex;
+                padding: 15px;
+            }
+            QGroupBox::title {
+                subcontrol-origin: margin;
+                subcontrol-position: top center;
+                padding: -12px 10px 0 10px;
+                color: #E0E0E0;
+            }
+            QLabel {
+                color: white;
+                font-size: 14px;
+                font-weight: normal;
+                background: transparent;
+            }
+        """)
+
+    def update_prediction(self, prediction_data):
+        expected_goals = prediction_data.get('expected_total_goals', 'N/A')
+        best_bet = prediction_data.get('best_bet', 'N/A')
+        confidence = prediction_data.get('confidence_level', 'N/A')
+        score_probs = prediction_data.get('score_probabilities', [])
+
+        self.expected_goals_label.setText(f"<b>{expected_goals}</b>")
+        self.best_bet_label.setText(f"<b>{best_bet}</b>")
+        self.confidence_label.setText(f"<b>{confidence}</b>")
+        
+        # Use <br> for newlines in a QLabel with rich text
+        scores_text = "<br>".join([f"<b>{item.get('score', '?')}</b>: {item.get('probability_pct', '?')}%" for item in score_probs])
+        self.scores_label.setText(scores_text or "N/A")
+
+class JobQueueDialog(QDialog):
+    """Live view of the scheduler's jobs with per-job progress and cancellation."""
+    STATUS_LABELS = {
+        'queued': "Đang chờ",
+        'running': "Đang chạy",
+        'done': "Hoàn tất",
+        'failed': "Lỗi",
+        'cancelled': "Đã hủy",
+    }
+
+    def __init__(self, scheduler, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Hàng đợi công việc")
+        self.resize(800, 400)
+        self.scheduler = scheduler
+
+        layout = QVBoxLayout(self)
+        self.table = QTableWidget(0, 6)
+        self.table.setHorizontalHeaderLabels(["ID", "Công việc", "Loại", "Trạng thái", "Tiến độ", "Thông báo"])
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(5, QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.table)
+
+        cancel_button = QPushButton("Hủy công việc đã chọn")
+        cancel_button.clicked.connect(self.cancel_selected)
+        layout.addWidget(cancel_button)
+
+        scheduler.jobs_changed.connect(self.refresh)
+        self.refresh()
+
+    def refresh(self):
+        jobs = list(self.scheduler.jobs.values())
+        self.table.setRowCount(len(jobs))
+        for row, job in enumerate(jobs):
+            values = [
+                str(job.job_id), job.name, job.kind, self.STATUS_LABELS.get(job.status, job.status),
+                f"{job.percent}%", job.error or job.message,
+            ]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+
+    def cancel_selected(self):
+        for index in self.table.selectionModel().selectedRows():
+            self.scheduler.cancel(int(self.table.item(index.row(), 0).text()))
+
+class StagePerformanceDialog(QDialog):
+    """Per-stage timing breakdown of the latest scrapes, AI runs and chart renders."""
+
+    class _TraceBridge(QObject):
+        # Traces finish on worker threads; the signal hands them to the UI thread
+        trace_finished = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Hiệu năng các giai đoạn")
+        self.resize(800, 500)
+
+        layout = QVBoxLayout(self)
+        self.tree = QTreeWidget()
+        self.tree.setHeaderLabels(["Giai đoạn", "Thời gian (ms)", "Trạng thái", "Chi tiết"])
+        self.tree.header().setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
+        self.tree.header().setSectionResizeMode(3, QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.tree)
+
+        export_button = QPushButton("Xuất metrics (Prometheus)...")
+        export_button.clicked.connect(self.export_metrics)
+        layout.addWidget(export_button)
+
+        self.bridge = self._TraceBridge(self)
+        self.bridge.trace_finished.connect(self.refresh)
+        tracing.tracer.add_listener(self.bridge.trace_finished.emit)
+        self.refresh()
+
+    def _add_span(self, parent, span_record):
+        details = ", ".join(f"{key}={value}" for key, value in span_record.attributes.items())
+        item = QTreeWidgetItem(parent, [
+            span_record.name, f"{span_record.duration * 1000:.1f}",
+            "Lỗi" if span_record.status == 'error' else "OK", span_record.error or details,
+        ])
+        item.setTextAlignment(1, Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        for child in span_record.children:
+            self._add_span(item, child)
+        return item
+
+    def refresh(self, *args):
+        if not self.isVisible() and args:
+            return # Rebuilt in showEvent
+        self.tree.clear()
+        for index, root in enumerate(tracing.tracer.recent_traces()):
+            item = self._add_span(self.tree, root)
+            item.setExpanded(index == 0)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+
+    def export_metrics(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Xuất metrics", "metrics.prom", "Prometheus (*.prom);;All Files (*)")
+        if path:
+            tracing.tracer.write_prometheus(path)
+
+class LiveMatchPage(QWidget):
+    """Shotmap, stats and events of one live match, updated in place from tracker deltas."""
+
+    def __init__(self, teams, parent=None):
+        from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
+        from football_charts import LiveShotmap
+
+        super().__init__(parent)
+        self.shotmap = LiveShotmap(teams['home'], teams['away'])
+        self.canvas = FigureCanvas(self.shotmap.figure)
+        self.stats_table = QTableWidget(0, 3)
+        self.stats_table.setHorizontalHeaderLabels(["Chỉ số", teams['home']['name'], teams['away']['name']])
+        self.stats_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.stats_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.stats_rows = {} # (section title, stat key) -> table row
+        self.event_log = QPlainTextEdit()
+        self.event_log.setReadOnly(True)
+
+        details_splitter = QSplitter(Qt.Orientation.Horizontal)
+        details_splitter.addWidget(self.stats_table)
+        details_splitter.addWidget(self.event_log)
+        splitter = QSplitter(Qt.Orientation.Vertical, self)
+        splitter.addWidget(self.canvas)
+        splitter.addWidget(details_splitter)
+        layout = QVBoxLayout(self)
+        layout.addWidget(splitter)
+
+    def apply_delta(self, delta):
+        from live_tracker import shot_key
+
+        if delta['error']:
+            self.event_log.appendPlainText(f"Lỗi cập nhật: {delta['error']}")
+            return
+        if delta['shots_added'] or delta['shots_updated'] or delta['shots_removed'] or delta['status']:
+            self.shotmap.apply_delta(delta, shot_key)
+            self.canvas.draw_idle()
+
+        # Only the cells of changed stats are touched
+        for key, values in delta['stats_changed'].items():
+            row = self.stats_rows.get(key)
+            if row is None:
+                row = self.stats_rows[key] = self.stats_table.rowCount()
+                self.stats_table.insertRow(row)
+                self.stats_table.setItem(row, 0, QTableWidgetItem(f"{key[0]}: {key[1]}"))
+            values = list(values or []) + ["", ""]
+            self.stats_table.setItem(row, 1, QTableWidgetItem(str(values[0])))
+            self.stats_table.setItem(row, 2, QTableWidgetItem(str(values[1])))
+
+        for event in delta['events_added']:
+            player = (event.get('player') or {}).get('name') or event.get('nameStr') or ""
+            self.event_log.appendPlainText(f"{event.get('time', '?')}' {event.get('type', '')} {player}".rstrip())
+
+
+class LiveMatchesDialog(QDialog):
+    """Follows several live matches at once; each poll only applies what changed."""
+
+    class _DeltaBridge(QObject):
+        # Deltas arrive on the tracker's thread; the signal hands them to the UI thread
+        delta_received = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        from live_tracker import LiveTracker
+
+        super().__init__(parent)
+        self.setWindowTitle("Theo dõi trực tiếp")
+        self.resize(1100, 750)
+
+        self.match_input = QLineEdit()
+        self.match_input.setPlaceholderText("ID hoặc URL trận FotMob")
+        track_button = QPushButton("Theo dõi")
+        track_button.clicked.connect(self.track_match)
+        untrack_button = QPushButton("Bỏ theo dõi")
+        untrack_button.clicked.connect(self.untrack_selected)
+        input_layout = QHBoxLayout()
+        input_layout.addWidget(self.match_input, 1)
+        input_layout.addWidget(track_button)
+        input_layout.addWidget(untrack_button)
+
+        self.match_list = QListWidget()
+        self.pages = QStackedWidget()
+        self.placeholder = QLabel("Đang chờ dữ liệu trận đấu...")
+        self.placeholder.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.pages.addWidget(self.placeholder)
+        self.match_list.currentItemChanged.connect(self.show_selected)
+        splitter = QSplitter(Qt.Orientation.Horizontal)
+        splitter.addWidget(self.match_list)
+        splitter.addWidget(self.pages)
+        splitter.setSizes([250, 850])
+
+        layout = QVBoxLayout(self)
+        layout.addLayout(input_layout)
+        layout.addWidget(splitter)
+
+        self.items = {} # Match ID -> list item
+        self.match_pages = {} # Match ID -> LiveMatchPage, created with the first data
+        self.bridge = self._DeltaBridge(self)
+        self.bridge.delta_received.connect(self.on_delta)
+        self.tracker = LiveTracker(self.bridge.delta_received.emit)
+
+    def track_match(self):
+        reference = self.match_input.text().strip()
+        if not reference:
+            return
+        match_id = match_key_from_reference(reference)
+        if not match_id.isdigit():
+            QMessageBox.warning(self, "Trận không hợp lệ", "Vui lòng nhập ID trận hoặc URL FotMob có #matchId.")
+            return
+        self.match_input.clear()
+        if match_id not in self.items:
+            item = QListWidgetItem(f"Trận {match_id} (đang tải...)")
+            item.setData(Qt.ItemDataRole.UserRole, match_id)
+            self.items[match_id] = item
+            self.match_list.addItem(item)
+        self.match_list.setCurrentItem(self.items[match_id])
+        self.tracker.track(match_id)
+
+    def untrack_selected(self):
+        item = self.match_list.currentItem()
+        if item is None:
+            return
+        match_id = item.data(Qt.ItemDataRole.UserRole)
+        self.tracker.untrack(match_id)
+        self.match_list.takeItem(self.match_list.row(item))
+        del self.items[match_id]
+        page = self.match_pages.pop(match_id, None)
+        if page is not None:
+            self.pages.removeWidget(page)
+            page.deleteLater()
+
+    def on_delta(self, delta):
+        match_id = delta['match_id']
+        if match_id not in self.items: # Untracked while the poll was running
+            return
+        page = self.match_pages.get(match_id)
+        if page is None:
+            if not delta['teams']:
+                self.items[match_id].setText(f"Trận {match_id} (lỗi: {delta['error']})")
+                return
+            page = self.match_pages[match_id] = LiveMatchPage(delta['teams'])
+            self.pages.addWidget(page)
+            if self.match_list.currentItem() is self.items[match_id]:
+                self.pages.setCurrentWidget(page)
+        page.apply_delta(delta)
+        if delta['status']:
+            teams, status = delta['teams'], delta['status']
+            minute = "Kết thúc" if status['finished'] else (status['minute'] or "")
+            self.items[match_id].setText(
+                f"{teams['home']['name']} {status['score'] or '-'} {teams['away']['name']} {minute}".rstrip()
+            )
+
+    def show_selected(self, item, previous=None):
+        page = self.match_pages.get(item.data(Qt.ItemDataRole.UserRole)) if item else None
+        self.pages.setCurrentWidget(page or self.placeholder)
+
+    def shutdown(self):
+        self.tracker.stop()
+
 # --- Main Application ---
+# Older analyses are spilled to disk and reloaded when picked from the recent menu
+MAX_ANALYSES_IN_MEMORY = 3
+
 class ScraperApp(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -319,30 +625,98 @@ class ScraperApp(QMainWindow):
         self.tabs = QTabWidget()
         self.raw_data_text = QTextEdit()
         self.raw_data_text.setReadOnly(True)
+        self.raw_data_browser = RawDataBrowser()
+        self.raw_data_tab = QSplitter(Qt.Orientation.Vertical)
+        self.raw_data_tab.addWidget(self.raw_data_text)
+        self.raw_data_tab.addWidget(self.raw_data_browser)
+        self.raw_data_tab.setSizes([200, 600])
         self.ai_analysis_text = QTextEdit()
         self.ai_analysis_text.setReadOnly(True)
         
         self.ai_vis_tab = QWidget()
         self.ai_vis_layout = QHBoxLayout(self.ai_vis_tab)
         self.shotmap_history_tab = QWidget()
-        self.shotmap_layout = QHBoxLayout(self.shotmap_history_tab)
-
-        self.tabs.addTab(self.raw_data_text, "Dữ liệu thô")
+        shotmap_tab_layout = QVBoxLayout(self.shotmap_history_tab)
+        self.shotmap_controls_layout = QHBoxLayout()
+        self.shotmap_layout = QHBoxLayout()
+        shotmap_tab_layout.addLayout(self.shotmap_controls_layout)
+        shotmap_tab_layout.addLayout(self.shotmap_layout, 1)
+        self._create_visualization_widgets()
+
+        self.tabs.addTab(self.raw_data_tab, "Dữ liệu thô")
         self.tabs.addTab(self.ai_analysis_text, "Phân tích AI")
         self.tabs.addTab(self.ai_vis_tab, "Trực quan hóa AI")
         self.tabs.addTab(self.shotmap_history_tab, "Shotmap Lịch sử")
+        self.tabs.currentChanged.connect(self.materialize_current_tab)
         
         self.setCentralWidget(self.tabs)
         
         self._create_menu_bar()
-        self.create_progress_dialog()
 
         # --- App State ---
         self.raw_data = None
         self.current_config = None
         self.gemini_api_key = None
-        self.thread = QThread() # Luồng cho AI worker
+        self.scheduler = JobScheduler(parent=self) # Scraping, formatting, AI and rendering jobs
+        self.job_queue_dialog = None
+        self.performance_dialog = None
+        self.live_dialog = None
         self.ai_prediction_data = None # Store AI prediction JSON
+        self.session = AnalysisSession(max_in_memory=MAX_ANALYSES_IN_MEMORY) # Analyses of this session
+        self.prediction_log = None # Opened on the first prediction
+        self.current_analysis = None # Analysis shown in the tabs
+        self.next_analysis_id = 1
+        self.dirty_tabs = set() # Tabs whose content is stale and is rebuilt when shown
+        self.prewarm_worker = None
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.prewarm_worker is None:
+            # Let the first frame paint before the background imports compete for the GIL
+            self.prewarm_worker = ImportPrewarmWorker(PREWARM_MODULES)
+            QTimer.singleShot(200, self.prewarm_worker.start)
+
+    def _create_visualization_widgets(self):
+        """Creates the chart widgets once; their content is filled lazily for each analysis."""
+        ai_container = QWidget()
+        ai_container_layout = QVBoxLayout(ai_container)
+        self.win_prob_view = ChartView()
+        self.prediction_details = PredictionDetailsBox()
+        self.prediction_details.hide()
+        ai_container_layout.addWidget(self.win_prob_view)
+        ai_container_layout.addWidget(self.prediction_details)
+        ai_container_layout.addStretch()
+        self.ai_vis_layout.addWidget(ai_container)
+
+        # Shotmap style: individual shots or zones binned on the pitch grid
+        self.shotmap_mode_combo = QComboBox()
+        self.shotmap_mode_combo.addItem("Từng cú sút", userData='shots')
+        self.shotmap_mode_combo.addItem("Mật độ: Số cú sút", userData='count')
+        self.shotmap_mode_combo.addItem("Mật độ: Tổng xG", userData='xg')
+        self.shotmap_mode_combo.addItem("Mật độ: Tỷ lệ chuyển hóa", userData='conversion')
+        self.shotmap_compare_combo = QComboBox()
+        self.shotmap_compare_combo.addItem("Không so sánh", userData='none')
+        self.shotmap_compare_combo.addItem("So với đối thủ", userData='opponent')
+        self.shotmap_compare_combo.addItem("So với trung bình các trận đã tải", userData='average')
+        self.shotmap_compare_combo.setEnabled(False)
+        self.shotmap_mode_combo.currentIndexChanged.connect(self.on_shotmap_style_changed)
+        self.shotmap_compare_combo.currentIndexChanged.connect(self.on_shotmap_style_changed)
+        self.shotmap_controls_layout.addWidget(QLabel("Kiểu hiển thị:"))
+        self.shotmap_controls_layout.addWidget(self.shotmap_mode_combo)
+        self.shotmap_controls_layout.addWidget(QLabel("So sánh:"))
+        self.shotmap_controls_layout.addWidget(self.shotmap_compare_combo)
+        self.shotmap_controls_layout.addStretch()
+
+        self.home_shotmap_view = ChartView()
+        self.away_shotmap_view = ChartView()
+        self.shotmap_layout.addWidget(self.home_shotmap_view)
+        self.shotmap_layout.addWidget(self.away_shotmap_view)
+
+        self.chart_views = {
+            'win_prob': self.win_prob_view,
+            'shotmap_home': self.home_shotmap_view,
+            'shotmap_away': self.away_shotmap_view,
+        }
 
     def _create_menu_bar(self):
         menubar = self.menuBar()
@@ -352,6 +726,24 @@ class ScraperApp(QMainWindow):
         start_action = QAction("Bắt đầu Phân tích Mới", self)
         start_action.triggered.connect(self.start_analysis)
         file_menu.addAction(start_action)
+        self.recent_menu = file_menu.addMenu("Phân tích gần đây")
+        self.recent_menu.setEnabled(False)
+        self.recent_menu.aboutToShow.connect(self._update_recent_menu) # Memory use changes as charts render
+        save_action = QAction("Lưu phân tích...", self)
+        save_action.triggered.connect(self.save_analysis_file)
+        file_menu.addAction(save_action)
+        open_action = QAction("Mở phân tích...", self)
+        open_action.triggered.connect(self.open_analysis_file)
+        file_menu.addAction(open_action)
+        queue_action = QAction("Hàng đợi công việc", self)
+        queue_action.triggered.connect(self.show_job_queue)
+        file_menu.addAction(queue_action)
+        performance_action = QAction("Hiệu năng các giai đoạn", self)
+        performance_action.triggered.connect(self.show_performance)
+        file_menu.addAction(performance_action)
+        live_action = QAction("Theo dõi trực tiếp", self)
+        live_action.triggered.connect(self.show_live_matches)
+        file_menu.addAction(live_action)
         
         # --- Settings Menu ---
         settings_menu = menubar.addMenu("Cài đặt")
@@ -359,17 +751,53 @@ class ScraperApp(QMainWindow):
         api_key_action.triggered.connect(self.set_api_key)
         settings_menu.addAction(api_key_action)
 
-    def create_progress_dialog(self):
-        self.progress_dialog = QProgressDialog("Đang xử lý...", "Hủy", 0, 100, self)
-        self.progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
-        self.progress_dialog.setAutoClose(True)
-        self.progress_dialog.setAutoReset(True)
-        self.progress_dialog.setCancelButton(None) # Không cho phép hủy
-        self.progress_dialog.hide()
-        
-    def update_progress_dialog(self, message, value):
-        self.progress_dialog.setLabelText(message)
-        self.progress_dialog.setValue(value)
+    def _update_recent_menu(self):
+        self.recent_menu.clear()
+        analyses = self.session.analyses()
+        if analyses:
+            usage_action = self.recent_menu.addAction(f"Bộ nhớ đang dùng: {self.session.total_memory_usage() / 1e6:.1f} MB")
+            usage_action.setEnabled(False)
+            self.recent_menu.addSeparator()
+        for analysis in analyses:
+            if self.session.is_loaded(analysis):
+                location = f"{self.session.memory_usage(analysis) / 1e6:.1f} MB"
+            else:
+                location = "trên đĩa"
+            action = QAction(f"#{analysis['id']} - {analysis['title']} ({location})", self)
+            action.triggered.connect(lambda checked, a=analysis: self.show_analysis(a))
+            self.recent_menu.addAction(action)
+        self.recent_menu.setEnabled(bool(analyses))
+
+    def show_job_queue(self):
+        if self.job_queue_dialog is None:
+            self.job_queue_dialog = JobQueueDialog(self.scheduler, self)
+        self.job_queue_dialog.show()
+        self.job_queue_dialog.raise_()
+
+    def show_performance(self):
+        if self.performance_dialog is None:
+            self.performance_dialog = StagePerformanceDialog(self)
+        self.performance_dialog.show()
+        self.performance_dialog.raise_()
+
+    def show_live_matches(self):
+        if self.live_dialog is None:
+            self.live_dialog = LiveMatchesDialog(self)
+        self.live_dialog.show()
+        self.live_dialog.raise_()
+
+    def show_job_progress(self, job):
+        """Mirrors a job's progress messages in the status bar."""
+        job.signals.progress.connect(lambda percent, message: self.statusBar().showMessage(f"{job.name}: {message} ({percent}%)"))
+        job.signals.finished.connect(lambda result: self.statusBar().showMessage(f"{job.name}: hoàn tất", 5000))
+        job.signals.cancelled.connect(lambda: self.statusBar().showMessage(f"{job.name}: đã hủy", 5000))
+
+    def closeEvent(self, event):
+        self.scheduler.shutdown()
+        self.session.close()
+        if self.live_dialog is not None:
+            self.live_dialog.shutdown()
+        super().closeEvent(event)
 
     def start_analysis(self):
         """Gets two match URLs from the user and starts the scraping process."""
@@ -386,33 +814,47 @@ class ScraperApp(QMainWindow):
                 QMessageBox.warning(self, "URL không hợp lệ", "Vui lòng nhập hai URL hợp lệ từ FotMob.")
                 return
 
-            # Clear previous results
+            # Clear previous results; the widgets themselves are kept for the next analysis
+            self.current_analysis = None
             self.raw_data_text.clear()
             self.ai_analysis_text.clear()
-            for i in reversed(range(self.ai_vis_layout.count())): 
-                self.ai_vis_layout.itemAt(i).widget().setParent(None)
-            for i in reversed(range(self.shotmap_layout.count())): 
-                self.shotmap_layout.itemAt(i).widget().setParent(None)
-
-            self.progress_dialog.setLabelText("Đang cào dữ liệu từ 2 trận đấu...")
-            self.progress_dialog.setValue(0)
-            self.progress_dialog.show()
-            
-            self.scraper_worker = MultiMatchScraperWorker(match1_url, match2_url)
-            self.scraper_worker.finished.connect(self.on_scraping_finished)
-            self.scraper_worker.start()
-
-    def on_scraping_finished(self, data, error_message):
-        self.progress_dialog.hide()
-        if error_message:
-            self.on_scraping_error(error_message)
-            return
-            
+            self.update_visualization_tabs_after_ai()
+
+            # Several scrapes can run side by side; the same pair of URLs is only scraped once
+            scrape_key = ('scrape', match1_url, match2_url)
+            if self.scheduler.find_active(scrape_key):
+                QMessageBox.information(self, "Đang xử lý", "Hai trận đấu này đang được cào dữ liệu.")
+                return
+            scrape_job = self.scheduler.submit(
+                "Cào dữ liệu 2 trận đấu", 'scrape',
+                partial(scrape_two_matches, match1_url, match2_url),
+                priority=PRIORITY_SCRAPE, key=scrape_key,
+            )
+            scrape_job.signals.finished.connect(self.on_scraping_finished)
+            scrape_job.signals.failed.connect(self.on_scraping_error)
+            self.show_job_progress(scrape_job)
+
+    def on_scraping_finished(self, data):
         if not data or not data.get('all_teams_for_selection'):
             QMessageBox.critical(self, "Lỗi", "Không thể lấy dữ liệu từ các trận đấu đã cho.")
             return
 
         self.raw_data = data # Store combined data
+        self.show_raw_payload(self.raw_data)
+
+        # Start preparing summaries and shots while the user picks the teams
+        precompute_job = self.scheduler.submit(
+            "Chuẩn bị dữ liệu phân tích", 'format',
+            partial(precompute_analysis_data, data), priority=PRIORITY_FORMAT,
+        )
+        # Transfermarkt lookups are network I/O with their own time budget: a separate job whose
+        # result is added when it arrives, never waited for here
+        squad_job = self.scheduler.submit(
+            "Giá trị đội hình (Transfermarkt)", 'scrape',
+            partial(load_squad_values, data), priority=PRIORITY_SCRAPE,
+            key=('squad_values', data['match1'].get('match_id'), data['match2'].get('match_id')),
+        )
+        squad_job.signals.finished.connect(partial(self.on_squad_values_ready, data))
         
         # --- Team Selection ---
         team_options = self.raw_data['all_teams_for_selection']
@@ -423,68 +865,98 @@ class ScraperApp(QMainWindow):
                 QMessageBox.warning(self, "Lỗi", "Lựa chọn đội không hợp lệ hoặc bạn đã chọn cùng một đội hai lần.")
                 return
             
-            self.prepare_and_run_ai_analysis(team1_id, team1_name, team2_id, team2_name)
+            self.prepare_and_run_ai_analysis(data, precompute_job, team1_id, team1_name, team2_id, team2_name)
         else:
             # User cancelled team selection
+            self.scheduler.cancel(precompute_job.job_id)
             self.raw_data_text.setText("Phân tích đã bị hủy vì chưa chọn đội.")
 
+    def on_squad_values_ready(self, raw_data, squad_values):
+        """Adds the starting-XI values to the lineup data of both matches and refreshes the raw data view."""
+        for match_key in ('match1', 'match2'):
+            raw_data[match_key]['squad_values'] = squad_values.get(match_key, {})
+        if self.raw_data is raw_data:
+            self.show_raw_payload(raw_data)
+
     def on_scraping_error(self, message):
-        self.progress_dialog.hide()
         QMessageBox.critical(self, "Lỗi cào dữ liệu", message)
 
-    def prepare_and_run_ai_analysis(self, home_team_id, home_team_name, away_team_id, away_team_name):
-        """Filters the combined data for the selected teams and runs the AI."""
-        
+    def prepare_and_run_ai_analysis(self, raw_data, precompute_job, home_team_id, home_team_name, away_team_id, away_team_name):
+        """Runs the AI for the selected teams as soon as the precompute job is done."""
+        self.ai_analysis_text.setText("Đang chuẩn bị dữ liệu và gửi tới AI...")
+        self.tabs.setCurrentWidget(self.ai_analysis_text)
+
+        # Never wait for the job here: the pool may be busy with scrapes and other analyses,
+        # and blocking the UI thread on it can freeze the app. Usually the precompute is
+        # already done while the team dialog was open, and subscribe calls back right away.
+        teams = ((home_team_id, home_team_name), (away_team_id, away_team_name))
+        precompute_job.subscribe(
+            on_finished=partial(self.on_precompute_ready, raw_data, teams),
+            on_failed=self.on_precompute_failed,
+            on_cancelled=self.on_precompute_cancelled,
+        )
+
+    def on_precompute_failed(self, message):
+        QMessageBox.critical(self, "Lỗi Dữ liệu", f"Không thể chuẩn bị dữ liệu cho các đội đã chọn.\n{message}")
+
+    def on_precompute_cancelled(self):
+        self.statusBar().showMessage("Chuẩn bị dữ liệu phân tích: đã hủy", 5000)
+
+    def on_precompute_ready(self, raw_data, teams, precomputed):
+        if 'squad_values' not in raw_data['match1']:
+            self.start_ai_analysis(raw_data, teams, precomputed)
+            return
+        # The squad values arrived in time for the prompt; the summaries are formatted again
+        # with them as a job, like the precompute, not on the UI thread
+        squad_values = {match_key: raw_data[match_key]['squad_values'] for match_key in ('match1', 'match2')}
+        summary_job = self.scheduler.submit(
+            "Chuẩn bị dữ liệu phân tích (giá trị đội hình)", 'format',
+            partial(summarize_teams_job, raw_data, squad_values), priority=PRIORITY_FORMAT,
+        )
+        summary_job.subscribe(
+            on_finished=lambda summaries: self.start_ai_analysis(raw_data, teams, {**precomputed, 'summaries': summaries}),
+            on_failed=self.on_precompute_failed,
+            on_cancelled=self.on_precompute_cancelled,
+        )
+
+    def start_ai_analysis(self, raw_data, teams, precomputed):
+        """Uses the precomputed data for the selected teams and runs the AI."""
+        (home_team_id, home_team_name), (away_team_id, away_team_name) = teams
         # Store selected teams for visualization later
         self.selected_home_team_info = {'id': home_team_id, 'name': home_team_name}
         self.selected_away_team_info = {'id': away_team_id, 'name': away_team_name}
 
-        self.ai_analysis_text.setText("Đang chuẩn bị dữ liệu và gửi tới AI...")
-        self.tabs.setCurrentWidget(self.ai_analysis_text)
-
-        # --- Find the correct match data for each selected team ---
-        home_match_data = None
-        if home_team_id in self.raw_data['match1']['team_data']:
-            home_match_data = self.raw_data['match1']
-        elif home_team_id in self.raw_data['match2']['team_data']:
-            home_match_data = self.raw_data['match2']
-
-        away_match_data = None
-        if away_team_id in self.raw_data['match1']['team_data']:
-            away_match_data = self.raw_data['match1']
-        elif away_team_id in self.raw_data['match2']['team_data']:
-            away_match_data = self.raw_data['match2']
-            
-        if not home_match_data or not away_match_data:
-            QMessageBox.critical(self, "Lỗi Dữ liệu", "Không thể tìm thấy dữ liệu trận đấu cho các đội đã chọn.")
+        try:
+            analysis_data = build_analysis_data(
+                precomputed, (home_team_id, home_team_name), (away_team_id, away_team_name)
+            )
+        except AnalysisError as e:
+            QMessageBox.critical(self, "Lỗi Dữ liệu", str(e))
             return
-            
-        # --- Format data for the AI ---
-        home_stats_summary = self.format_full_data_for_ai(home_match_data.get('full_data', {}), home_team_name)
-        away_stats_summary = self.format_full_data_for_ai(away_match_data.get('full_data', {}), away_team_name)
+        home_stats_summary = analysis_data['home_team_stats_summary']
+        away_stats_summary = analysis_data['away_team_stats_summary']
+        analysis = self.create_analysis(raw_data, precomputed)
+
+        # Start the stats-only turn of the analysis before asking for the odds
+        worker = Worker(analysis_data, None, self.gemini_api_key)
+        stats_job = self.scheduler.submit(
+            f"Phân tích AI (thống kê): {analysis['title']}", 'ai', worker.run_stats_turn, priority=PRIORITY_AI
+        )
+        stats_job.subscribe(on_failed=partial(self.on_ai_error, analysis))
+        self.show_job_progress(stats_job)
 
-        # We need to get the odds from the user. For now, let's use a dummy dialog.
         odds_dialog = OddsInputDialog(self)
         if not odds_dialog.exec():
-            self.ai_analysis_text.setText("Phân tích đã bị hủy vì chưa nhập kèo.")
+            self.scheduler.cancel(stats_job.job_id)
+            analysis['analysis_text'] = "Phân tích đã bị hủy vì chưa nhập kèo."
+            self.ai_analysis_text.setText(analysis['analysis_text'])
             return
             
         odds = odds_dialog.get_odds()
-
-        # Create a simplified data structure for the AI
-        analysis_data = {
-            "home_team_name": home_team_name,
-            "away_team_name": away_team_name,
-            "home_team_stats_summary": home_stats_summary,
-            "away_team_stats_summary": away_stats_summary,
-        }
-        
-        # Combine shots from both matches for the shotmap tab later
-        combined_shots_df = pd.concat(
-            [self.raw_data['match1']['shots_df'], self.raw_data['match2']['shots_df']], 
-            ignore_index=True
-        )
-        self.processed_shots_df_for_vis = combined_shots_df
+        analysis['odds'] = odds
+        worker.provide_odds(odds)
+        # The odds turn is a job of its own, started once the stats turn is done
+        stats_job.subscribe(on_finished=partial(self.start_odds_turn, analysis, worker))
 
         raw_display_text = {
             f"Phân tích cho": f"{home_team_name} vs {away_team_name}",
@@ -492,304 +964,314 @@ class ScraperApp(QMainWindow):
             f"Dữ liệu của {away_team_name} được lấy từ trận đấu của họ trong bộ dữ liệu.": away_stats_summary,
             "Kèo đã nhập": odds
         }
-        self.raw_data_text.setPlainText(json.dumps(raw_display_text, indent=2, ensure_ascii=False))
-        
-        self.ai_prediction_data = None # Reset previous AI data
-        self.worker = Worker(analysis_data, odds, self.gemini_api_key)
-        self.worker.moveToThread(self.thread)
-        self.thread.started.connect(self.worker.run)
-        self.worker.finished.connect(self.on_ai_finished)
-        self.worker.error.connect(self.on_ai_error)
-        self.thread.start()
+        analysis['raw_display_text'] = json.dumps(raw_display_text, indent=2, ensure_ascii=False)
+        if analysis is self.current_analysis:
+            self.raw_data_text.setPlainText(analysis['raw_display_text'])
+
+    def start_odds_turn(self, analysis, worker, stats_analysis):
+        odds_job = self.scheduler.submit(
+            f"Phân tích AI: {analysis['title']}", 'ai', worker.run_odds_turn, priority=PRIORITY_AI
+        )
+        odds_job.subscribe(
+            on_finished=partial(self.on_ai_finished, analysis),
+            on_failed=partial(self.on_ai_error, analysis),
+        )
+        self.show_job_progress(odds_job)
+
+    def create_analysis(self, raw_data, precomputed):
+        """Registers a new analysis in the recent list and makes it the current one."""
+        home_team, away_team = self.selected_home_team_info, self.selected_away_team_info
+        analysis = {
+            'id': self.next_analysis_id,
+            'title': f"{home_team['name']} vs {away_team['name']}",
+            'home_team': home_team,
+            'away_team': away_team,
+            'match_ids': [raw_data[key].get('match_id') for key in ('match1', 'match2')],
+            'odds': None,
+            'raw_data': raw_data,
+            'shots_df': precomputed['combined_shots_df'],
+            'team_shots': precomputed['team_shots'],
+            'ai_prediction_data': None,
+            'analysis_text': "Đang chuẩn bị dữ liệu và gửi tới AI...",
+            'raw_display_text': "",
+            'render_cache': {}, # Chart cache key -> PNG bytes, makes switching back to this analysis instant
+        }
+        self.next_analysis_id += 1
+        self.session.add(analysis)
+        self._update_recent_menu()
+
+        self.current_analysis = analysis
+        self.update_visualization_tabs_after_ai()
+        return analysis
+
+    def save_analysis_file(self):
+        """Writes the current analysis to a snapshot file that can be shared and reopened."""
+        analysis = self.current_analysis
+        if analysis is None:
+            QMessageBox.information(self, "Lưu phân tích", "Chưa có phân tích nào để lưu.")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Lưu phân tích", f"{analysis['title']}{SNAPSHOT_SUFFIX}", SNAPSHOT_FILE_FILTER)
+        if not path:
+            return
+        if not path.endswith(SNAPSHOT_SUFFIX):
+            path += SNAPSHOT_SUFFIX
+        with span('ui.save_analysis') as s:
+            try:
+                self.session.load(analysis)
+                # An analysis opened from a file is saved whole, including the parts not read yet
+                if load_lazy_fields(analysis, PAYLOAD_SECTIONS):
+                    self.session.refresh(analysis)
+                write_snapshot(path, analysis)
+            except (OSError, SnapshotError) as e:
+                s.fail(e)
+                QMessageBox.critical(self, "Lỗi lưu phân tích", str(e))
+                return
+        self.statusBar().showMessage(f"Đã lưu phân tích vào {path}", 5000)
+
+    def open_analysis_file(self):
+        """Opens a saved analysis; its shots and raw payloads are read when their tabs are shown."""
+        path, _ = QFileDialog.getOpenFileName(self, "Mở phân tích", "", SNAPSHOT_FILE_FILTER)
+        if not path:
+            return
+        with span('ui.open_analysis') as s:
+            try:
+                analysis = open_analysis(path)
+            except (OSError, SnapshotError) as e:
+                s.fail(e)
+                QMessageBox.critical(self, "Lỗi mở phân tích", str(e))
+                return
+        analysis['id'] = self.next_analysis_id
+        self.next_analysis_id += 1
+        self.session.add(analysis)
+        self._update_recent_menu()
+        self.show_analysis(analysis)
+
+    def read_lazy_fields(self, analysis, fields) -> bool:
+        """Reads payload fields an opened analysis has not loaded yet; False if its file can not be read."""
+        try:
+            if load_lazy_fields(analysis, fields):
+                self.session.refresh(analysis)
+        except (OSError, SnapshotError) as e:
+            self.statusBar().showMessage(f"Không đọc được file phân tích: {e}", 5000)
+            return False
+        return True
+
+    def show_analysis(self, analysis):
+        """Switches the tabs to one of the recent analyses."""
+        self.session.load(analysis)
+        self.current_analysis = analysis
+        self.raw_data = analysis['raw_data']
+        self.selected_home_team_info = analysis['home_team']
+        self.selected_away_team_info = analysis['away_team']
+        self.ai_prediction_data = analysis['ai_prediction_data']
+        self.raw_data_text.setPlainText(analysis['raw_display_text'])
+        self.show_raw_payload(analysis['raw_data'])
+        self.ai_analysis_text.setPlainText(analysis['analysis_text'])
+        self.update_visualization_tabs_after_ai()
+        if analysis['raw_data'] is None:
+            # Opened from a file: the payloads are read when the raw data tab is shown
+            self.dirty_tabs.add(self.raw_data_tab)
+            self.materialize_current_tab()
+
+    def show_raw_payload(self, raw_data):
+        """Shows the full scraped payloads in the raw data tree; rows are created on expand."""
+        payload = {}
+        for index, match_key in enumerate(('match1', 'match2'), start=1):
+            match_data = raw_data.get(match_key, {}) if raw_data else {}
+            if not match_data:
+                continue
+            match_payload = {
+                'team_data': match_data.get('team_data', {}),
+                'shotmap': match_data.get('shotmap', []),
+                'full_data': match_data.get('full_data', {}),
+            }
+            if 'squad_values' in match_data: # Added by its own job once the lookup finishes
+                match_payload['squad_values'] = match_data['squad_values']
+            payload[f"Trận {index} ({match_data.get('match_id', 'N/A')})"] = match_payload
+        self.raw_data_browser.set_payload(payload)
 
     def update_tabs_with_new_data(self):
         # This function is now mostly obsolete and replaced by the new flow
         # We will call the AI worker directly from on_scraping_finished
         pass
 
-    def on_ai_finished(self, result):
+    def on_ai_finished(self, analysis, result):
+        with span('ui.on_ai_finished'):
+            try:
+                analysis_text, ai_data = parse_ai_response(result)
+                analysis['analysis_text'] = analysis_text
+                analysis['ai_prediction_data'] = ai_data # Store for visualization
+                self.log_prediction(analysis, ai_data.get('prediction'))
+
+            except (ValueError, json.JSONDecodeError) as e:
+                analysis['analysis_text'] = f"Lỗi khi xử lý phản hồi từ AI:\n{e}\n\nPhản hồi gốc:\n{result}"
+                analysis['ai_prediction_data'] = None
+            # A spilled analysis has no render cache in memory; it is reloaded before being shown
+            render_cache = analysis.get('render_cache', {})
+            for cache_key in [key for key in render_cache if key[0] == 'win_prob']:
+                del render_cache[cache_key]
+
+            if analysis is self.current_analysis:
+                self.ai_analysis_text.setPlainText(analysis['analysis_text'])
+                self.ai_prediction_data = analysis['ai_prediction_data']
+                self.update_visualization_tabs_after_ai()
+
+    def log_prediction(self, analysis, prediction):
+        """Appends the prediction to the prediction log so it can be backtested once the match is played."""
+        from prediction_log import PredictionLog, prediction_record
+
+        if not prediction:
+            return
         try:
-            # Split the response into JSON and text parts
-            if "---" in result:
-                json_str, analysis_text = result.split("---", 1)
-            else: # Fallback if AI forgets the separator
-                json_match = re.search(r'\{.*\}', result, re.DOTALL)
-                if not json_match:
-                    raise ValueError("Không tìm thấy JSON hợp lệ trong phản hồi của AI.")
-                json_str = json_match.group(0)
-                analysis_text = result.replace(json_str, '')
-
-            # Clean and parse the JSON
-            json_str = json_str.strip().replace("```json", "").replace("```", "")
-            ai_data = json.loads(json_str)
-            
-            self.ai_analysis_text.setPlainText(analysis_text.strip())
-            self.ai_prediction_data = ai_data # Store for visualization
-            
-        except (ValueError, json.JSONDecodeError) as e:
-            error_message = f"Lỗi khi xử lý phản hồi từ AI:\n{e}\n\nPhản hồi gốc:\n{result}"
-            self.ai_analysis_text.setPlainText(error_message)
+            if self.prediction_log is None:
+                self.prediction_log = PredictionLog()
+            self.prediction_log.append([prediction_record(
+                prediction, analysis['home_team'], analysis['away_team'], analysis.get('odds')
+            )])
+        except OSError as e:
+            print(f"Could not write the prediction log: {e}")
+
+    def on_ai_error(self, analysis, message):
+        analysis['analysis_text'] = f"Lỗi khi phân tích AI:\n{message}"
+        analysis['ai_prediction_data'] = None
+        if analysis is self.current_analysis:
+            self.ai_analysis_text.setPlainText(analysis['analysis_text'])
             self.ai_prediction_data = None
-        
-        self.thread.quit()
-        self.thread.wait()
-        self.update_visualization_tabs_after_ai()
-
-    def on_ai_error(self, message):
-        self.ai_analysis_text.setPlainText(f"Lỗi khi phân tích AI:\n{message}")
-        self.ai_prediction_data = None
-        self.thread.quit()
-        self.thread.wait()
 
     def update_visualization_tabs_after_ai(self):
-        # Clear existing visualizations
-        for i in reversed(range(self.ai_vis_layout.count())): 
-            self.ai_vis_layout.itemAt(i).widget().setParent(None)
-        for i in reversed(range(self.shotmap_layout.count())): 
-            self.shotmap_layout.itemAt(i).widget().setParent(None)
-
-        # --- AI Visualization Tab ---
-        if hasattr(self, 'ai_prediction_data') and self.ai_prediction_data:
-            try:
-                prediction = self.ai_prediction_data.get('prediction', {})
-                win_prob_chart = self.create_win_prob_chart(prediction)
-                other_preds_display = self.create_other_predictions_display(prediction)
-                
-                # Add to a container widget for better layout control
-                container = QWidget()
-                container_layout = QVBoxLayout(container)
-                container_layout.addWidget(win_prob_chart)
-                container_layout.addWidget(other_preds_display)
-                container_layout.addStretch()
-
-                self.ai_vis_layout.addWidget(container)
-
-            except Exception as e:
-                self.ai_vis_layout.addWidget(QLabel(f"Lỗi khi tạo trực quan hóa AI: {e}"))
-        else:
-            self.ai_vis_layout.addWidget(QLabel("Không có dữ liệu dự đoán từ AI để trực quan hóa."))
-
-
-        # --- Shotmap Tab ---
-        if hasattr(self, 'processed_shots_df_for_vis') and not self.processed_shots_df_for_vis.empty:
-            shots_df = self.processed_shots_df_for_vis
-
-            home_id = self.selected_home_team_info['id']
-            away_id = self.selected_away_team_info['id']
-            home_name = self.selected_home_team_info['name']
-            away_name = self.selected_away_team_info['name']
-
-            home_shots_df = shots_df[shots_df['teamId'] == home_id]
-            away_shots_df = shots_df[shots_df['teamId'] == away_id]
-            
-            self.update_shotmap_tab_combined(home_shots_df, home_name, "Dữ liệu trận gần nhất")
-            self.update_shotmap_tab_combined(away_shots_df, away_name, "Dữ liệu trận gần nhất")
-        else:
-             self.shotmap_layout.addWidget(QLabel("Không tìm thấy dữ liệu shotmap hoặc đội được chọn."))
-
-    def create_win_prob_chart(self, prediction_data):
-        fig = Figure(figsize=(6, 4), dpi=100)
-        canvas = FigureCanvas(fig)
-        ax = fig.add_subplot(111)
+        """Marks the visualization tabs stale; only the visible one is rebuilt right away."""
+        self.dirty_tabs = {self.ai_vis_tab, self.shotmap_history_tab}
+        self.materialize_current_tab()
 
-        home_prob = prediction_data.get('home_team_win_prob_pct', 0)
-        draw_prob = prediction_data.get('draw_prob_pct', 0)
-        away_prob = prediction_data.get('away_team_win_prob_pct', 0)
-        
-        teams = [self.selected_away_team_info['name'], 'Hòa', self.selected_home_team_info['name']]
-        probs = [away_prob, draw_prob, home_prob]
-        colors = ['#d9534f', '#f0ad4e', '#5cb85c'] # Red, Orange, Green
-
-        bars = ax.barh(teams, probs, color=colors, height=0.6)
-        ax.set_xlabel('Xác suất (%)', color='white', fontsize=12)
-        ax.set_title('Dự đoán Kết quả Trận đấu', color='white', fontsize=16)
-        ax.tick_params(axis='x', colors='white')
-        ax.tick_params(axis='y', colors='white', labelsize=12)
-        ax.set_xlim(0, 100)
-
-        # Add percentage labels on bars
-        for bar in bars:
-            width = bar.get_width()
-            label_x_pos = width + 1
-            ax.text(label_x_pos, bar.get_y() + bar.get_height()/2, f'{width}%', ha='left', va='center', color='white', fontsize=11, fontweight='bold')
-
-        fig.set_facecolor("#22312b")
-        ax.set_facecolor("#22312b")
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        ax.spines['left'].set_color('white')
-        ax.spines['bottom'].set_color('white')
-        
-        fig.tight_layout()
-        return canvas
-
-    def create_other_predictions_display(self, prediction_data):
-        widget = QGroupBox("Dự đoán Chi tiết")
-        layout = QFormLayout()
-
-        expected_goals = prediction_data.get('expected_total_goals', 'N/A')
-        best_bet = prediction_data.get('best_bet', 'N/A')
-        confidence = prediction_data.get('confidence_level', 'N/A')
-        score_probs = prediction_data.get('score_probabilities', [])
-
-        layout.addRow(QLabel("Tổng số bàn thắng kỳ vọng:"), QLabel(f"<b>{expected_goals}</b>"))
-        layout.addRow(QLabel("Lựa chọn Tốt nhất (Best Bet):"), QLabel(f"<b>{best_bet}</b>"))
-        layout.addRow(QLabel("Mức độ tự tin:"), QLabel(f"<b>{confidence}</b>"))
-        
-        # Add a separator
-        separator = QWidget()
-        separator.setFixedHeight(1)
-        separator.setStyleSheet("background-color: #5A6A72;")
-        layout.addRow(separator)
-        
-        # Display score probabilities
-        if score_probs:
-            # Use <br> for newlines in a QLabel with rich text
-            scores_text = "<br>".join([f"<b>{item.get('score', '?')}</b>: {item.get('probability_pct', '?')}%" for item in score_probs])
-            scores_label = QLabel(scores_text)
-            scores_label.setWordWrap(True)
-            layout.addRow(QLabel("Dự đoán Tỷ số:"), scores_label)
-        
-        widget.setLayout(layout)
-        
-        widget.setStyleSheet("""
-            QGroupBox {
-                background-color: #2E4045;
-                color: white;
-                font-size: 16px;
-                font-weight: bold;
-                border: 1px solid #5A6A72;
-                border-radius: 8px;
-                margin-top: 1ex;
-                padding: 15px;
-            }
-            QGroupBox::title {
-                subcontrol-origin: margin;
-                subcontrol-position: top center;
-                padding: -12px 10px 0 10px;
-                color: #E0E0E0;
-            }
-            QLabel {
-                color: white;
-                font-size: 14px;
-                font-weight: normal;
-                background: transparent;
-            }
-        """)
-        return widget
-
-    def format_full_data_for_ai(self, full_data, team_name):
-        """Formats all the new, detailed data into a string for the AI prompt."""
-        if not full_data:
-            return "Không có dữ liệu chi tiết."
-    
-        output = ""
-        
-        # 1. Goalscorers
-        facts = full_data.get('matchFacts', {})
-        if facts and 'goals' in facts and facts['goals']:
-            output += "Ghi bàn:\n"
-            for goal in facts['goals']:
-                scorer_line = f"- {goal.get('scorerName', 'N/A')} {goal.get('timeStr', '')}"
-                if goal.get('isOwnGoal'):
-                    scorer_line += f" (Phản lưới nhà)"
-                output += scorer_line + "\n"
-        
-        # 2. Detailed Stats
-        stats_data = full_data.get('stats', {})
-        if stats_data and 'stats' in stats_data and stats_data.get('stats'):
-            output += "\nThống kê chi tiết:\n"
-            for section in stats_data['stats']:
-                if 'teamNames' not in section or len(section['teamNames']) < 2:
-                    continue
-                
-                output += f"**{section['title']}**\n"
-                for stat in section['stats']:
-                    home_val = stat['stats'][0]
-                    away_val = stat['stats'][1]
-                    
-                    team_val = "N/A"
-                    if section['teamNames'][0] == team_name:
-                        team_val = home_val
-                    elif section['teamNames'][1] == team_name:
-                        team_val = away_val
-                    
-                    output += f"- {stat['key']}: {team_val}\n"
-        
-        # 3. Lineup
-        lineup_data = full_data.get('lineup', {})
-        if lineup_data and lineup_data.get('lineup'):
-            output += "\nĐội hình ra sân:\n"
-            for team_lineup in lineup_data['lineup']:
-                if team_lineup.get('teamName') == team_name:
-                    output += f"- Sơ đồ: {team_lineup.get('formation', 'N/A')}\n"
-        
-        # 4. H2H
-        h2h_data = full_data.get('h2h', {})
-        if h2h_data and h2h_data.get('matches'):
-            output += "\nLịch sử đối đầu (3 trận gần nhất):\n"
-            for match in h2h_data['matches'][:3]:
-                home = match.get('home', {}).get('name')
-                away = match.get('away', {}).get('name')
-                winner = match.get('winner')
-                result = f"{home} {match.get('score')} {away}"
-                if winner == 'home':
-                    result += f" (Thắng: {home})"
-                elif winner == 'away':
-                    result += f" (Thắng: {away})"
-                else:
-                    result += " (Hòa)"
-                output += f"- {result}\n"
-
-        # 5. Table position
-        table_data = full_data.get('table', {})
-        if table_data:
-            all_tables = table_data.get('tables', [])
-            if all_tables:
-                first_table = all_tables[0].get('table', {})
-                if 'all' in first_table:
-                    output += "\nBảng xếp hạng:\n"
-                    for team_stats in first_table['all']:
-                        if team_stats.get('name') == team_name:
-                            pos = team_stats.get('idx')
-                            pts = team_stats.get('pts')
-                            played = team_stats.get('played')
-                            wins = team_stats.get('wins')
-                            draws = team_stats.get('draws')
-                            losses = team_stats.get('losses')
-                            gd = team_stats.get('goalDifference')
-                            output += f"- Vị trí: {pos}, Điểm: {pts}, (Thắng: {wins}, Hòa: {draws}, Thua: {losses}), Hiệu số: {gd}\n"
-
-        return output.strip() if output else "Không có dữ liệu chi tiết."
-
-    def update_shotmap_tab_combined(self, shots_df, team_name, title_suffix):
-        fig = Figure(figsize=(8, 5), dpi=100)
-        canvas = FigureCanvas(fig)
-        ax = fig.add_subplot(111)
-
-        # Use Opta pitch type which is 100x100, matching FotMob's coordinate system
-        pitch = Pitch(pitch_type='opta', pitch_color='#22312b', line_color='#c7d5cc')
-        pitch.draw(ax=ax)
+    def materialize_current_tab(self):
+        tab = self.tabs.currentWidget()
+        if tab not in self.dirty_tabs:
+            return
+        self.dirty_tabs.discard(tab)
+
+        if tab is self.ai_vis_tab:
+            self.materialize_ai_vis_tab()
+        elif tab is self.shotmap_history_tab:
+            self.materialize_shotmap_tab()
+        elif tab is self.raw_data_tab:
+            self.materialize_raw_data_tab()
+
+    def materialize_raw_data_tab(self):
+        analysis = self.current_analysis
+        if analysis and self.read_lazy_fields(analysis, ('raw_data',)):
+            self.raw_data = analysis['raw_data']
+            self.show_raw_payload(analysis['raw_data'])
+
+    def materialize_ai_vis_tab(self):
+        from football_charts import build_win_prob_figure
+
+        analysis = self.current_analysis
+        if not analysis or not analysis['ai_prediction_data']:
+            self.win_prob_view.show_message("Không có dữ liệu dự đoán từ AI để trực quan hóa.")
+            self.prediction_details.hide()
+            return
 
-        # The input is now a DataFrame, so we convert it to a list of dicts to iterate
-        all_shots = shots_df.to_dict('records')
+        try:
+            prediction = analysis['ai_prediction_data'].get('prediction', {})
+            home_name = analysis['home_team']['name']
+            away_name = analysis['away_team']['name']
+            self.prediction_details.update_prediction(prediction)
+            self.prediction_details.show()
+
+            probs = tuple(prediction.get(k, 0) for k in ('home_team_win_prob_pct', 'draw_prob_pct', 'away_team_win_prob_pct'))
+            cache_key = ('win_prob', (home_name, away_name), probs, 'default')
+            self.render_charts(analysis, [('win_prob', cache_key, build_win_prob_figure, (prediction, home_name, away_name))])
+        except Exception as e:
+            self.win_prob_view.show_message(f"Lỗi khi tạo trực quan hóa AI: {e}")
+            self.prediction_details.hide()
+
+    def on_shotmap_style_changed(self):
+        self.shotmap_compare_combo.setEnabled(self.shotmap_mode_combo.currentData() != 'shots')
+        self.dirty_tabs.add(self.shotmap_history_tab)
+        self.materialize_current_tab()
+
+    def materialize_shotmap_tab(self):
+        from football_charts import build_shotmap_figure, build_shot_density_figure, bin_shots, loaded_matches_average_grid
+
+        analysis = self.current_analysis
+        if analysis:
+            self.read_lazy_fields(analysis, ('shots_df', 'team_shots'))
+        if not analysis or analysis['shots_df'] is None or analysis['shots_df'].empty:
+            self.home_shotmap_view.show_message("Không tìm thấy dữ liệu shotmap hoặc đội được chọn.")
+            self.away_shotmap_view.show_message("")
+            return
 
-        if not all_shots:
-            ax.text(60, 40, 'Không có dữ liệu shotmap', ha='center', va='center', fontsize=12, color='white')
-        else:
-            for shot in all_shots:
-                x = shot['x']
-                y = shot['y']
-                is_goal = shot.get('eventType') == 'Goal'
-                marker = '*' if is_goal else 'o'
-                color = 'yellow' if is_goal else 'red'
-                size = 200 if is_goal else 70
-                pitch.scatter(x, y, ax=ax, s=size, c=color, marker=marker, edgecolors='black', alpha=0.9)
-
-        ax.set_title(f"Tổng hợp Shotmap của {team_name}\n({title_suffix})", color="white", fontsize=14)
-        fig.set_facecolor("#22312b")
-        
-        self.shotmap_layout.addWidget(canvas)
+        shots_df = analysis['shots_df']
+        match_set = tuple(analysis['match_ids'])
+        mode = self.shotmap_mode_combo.currentData()
+        compare = self.shotmap_compare_combo.currentData() if mode != 'shots' else 'none'
+        teams = (('shotmap_home', analysis['home_team'], analysis['away_team']),
+                 ('shotmap_away', analysis['away_team'], analysis['home_team']))
+
+        def team_grid(team_info):
+            team_shots_df = analysis['team_shots'].get(team_info['id'], shots_df.iloc[0:0])
+            return bin_shots(team_shots_df, cache_key=('team', team_info['id'], match_set))
+
+        render_jobs = []
+        for slot, team_info, opponent_info in teams:
+            team_shots_df = analysis['team_shots'].get(team_info['id'], shots_df.iloc[0:0])
+            cache_key = ('shotmap', team_info['id'], match_set, (mode, compare))
+            if mode == 'shots':
+                args = (team_shots_df, team_info['name'], "Dữ liệu trận gần nhất")
+                render_jobs.append((slot, cache_key, build_shotmap_figure, args))
+                continue
+
+            # Binning is vectorized and cached, so only the drawing goes to the render job
+            compare_grid, compare_label = None, None
+            if compare == 'opponent':
+                compare_grid, compare_label = team_grid(opponent_info), opponent_info['name']
+            elif compare == 'average':
+                compare_grid = loaded_matches_average_grid(shots_df, cache_key=('all', match_set))
+                compare_label = f"trung bình {compare_grid['n_teams']} đội trong các trận đã tải"
+            args = (team_grid(team_info), team_info['name'], "Dữ liệu trận gần nhất", mode, compare_grid, compare_label)
+            render_jobs.append((slot, cache_key, build_shot_density_figure, args))
+        self.render_charts(analysis, render_jobs)
+
+    def render_charts(self, analysis, render_jobs):
+        """Shows cached images of `analysis` immediately and renders the rest as scheduler jobs."""
+        for slot, cache_key, build_figure, args in render_jobs:
+            view = self.chart_views[slot]
+            view.set_source(build_figure, args)
+            view.cache_key = cache_key
+            if cache_key in analysis['render_cache']:
+                view.set_image(analysis['render_cache'][cache_key])
+                continue
+
+            # Identical charts requested by several analyses share one render job
+            render_job = self.scheduler.submit(
+                f"Vẽ biểu đồ: {analysis['title']}", 'render',
+                partial(render_chart_job, cache_key, build_figure, args),
+                priority=PRIORITY_RENDER, key=('render', cache_key),
+            )
+            # A shared job may already be over; subscribe replays its outcome then
+            render_job.subscribe(
+                on_finished=partial(self.on_chart_ready, analysis, slot, cache_key),
+                on_failed=partial(self.on_chart_failed, analysis, slot, cache_key),
+                on_cancelled=partial(self.on_chart_cancelled, analysis, slot, cache_key),
+            )
+
+    def on_chart_ready(self, analysis, slot, cache_key, png_bytes):
+        if self.session.is_loaded(analysis):
+            analysis['render_cache'][cache_key] = png_bytes
+        # Charts of an analysis or style that is no longer shown only go to the cache
+        view = self.chart_views[slot]
+        if analysis is self.current_analysis and view.cache_key == cache_key:
+            view.set_image(png_bytes)
+
+    def on_chart_failed(self, analysis, slot, cache_key, message):
+        view = self.chart_views[slot]
+        if analysis is self.current_analysis and view.cache_key == cache_key:
+            view.set_error(message)
+
+    def on_chart_cancelled(self, analysis, slot, cache_key):
+        view = self.chart_views[slot]
+        if analysis is self.current_analysis and view.cache_key == cache_key:
+            view.show_message("Đã hủy vẽ biểu đồ.")
 
     def set_api_key(self):
         text, ok = QInputDialog.getText(self, 'Nhập API Key', 'Vui lòng nhập Google Gemini API Key của bạn:')
@@ -798,6 +1280,7 @@ class ScraperApp(QMainWindow):
             QMessageBox.information(self, "Thành công", "Đã lưu API Key cho phiên này.")
 
 if __name__ == '__main__':
+    tracing.configure_from_env()
     app = QApplication(sys.argv)
     window = ScraperApp()
     window.show()
@@ -0,0 +1,54 @@
+"""
+Local store of scraped FotMob matches: one gzipped JSON file per match, named by match ID.
+
+Files are written atomically, so several crawler processes can fill the same store and a
+crash never leaves a half-written match behind. The shots DataFrame is not stored; it is
+rebuilt from the shotmap on load.
+"""
+import gzip
+import json
+import os
+
+MATCH_FILE_SUFFIX = '.json.gz'
+STORED_FIELDS = ('match_id', 'team_data', 'shotmap', 'full_data')
+
+
+class MatchStore:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, match_id) -> str:
+        return os.path.join(self.directory, f"{match_id}{MATCH_FILE_SUFFIX}")
+
+    def __contains__(self, match_id) -> bool:
+        return os.path.exists(self.path(match_id))
+
+    def match_ids(self) -> list:
+        return sorted(name[:-len(MATCH_FILE_SUFFIX)] for name in os.listdir(self.directory)
+                      if name.endswith(MATCH_FILE_SUFFIX))
+
+    def save(self, match_data) -> str:
+        """Stores a get_fotmob_match_data result; returns the file path."""
+        record = {field: match_data[field] for field in STORED_FIELDS}
+        # JSON object keys are strings; keep the team IDs' original type on load
+        record['team_data'] = [[team_id, team_name] for team_id, team_name in match_data['team_data'].items()]
+        path = self.path(match_data['match_id'])
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(temp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+            json.dump(record, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_path, path)
+        return path
+
+    def load(self, match_id) -> dict:
+        """Returns the match in the shape of get_fotmob_match_data; raises KeyError if it is not stored."""
+        import pandas as pd
+
+        path = self.path(match_id)
+        if not os.path.exists(path):
+            raise KeyError(match_id)
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            record = json.load(f)
+        record['team_data'] = dict(record['team_data'])
+        record['shots_df'] = pd.DataFrame(record['shotmap']) if record['shotmap'] else pd.DataFrame()
+        return record
@@ -0,0 +1,259 @@
+"""
+Bulk bookmaker odds: import odds of many fixtures from CSV/JSON, turn them into fair
+probabilities and flag value against model or AI probabilities.
+
+    from odds_table import load_odds_file, add_fair_probabilities, find_value
+    odds_df = add_fair_probabilities(load_odds_file('odds.csv'))
+    value_df = find_value(odds_df, predictions_frame(results), min_edge=0.05)
+
+Accepted inputs, one fixture per row/record:
+- CSV with the flat ODDS_COLUMNS names (euro_home, ou_line, ...), or a football-data.co.uk
+  file (HomeTeam, AwayTeam, B365H, B365>2.5, AHh, ...) read for one bookmaker prefix;
+- JSON (a list or JSON lines) of flat records or of records shaped like batch tasks:
+  {"name"/"fixture": ..., "odds": {"euro": {"home": ..}, "handicap": {..}, "ou": {..}}}.
+
+Rows are keyed by `fixture` (the batch task name, or "Home - Away" when none is given).
+Every step works on whole columns, so thousands of fixtures take milliseconds.
+"""
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from analysis_core import ODDS_FIELDS
+
+# Columns of the odds table and their dtypes
+ODDS_COLUMNS = {
+    'fixture': 'string',
+    'home_team': 'string',
+    'away_team': 'string',
+    'date': 'string',
+    'bookmaker': 'string',
+    **{f"{market}_{field}": 'float64' for market, fields in ODDS_FIELDS.items() for field in fields},
+}
+# Outcome columns of each market, in the order of their probabilities
+MARKET_OUTCOMES = {
+    'euro': ('home', 'draw', 'away'),
+    'handicap': ('home', 'away'),
+    'ou': ('over', 'under'),
+}
+OVERROUND_METHODS = ('proportional', 'power')
+DEFAULT_MIN_EDGE = 0.05 # Expected return per unit staked needed to flag a bet as value
+POWER_METHOD_ITERATIONS = 30
+
+DEFAULT_FOOTBALL_DATA_BOOKMAKER = 'B365'
+# football-data.co.uk column (after the bookmaker prefix) -> odds table column
+FOOTBALL_DATA_ODDS_COLUMNS = {
+    'H': 'euro_home', 'D': 'euro_draw', 'A': 'euro_away',
+    '>2.5': 'ou_over', '<2.5': 'ou_under',
+    'AHH': 'handicap_home', 'AHA': 'handicap_away',
+}
+FOOTBALL_DATA_COLUMNS = {'HomeTeam': 'home_team', 'AwayTeam': 'away_team', 'Date': 'date', 'AHh': 'handicap_line'}
+
+
+def to_number(values) -> pd.Series:
+    """
+    Parses odds and lines given as numbers or strings: decimal commas are accepted and split
+    Asian lines such as "0/0.5" or "-0.5/1" become their average. Anything else is NaN.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype('float64')
+    text = values.astype('string').str.strip().str.replace(',', '.', regex=False)
+    parts = text.str.split('/', n=1, expand=True)
+    first = pd.to_numeric(parts[0], errors='coerce').astype('float64')
+    if parts.shape[1] == 1:
+        return first
+    second = pd.to_numeric(parts[1], errors='coerce').astype('float64').abs()
+    # "-0.5/1" is the line between -0.5 and -1: the sign applies to both halves (also for "-0/0.5")
+    second = second.where(~text.str.startswith('-').fillna(False), -second)
+    return first.where(parts[1].isna(), (first + second) / 2)
+
+
+def to_odds_frame(df) -> pd.DataFrame:
+    """Restricts `df` to ODDS_COLUMNS with their dtypes; odds of 1.0 or less are invalid and become NaN."""
+    df = df.reindex(columns=list(ODDS_COLUMNS))
+    for column, dtype in ODDS_COLUMNS.items():
+        if dtype == 'float64':
+            df[column] = to_number(df[column]).to_numpy()
+            if not column.endswith('_line'):
+                df.loc[df[column] <= 1.0, column] = np.nan
+        else:
+            df[column] = df[column].astype(dtype)
+    missing_fixture = df['fixture'].isna()
+    df.loc[missing_fixture, 'fixture'] = df['home_team'] + ' - ' + df['away_team']
+    return df.reset_index(drop=True)
+
+
+def _flatten_record(record) -> dict:
+    """A JSON record with nested `odds` (the batch task format) as one flat row."""
+    row = {key: value for key, value in record.items() if not isinstance(value, (dict, list))}
+    row.setdefault('fixture', record.get('name'))
+    for market, fields in ODDS_FIELDS.items():
+        for field in fields:
+            value = (record.get('odds') or {}).get(market, {}).get(field)
+            if value not in (None, ""):
+                row[f"{market}_{field}"] = value
+    return row
+
+
+def _from_football_data(df, bookmaker) -> pd.DataFrame:
+    columns = {**FOOTBALL_DATA_COLUMNS, **{f"{bookmaker}{suffix}": column for suffix, column in FOOTBALL_DATA_ODDS_COLUMNS.items()}}
+    table = df[[column for column in columns if column in df.columns]].rename(columns=columns)
+    if f"{bookmaker}>2.5" in df.columns:
+        table['ou_line'] = 2.5
+    table['bookmaker'] = bookmaker
+    return table
+
+
+def load_odds_file(path, bookmaker=DEFAULT_FOOTBALL_DATA_BOOKMAKER) -> pd.DataFrame:
+    """Reads a CSV or JSON (list or lines) odds file into a typed odds table."""
+    if os.path.splitext(path)[1].lower() in ('.json', '.jsonl'):
+        with open(path, encoding='utf-8') as f:
+            text = f.read().strip()
+        records = json.loads(text) if text.startswith('[') else [json.loads(line) for line in text.splitlines() if line.strip()]
+        return to_odds_frame(pd.DataFrame([_flatten_record(record) for record in records]))
+
+    df = pd.read_csv(path, dtype=str, encoding='utf-8-sig')
+    if 'HomeTeam' in df.columns:
+        df = _from_football_data(df, bookmaker)
+    return to_odds_frame(df)
+
+
+def remove_overround(odds, method='proportional'):
+    """
+    Fair probabilities of a market from a (rows x outcomes) array of decimal odds.
+    Returns (probabilities, overround); rows with a missing price are NaN.
+
+    'proportional' scales the implied probabilities 1/odds to sum to 1. 'power' finds k per
+    row with sum((1/odds)^k) = 1, which takes more margin off long shots (favourite-longshot bias).
+    """
+    if method not in OVERROUND_METHODS:
+        raise ValueError(f"Phương pháp không hợp lệ: {method} (chọn một trong {', '.join(OVERROUND_METHODS)})")
+    implied = 1.0 / np.asarray(odds, dtype=float)
+    booksum = implied.sum(axis=1)
+    if method == 'proportional':
+        return implied / booksum[:, None], booksum - 1
+
+    # Newton's method on f(k) = sum(p^k) - 1, which is convex and decreasing in k
+    log_implied = np.log(implied)
+    k = np.ones(len(implied))
+    with np.errstate(invalid='ignore'):
+        for _ in range(POWER_METHOD_ITERATIONS):
+            powered = implied ** k[:, None]
+            k = k - (powered.sum(axis=1) - 1) / (powered * log_implied).sum(axis=1)
+    probabilities = implied ** k[:, None]
+    return probabilities / probabilities.sum(axis=1)[:, None], booksum - 1
+
+
+def add_fair_probabilities(odds_df, method='proportional') -> pd.DataFrame:
+    """Adds prob_<market>_<outcome> and overround_<market> columns for every market."""
+    odds_df = odds_df.copy()
+    for market, outcomes in MARKET_OUTCOMES.items():
+        probabilities, overround = remove_overround(odds_df[[f"{market}_{outcome}" for outcome in outcomes]], method)
+        for index, outcome in enumerate(outcomes):
+            odds_df[f"prob_{market}_{outcome}"] = probabilities[:, index]
+        odds_df[f"overround_{market}"] = overround
+    return odds_df
+
+
+def fair_euro_probabilities(odds, method='proportional'):
+    """(home, draw, away) fair probabilities of one fixture's odds dict, or None if a price is missing."""
+    prices = to_number([(odds or {}).get('euro', {}).get(outcome) for outcome in MARKET_OUTCOMES['euro']])
+    if prices.isna().any() or (prices <= 1.0).any():
+        return None
+    probabilities, _ = remove_overround(prices.to_numpy()[None, :], method)
+    return tuple(float(p) for p in probabilities[0])
+
+
+def poisson_over_probability(expected_goals, line) -> np.ndarray:
+    """P(total goals > line) for Poisson totals; NaN unless the line is a half line such as 2.5."""
+    expected_goals = np.asarray(expected_goals, dtype=float)
+    line = np.asarray(line, dtype=float)
+    with np.errstate(invalid='ignore'):
+        goals_needed = np.floor(line) # Over 2.5 loses with 0, 1 or 2 goals
+        half_line = (line - goals_needed) == 0.5
+    max_goals = int(np.nanmax(np.where(half_line, goals_needed, 0), initial=0))
+    term = np.exp(-expected_goals)
+    under = np.zeros_like(expected_goals)
+    for goals in range(max_goals + 1):
+        under += np.where(goals <= goals_needed, term, 0.0)
+        term = term * expected_goals / (goals + 1)
+    return np.where(half_line & ~np.isnan(expected_goals), 1 - under, np.nan)
+
+
+def predictions_frame(results) -> pd.DataFrame:
+    """
+    Model probabilities from analysis results (run_analysis / analysis_cli output): one row per
+    fixture with model_home/draw/away (normalized to sum to 1) and expected_total_goals.
+    """
+    rows = []
+    for result in results:
+        prediction = result.get('prediction') or {}
+        home, away = ((result.get(side) or {}).get('name') for side in ('home_team', 'away_team'))
+        rows.append({
+            'fixture': result.get('name') or (f"{home} - {away}" if home and away else None),
+            'model_home': prediction.get('home_team_win_prob_pct'),
+            'model_draw': prediction.get('draw_prob_pct'),
+            'model_away': prediction.get('away_team_win_prob_pct'),
+            'expected_total_goals': prediction.get('expected_total_goals'),
+        })
+    df = pd.DataFrame(rows, columns=['fixture', 'model_home', 'model_draw', 'model_away', 'expected_total_goals'])
+    df['fixture'] = df['fixture'].astype('string')
+    outcomes = ['model_home', 'model_draw', 'model_away']
+    for column in outcomes + ['expected_total_goals']:
+        df[column] = to_number(df[column]).to_numpy()
+    # The AI's percentages rarely add up to exactly 100
+    df[outcomes] = df[outcomes].div(df[outcomes].sum(axis=1, min_count=3), axis=0)
+    return df.dropna(subset=['fixture']).drop_duplicates('fixture', keep='last')
+
+
+def find_value(odds_df, model_df, min_edge=DEFAULT_MIN_EDGE) -> pd.DataFrame:
+    """
+    Joins the odds with model probabilities by fixture and computes the expected value
+    (probability x odds - 1) of every 1X2 and over/under selection. Adds ev_<selection>,
+    value_<selection> (ev >= min_edge), best_value (the selection with the largest flagged
+    ev, or <NA>) and best_edge.
+    """
+    df = odds_df.merge(model_df, on='fixture', how='inner')
+    model_over = poisson_over_probability(df['expected_total_goals'], df['ou_line'])
+    selections = {
+        'home': (df['model_home'].to_numpy(), df['euro_home'].to_numpy()),
+        'draw': (df['model_draw'].to_numpy(), df['euro_draw'].to_numpy()),
+        'away': (df['model_away'].to_numpy(), df['euro_away'].to_numpy()),
+        'over': (model_over, df['ou_over'].to_numpy()),
+        'under': (1 - model_over, df['ou_under'].to_numpy()),
+    }
+    df['model_over'] = model_over
+    ev = np.column_stack([probability * price - 1 for probability, price in selections.values()])
+    for index, selection in enumerate(selections):
+        df[f"ev_{selection}"] = ev[:, index]
+        df[f"value_{selection}"] = ev[:, index] >= min_edge
+
+    flagged_ev = np.where(ev >= min_edge, ev, -np.inf)
+    best = flagged_ev.argmax(axis=1)
+    has_value = np.isfinite(flagged_ev.max(axis=1, initial=-np.inf))
+    names = np.array(list(selections), dtype=object)
+    df['best_value'] = pd.array(np.where(has_value, names[best], None), dtype='string')
+    df['best_edge'] = np.where(has_value, flagged_ev[np.arange(len(df)), best], np.nan)
+    return df
+
+
+def odds_dicts(odds_df) -> dict:
+    """{fixture: odds dict in the prompt's format} so imported odds can feed analyses."""
+    from analysis_core import normalize_odds
+
+    def as_text(value):
+        return "" if value is None or (isinstance(value, float) and math.isnan(value)) else f"{value:g}"
+
+    records = odds_df[['fixture', *[f"{market}_{field}" for market, fields in ODDS_FIELDS.items() for field in fields]]]
+    return {
+        record['fixture']: normalize_odds({
+            market: {field: as_text(record[f"{market}_{field}"]) for field in fields}
+            for market, fields in ODDS_FIELDS.items()
+        })
+        for record in records.astype(object).where(records.notna(), None).to_dict('records')
+        if record['fixture'] is not None
+    }
@@ -0,0 +1,300 @@
+"""
+Append-only log of predictions and of the final results they are scored against.
+
+    log = PredictionLog('data/predictions')
+    log.append([prediction_record(result['prediction'], result['home_team'], result['away_team'], result['odds'])])
+    log.record_results([{'fixture': "AC Milan - Roma", 'played_at': 1699818300, 'home_goals': 2, 'away_goals': 1}])
+    predictions, results = log.read(), log.read_results()
+
+Every append writes one immutable, column-oriented segment file (Parquet when pyarrow or
+fastparquet is installed, otherwise one compressed NumPy array per column), so writers
+never rewrite earlier data and readers can load only the columns they need. `compact()`
+folds many small segments into one.
+
+Predictions are joined with results by `fixture` ("Home - Away"): a prediction is settled
+by the first result of its fixture played after the prediction was made. `played_at` is
+the kickoff time, never when the result was fetched, so a prediction made after kickoff
+is not settled with the result of the match it was made during.
+"""
+import glob
+import importlib.util
+import os
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_LOG_DIR = os.path.join('data', 'predictions')
+TOP_SCORES = 3 # Score probabilities kept per prediction
+
+# Columns of the prediction log and their dtypes
+PREDICTION_COLUMNS = {
+    'prediction_id': 'string',
+    'created_at': 'float64', # Unix time
+    'engine': 'string',
+    'fixture': 'string',
+    'home_team_id': 'string',
+    'away_team_id': 'string',
+    'home_team': 'string',
+    'away_team': 'string',
+    'p_home': 'float64',
+    'p_draw': 'float64',
+    'p_away': 'float64',
+    'expected_total_goals': 'float64',
+    **{column: dtype for rank in range(1, TOP_SCORES + 1)
+       for column, dtype in ((f'score_{rank}', 'string'), (f'score_{rank}_prob', 'float64'))},
+    'best_bet': 'string',
+    'confidence': 'string',
+    'odds_euro_home': 'float64',
+    'odds_euro_draw': 'float64',
+    'odds_euro_away': 'float64',
+    'odds_handicap_line': 'float64',
+    'odds_handicap_home': 'float64',
+    'odds_handicap_away': 'float64',
+    'odds_ou_line': 'float64',
+    'odds_ou_over': 'float64',
+    'odds_ou_under': 'float64',
+}
+RESULT_COLUMNS = {
+    'fixture': 'string',
+    'played_at': 'float64', # Unix time
+    'match_id': 'string',
+    'home_goals': 'Int64',
+    'away_goals': 'Int64',
+}
+
+
+def _parquet_available() -> bool:
+    return any(importlib.util.find_spec(engine) for engine in ('pyarrow', 'fastparquet'))
+
+
+def to_typed_frame(df, columns) -> pd.DataFrame:
+    """Restricts `df` to `columns` (a column -> dtype dict), adding missing ones."""
+    from odds_table import to_number
+
+    df = df.reindex(columns=list(columns))
+    for column, dtype in columns.items():
+        if dtype in ('float64', 'Int64'):
+            df[column] = to_number(df[column]).to_numpy()
+        df[column] = df[column].astype(dtype)
+    return df.reset_index(drop=True)
+
+
+def fixture_name(home_team, away_team) -> str:
+    return f"{home_team} - {away_team}"
+
+
+def prediction_record(prediction, home_team, away_team, odds=None, engine='gemini', created_at=None) -> dict:
+    """
+    One log row from an AI prediction dict (the JSON the odds prompt asks for) and the
+    {'id', 'name'} of both teams. Percentages are stored as probabilities summing to 1.
+    """
+    prediction = prediction or {}
+    odds = odds or {}
+    percentages = [prediction.get(key) for key in ('home_team_win_prob_pct', 'draw_prob_pct', 'away_team_win_prob_pct')]
+    try:
+        total = sum(float(value) for value in percentages)
+    except (TypeError, ValueError):
+        total = 0
+    probabilities = [float(value) / total if total > 0 else None for value in percentages]
+
+    record = {
+        'prediction_id': uuid.uuid4().hex,
+        'created_at': time.time() if created_at is None else created_at,
+        'engine': engine,
+        'fixture': fixture_name(home_team['name'], away_team['name']),
+        'home_team_id': str(home_team['id']),
+        'away_team_id': str(away_team['id']),
+        'home_team': home_team['name'],
+        'away_team': away_team['name'],
+        'p_home': probabilities[0],
+        'p_draw': probabilities[1],
+        'p_away': probabilities[2],
+        'expected_total_goals': prediction.get('expected_total_goals'),
+        'best_bet': prediction.get('best_bet'),
+        'confidence': prediction.get('confidence_level'),
+    }
+    scores = prediction.get('score_probabilities') or []
+    for rank, score in enumerate(scores[:TOP_SCORES], start=1):
+        record[f'score_{rank}'] = str(score.get('score', '')).strip().strip("'\"") or None
+        pct = score.get('probability_pct')
+        record[f'score_{rank}_prob'] = pct / 100 if isinstance(pct, (int, float)) else None
+    for market, fields in (('euro', ('home', 'draw', 'away')), ('handicap', ('line', 'home', 'away')), ('ou', ('line', 'over', 'under'))):
+        for field in fields:
+            record[f'odds_{market}_{field}'] = (odds.get(market) or {}).get(field)
+    return record
+
+
+class PredictionLog:
+    def __init__(self, directory=DEFAULT_LOG_DIR):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, 'predictions'), exist_ok=True)
+        os.makedirs(os.path.join(directory, 'results'), exist_ok=True)
+
+    def append(self, records) -> int:
+        """Appends prediction records (dicts or a DataFrame) as a new segment; returns the row count."""
+        return self._write_segment('predictions', records, PREDICTION_COLUMNS)
+
+    def record_results(self, results) -> int:
+        """
+        Appends final results: dicts with fixture, played_at (kickoff, Unix time), home_goals,
+        away_goals and optionally match_id. Raises ValueError if a result has no played_at.
+        """
+        results = pd.DataFrame(results)
+        if results.empty:
+            return 0
+        if 'played_at' not in results.columns or results['played_at'].isna().any():
+            raise ValueError("Kết quả thiếu thời điểm bắt đầu trận (played_at).")
+        return self._write_segment('results', results, RESULT_COLUMNS)
+
+    def read(self, columns=None) -> pd.DataFrame:
+        """All logged predictions; `columns` limits what is read from disk."""
+        return self._read_segments('predictions', PREDICTION_COLUMNS, columns)
+
+    def read_results(self) -> pd.DataFrame:
+        return self._read_segments('results', RESULT_COLUMNS)
+
+    def segments(self, kind='predictions') -> list:
+        return sorted(glob.glob(os.path.join(self.directory, kind, 'segment-*.*')))
+
+    def compact(self):
+        """Rewrites all segments of the log as one segment per kind."""
+        for kind, schema in (('predictions', PREDICTION_COLUMNS), ('results', RESULT_COLUMNS)):
+            old_segments = self.segments(kind)
+            if len(old_segments) > 1:
+                self._write_segment(kind, self._read_segments(kind, schema), schema)
+                for path in old_segments:
+                    os.remove(path)
+
+    def _write_segment(self, kind, records, schema) -> int:
+        df = to_typed_frame(pd.DataFrame(records), schema)
+        if df.empty:
+            return 0
+        # Time-ordered names keep segments (and therefore rows) in append order
+        name = f"segment-{time.time_ns():020d}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        path = os.path.join(self.directory, kind, name)
+        if _parquet_available():
+            path += '.parquet'
+            temp_path = f"{path}.tmp"
+            df.to_parquet(temp_path, index=False)
+        else:
+            path += '.npz'
+            temp_path = f"{path}.tmp"
+            arrays = {}
+            for column, dtype in schema.items():
+                if dtype in ('string', 'Int64'):
+                    # NumPy arrays have no missing values for these; store a mask beside them
+                    arrays[f"{column}.missing"] = df[column].isna().to_numpy()
+                    fill = '' if dtype == 'string' else 0
+                    arrays[column] = df[column].fillna(fill).to_numpy(dtype=str if dtype == 'string' else np.int64)
+                else:
+                    arrays[column] = df[column].to_numpy()
+            with open(temp_path, 'wb') as f:
+                np.savez_compressed(f, **arrays)
+        os.replace(temp_path, path)
+        return len(df)
+
+    def _read_segments(self, kind, schema, columns=None) -> pd.DataFrame:
+        columns = list(columns or schema)
+        frames = []
+        for path in self.segments(kind):
+            if path.endswith('.parquet'):
+                frames.append(pd.read_parquet(path, columns=columns))
+                continue
+            with np.load(path) as arrays: # Only the requested columns are decompressed
+                frame = {}
+                for column in columns:
+                    values = arrays[column]
+                    if f"{column}.missing" in arrays.files:
+                        values = pd.Series(values, dtype=schema[column]).mask(arrays[f"{column}.missing"])
+                    frame[column] = values
+                frames.append(pd.DataFrame(frame))
+        if not frames:
+            return to_typed_frame(pd.DataFrame(), {column: schema[column] for column in columns})
+        return to_typed_frame(pd.concat(frames, ignore_index=True), {column: schema[column] for column in columns})
+
+
+def settle(predictions, results) -> pd.DataFrame:
+    """
+    Joins every prediction with the first result of its fixture played after it was made;
+    unsettled predictions are dropped. Adds home_goals, away_goals and outcome (0 home win,
+    1 draw, 2 away win).
+    """
+    if predictions.empty or results.empty:
+        settled = predictions.iloc[0:0].assign(home_goals=pd.Series(dtype='Int64'), away_goals=pd.Series(dtype='Int64'),
+                                               outcome=pd.Series(dtype='int64'))
+        return settled
+    results = results.dropna(subset=['fixture', 'played_at', 'home_goals', 'away_goals'])
+    predictions = predictions.dropna(subset=['fixture', 'created_at'])
+    settled = pd.merge_asof(
+        predictions.sort_values('created_at'), results.sort_values('played_at')[['fixture', 'played_at', 'home_goals', 'away_goals']],
+        left_on='created_at', right_on='played_at', by='fixture', direction='forward',
+    ).dropna(subset=['home_goals'])
+    goal_difference = (settled['home_goals'] - settled['away_goals']).to_numpy(dtype=float)
+    settled['outcome'] = np.select([goal_difference > 0, goal_difference == 0], [0, 1], 2)
+    return settled.reset_index(drop=True)
+
+
+def result_from_delta(delta):
+    """
+    A result row from a finished match's first LiveTracker delta, or None if it is not
+    finished or its kickoff time is unknown.
+    """
+    status = delta.get('status') or {}
+    if not status.get('finished') or not status.get('score') or status.get('kickoff') is None:
+        return None
+    try:
+        home_goals, away_goals = (int(goals) for goals in status['score'].split('-'))
+    except ValueError:
+        return None
+    teams = delta['teams']
+    return {
+        'fixture': fixture_name(teams['home']['name'], teams['away']['name']),
+        'played_at': status['kickoff'],
+        'match_id': str(delta['match_id']),
+        'home_goals': home_goals,
+        'away_goals': away_goals,
+    }
+
+
+def fetch_results(match_ids, timeout=120) -> tuple:
+    """
+    Reads the final scores of FotMob matches. Returns (results, problems) where problems
+    maps a match ID to why it has no result (not finished yet, or the request failed).
+    """
+    import threading
+    from live_tracker import LiveTracker
+
+    pending = {str(match_id) for match_id in match_ids}
+    results, problems = [], {}
+    lock = threading.Lock()
+    tracker = None
+
+    def on_delta(delta):
+        match_id = str(delta['match_id'])
+        with lock:
+            if match_id not in pending:
+                return
+            pending.discard(match_id)
+            result = result_from_delta(delta)
+            status = delta['status'] or {}
+            if result:
+                results.append(result)
+            elif delta['error']:
+                problems[match_id] = delta['error']
+            elif status.get('finished') and status.get('score'):
+                problems[match_id] = "Không có thời điểm bắt đầu trận."
+            else:
+                problems[match_id] = "Trận đấu chưa kết thúc hoặc chưa có tỷ số."
+        # One look per match is enough; unfinished or failing matches are not polled again
+        tracker.untrack(match_id)
+
+    tracker = LiveTracker(on_delta)
+    for match_id in sorted(pending):
+        tracker.track(match_id)
+    tracker.wait_until_idle(timeout)
+    tracker.stop()
+    for match_id in pending:
+        problems[match_id] = "Hết thời gian chờ."
+    return results, problems
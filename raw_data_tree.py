@@ -0,0 +1,256 @@
+import time
+
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, QLabel, QTreeView
+from PyQt6.QtCore import Qt, QAbstractItemModel, QModelIndex, QTimer
+
+# Number of child rows created per fetch, so huge lists (e.g. a season of shots) load in pages
+FETCH_BATCH_SIZE = 200
+# Longest value preview shown in the tree
+PREVIEW_LENGTH = 200
+# Time budget per timer tick for the incremental search, in seconds
+SEARCH_SLICE_SECONDS = 0.015
+
+
+def _is_container(value) -> bool:
+    return isinstance(value, (dict, list, tuple))
+
+
+def _child_items(value) -> list:
+    """Returns the (key, value) pairs of a container in display order."""
+    if isinstance(value, dict):
+        return list(value.items())
+    return list(enumerate(value))
+
+
+def _preview(value) -> str:
+    if isinstance(value, dict):
+        return f"{{{len(value)} mục}}"
+    if isinstance(value, (list, tuple)):
+        return f"[{len(value)} mục]"
+    text = str(value)
+    return text if len(text) <= PREVIEW_LENGTH else text[:PREVIEW_LENGTH] + "..."
+
+
+class _JsonNode:
+    __slots__ = ('key', 'value', 'parent', 'row', 'children', 'items')
+
+    def __init__(self, key, value, parent, row):
+        self.key = key
+        self.value = value
+        self.parent = parent
+        self.row = row
+        self.children = None # Created on first expand
+        self.items = None
+
+    def total_children(self) -> int:
+        return len(self.value) if _is_container(self.value) else 0
+
+
+class LazyJsonTreeModel(QAbstractItemModel):
+    """
+    Tree model over nested dicts/lists that only creates child rows when a node is expanded.
+    The payload itself is referenced, not copied.
+    """
+
+    def __init__(self, payload=None, parent=None):
+        super().__init__(parent)
+        self._root = _JsonNode(None, payload or {}, None, 0)
+
+    def set_payload(self, payload):
+        self.beginResetModel()
+        self._root = _JsonNode(None, payload or {}, None, 0)
+        self.endResetModel()
+
+    def payload(self):
+        return self._root.value
+
+    def _node(self, index) -> _JsonNode:
+        return index.internalPointer() if index.isValid() else self._root
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = self._node(parent)
+        if node.children is None or not 0 <= row < len(node.children):
+            return QModelIndex()
+        return self.createIndex(row, column, node.children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        parent_node = index.internalPointer().parent
+        if parent_node is None or parent_node is self._root:
+            return QModelIndex()
+        return self.createIndex(parent_node.row, 0, parent_node)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        node = self._node(parent)
+        return len(node.children) if node.children is not None else 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return 2
+
+    def hasChildren(self, parent=QModelIndex()):
+        return self._node(parent).total_children() > 0
+
+    def canFetchMore(self, parent):
+        node = self._node(parent)
+        loaded = len(node.children) if node.children is not None else 0
+        return loaded < node.total_children()
+
+    def fetchMore(self, parent):
+        node = self._node(parent)
+        if node.children is None:
+            node.children = []
+            node.items = _child_items(node.value)
+        start = len(node.children)
+        end = min(start + FETCH_BATCH_SIZE, len(node.items))
+        if start >= end:
+            return
+        self.beginInsertRows(parent, start, end - 1)
+        for row in range(start, end):
+            key, value = node.items[row]
+            node.children.append(_JsonNode(key, value, node, row))
+        if end == len(node.items):
+            node.items = None # Everything is materialized, drop the item list
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if role == Qt.ItemDataRole.DisplayRole:
+            return str(node.key) if index.column() == 0 else _preview(node.value)
+        if role == Qt.ItemDataRole.ToolTipRole and index.column() == 1 and not _is_container(node.value):
+            return str(node.value)[:2000]
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return ("Khóa", "Giá trị")[section]
+        return None
+
+    def index_for_path(self, path) -> QModelIndex:
+        """Fetches the rows along `path` (child row numbers from the root) and returns its index."""
+        parent_index = QModelIndex()
+        node = self._root
+        for row in path:
+            while node.children is None or len(node.children) <= row:
+                self.fetchMore(parent_index)
+            node = node.children[row]
+            parent_index = self.createIndex(row, 0, node)
+        return parent_index
+
+
+def iter_matching_paths(payload, query: str, checkpoint_every: int = 500):
+    """
+    Walks the payload depth first, in display order, and yields the row path of every
+    key or scalar value containing `query` (case-insensitive). Every `checkpoint_every`
+    visited nodes it also yields None, so callers can stop on a time budget.
+    """
+    query = query.casefold()
+    stack = [((), None, payload)]
+    visited = 0
+    while stack:
+        path, key, value = stack.pop()
+        visited += 1
+        if visited % checkpoint_every == 0:
+            yield None
+        if path:
+            if query in str(key).casefold() or (not _is_container(value) and query in str(value).casefold()):
+                yield path
+        if _is_container(value):
+            items = _child_items(value)
+            for row in range(len(items) - 1, -1, -1):
+                child_key, child_value = items[row]
+                stack.append((path + (row,), child_key, child_value))
+
+
+class RawDataBrowser(QWidget):
+    """Tree view over the raw match payloads with an incremental search box."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.model = LazyJsonTreeModel()
+        self.matches = []
+        self.match_position = -1
+        self._search_iter = None
+
+        layout = QVBoxLayout(self)
+        search_layout = QHBoxLayout()
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Tìm theo khóa hoặc giá trị...")
+        self.next_button = QPushButton("Tìm tiếp")
+        self.status_label = QLabel()
+        search_layout.addWidget(self.search_edit, 1)
+        search_layout.addWidget(self.next_button)
+        search_layout.addWidget(self.status_label)
+        layout.addLayout(search_layout)
+
+        self.tree_view = QTreeView()
+        self.tree_view.setModel(self.model)
+        self.tree_view.setUniformRowHeights(True)
+        self.tree_view.setColumnWidth(0, 300)
+        layout.addWidget(self.tree_view)
+
+        # Restart the search shortly after the user stops typing
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(250)
+        self.debounce_timer.timeout.connect(self.start_search)
+        self.search_timer = QTimer(self)
+        self.search_timer.timeout.connect(self._search_step)
+
+        self.search_edit.textChanged.connect(self.debounce_timer.start)
+        self.search_edit.returnPressed.connect(self.show_next_match)
+        self.next_button.clicked.connect(self.show_next_match)
+
+    def set_payload(self, payload):
+        self.search_timer.stop()
+        self._search_iter = None
+        self.matches = []
+        self.match_position = -1
+        self.model.set_payload(payload)
+        self.status_label.clear()
+        if self.search_edit.text():
+            self.start_search()
+
+    def start_search(self):
+        self.search_timer.stop()
+        self.matches = []
+        self.match_position = -1
+        query = self.search_edit.text().strip()
+        if not query:
+            self._search_iter = None
+            self.status_label.clear()
+            return
+        self._search_iter = iter_matching_paths(self.model.payload(), query)
+        self.status_label.setText("Đang tìm...")
+        self.search_timer.start(0)
+
+    def _search_step(self):
+        """Scans the payload for a few milliseconds, then yields back to the event loop."""
+        deadline = time.perf_counter() + SEARCH_SLICE_SECONDS
+        for path in self._search_iter:
+            if path is not None:
+                self.matches.append(path)
+                if len(self.matches) == 1:
+                    self.show_next_match()
+            if time.perf_counter() > deadline:
+                self.status_label.setText(f"Đang tìm... {len(self.matches)} kết quả")
+                return
+        self.search_timer.stop()
+        self._search_iter = None
+        self.status_label.setText(f"{len(self.matches)} kết quả" if self.matches else "Không tìm thấy")
+
+    def show_next_match(self):
+        if not self.matches:
+            return
+        self.match_position = (self.match_position + 1) % len(self.matches)
+        index = self.model.index_for_path(self.matches[self.match_position])
+        parent = index.parent()
+        while parent.isValid():
+            self.tree_view.expand(parent)
+            parent = parent.parent()
+        self.tree_view.setCurrentIndex(index)
+        self.tree_view.scrollTo(index)
@@ -0,0 +1,133 @@
+"""
+Bounded memory for the analyses of a long app session.
+
+The most recently used analyses keep their payloads (scraped matches, shot DataFrames,
+rendered charts) in memory; older ones are spilled to compressed snapshots in a temporary
+directory (the binary format of snapshot.py) and reloaded into the same analysis dict when
+they are shown again. Titles, teams, the AI text and prediction stay in memory, so menus and
+late AI results keep working on a spilled analysis.
+
+Payload fields of an analysis opened from a saved snapshot may be None until they are read
+from it (see snapshot.load_lazy_fields); call `refresh` after reading them.
+"""
+import os
+import shutil
+import sys
+import tempfile
+from collections import OrderedDict
+
+from snapshot import SNAPSHOT_SUFFIX, AnalysisSnapshot, write_snapshot
+
+# Analysis fields moved to disk when an analysis is spilled
+SPILL_FIELDS = ('raw_data', 'shots_df', 'team_shots', 'render_cache')
+DEFAULT_MAX_IN_MEMORY = 3
+# Beyond this many analyses the oldest one is forgotten, snapshot included
+DEFAULT_MAX_ANALYSES = 30
+# Snapshots are written on the UI thread; favour speed over ratio
+SNAPSHOT_COMPRESSLEVEL = 1
+
+
+def estimate_size(obj, _seen=None) -> int:
+    """Approximate memory held by `obj` in bytes, following containers and DataFrames."""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    memory_usage = getattr(obj, 'memory_usage', None)
+    if callable(memory_usage) and hasattr(obj, 'columns'): # pandas DataFrame
+        return int(memory_usage(index=True, deep=True).sum())
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(key, _seen) + estimate_size(value, _seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, _seen) for item in obj)
+    return size
+
+
+class AnalysisSession:
+    """Analyses of the session, with at most `max_in_memory` of them holding their payloads."""
+
+    def __init__(self, max_in_memory=DEFAULT_MAX_IN_MEMORY, max_analyses=DEFAULT_MAX_ANALYSES, spill_dir=None):
+        self.max_in_memory = max_in_memory
+        self.max_analyses = max_analyses
+        self._owns_spill_dir = spill_dir is None
+        self.spill_dir = spill_dir or tempfile.mkdtemp(prefix='keo_bong_vtt_session_')
+        self._analyses = OrderedDict() # Analysis id -> analysis, oldest first
+        self._loaded = OrderedDict() # Analysis id -> analysis holding its payload, least recently used first
+
+    def add(self, analysis):
+        """Registers a new analysis as the most recently used one."""
+        self._analyses[analysis['id']] = analysis
+        analysis['payload_bytes'] = self._payload_size(analysis)
+        self._loaded[analysis['id']] = analysis
+        while len(self._analyses) > self.max_analyses:
+            _, oldest = self._analyses.popitem(last=False)
+            self._forget(oldest)
+        self._spill_least_recent()
+
+    def load(self, analysis) -> dict:
+        """Makes sure `analysis` holds its payload (reading its snapshot if needed) and marks it most recent."""
+        if analysis['id'] in self._loaded:
+            self._loaded.move_to_end(analysis['id'])
+            return analysis
+        snapshot_path = analysis.pop('snapshot_path')
+        analysis.update(AnalysisSnapshot(snapshot_path).fields(SPILL_FIELDS))
+        os.remove(snapshot_path)
+        analysis['payload_bytes'] = self._payload_size(analysis)
+        self._loaded[analysis['id']] = analysis
+        self._spill_least_recent()
+        return analysis
+
+    def refresh(self, analysis):
+        """Measures the payload of a loaded `analysis` again, after fields were filled in lazily."""
+        if analysis['id'] in self._loaded:
+            analysis['payload_bytes'] = self._payload_size(analysis)
+
+    def is_loaded(self, analysis) -> bool:
+        return analysis['id'] in self._loaded
+
+    def analyses(self) -> list:
+        """All analyses of the session, most recent first."""
+        return list(reversed(self._analyses.values()))
+
+    def memory_usage(self, analysis) -> int:
+        """Bytes held in memory by the payload of `analysis`; 0 once it is spilled."""
+        if analysis['id'] not in self._loaded:
+            return 0
+        # Charts are added after the payload was measured, so they are counted live
+        return analysis['payload_bytes'] + sum(len(png) for png in analysis['render_cache'].values())
+
+    def total_memory_usage(self) -> int:
+        return sum(self.memory_usage(analysis) for analysis in self._loaded.values())
+
+    def close(self):
+        """Deletes the snapshots; the session can not reload spilled analyses afterwards."""
+        if self._owns_spill_dir:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+        else:
+            for analysis in self._analyses.values():
+                self._forget(analysis)
+
+    def _payload_size(self, analysis) -> int:
+        return estimate_size([analysis[field] for field in SPILL_FIELDS if field != 'render_cache'])
+
+    def _spill_least_recent(self):
+        while len(self._loaded) > self.max_in_memory:
+            _, analysis = self._loaded.popitem(last=False)
+            self._spill(analysis)
+
+    def _spill(self, analysis):
+        snapshot_path = os.path.join(self.spill_dir, f"analysis_{analysis['id']}{SNAPSHOT_SUFFIX}")
+        # Fields not read yet from a saved snapshot are None and are not written
+        write_snapshot(snapshot_path, analysis, SPILL_FIELDS, SNAPSHOT_COMPRESSLEVEL)
+        for field in SPILL_FIELDS:
+            analysis.pop(field)
+        analysis['snapshot_path'] = snapshot_path
+
+    def _forget(self, analysis):
+        self._loaded.pop(analysis['id'], None)
+        snapshot_path = analysis.pop('snapshot_path', None)
+        if snapshot_path and os.path.exists(snapshot_path):
+            os.remove(snapshot_path)
@@ -0,0 +1,170 @@
+"""
+Merging of FotMob and SofaScore shots of one match into a single typed DataFrame.
+
+FotMob shots are on the Opta 100x100 grid the charts use: x runs from the shooting team's
+own goal line (0) to the goal it attacks (100). SofaScore's playerCoordinates measure x as
+the distance from the attacked goal line, so x maps to 100 - x. The direction of SofaScore's
+y axis is not documented and has flipped between versions; `merge_shots` maps y both ways
+and keeps the orientation under which more shots of the two sources line up.
+
+A SofaScore shot is the same shot as a FotMob one when it is by the same team, within
+MATCH_MINUTE_TOLERANCE minutes, within MATCH_DISTANCE_TOLERANCE of the same position and,
+where both sources name the player, by the same player (compared by last name without
+accents). Matched shots keep the FotMob record plus SofaScore's extra fields; unmatched
+SofaScore shots are added with FotMob-style fields. The `source` column tells them apart.
+"""
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+MATCH_MINUTE_TOLERANCE = 1
+MATCH_DISTANCE_TOLERANCE = 6.0 # Opta units
+
+# Columns of the merged frame and their dtypes
+SHOT_COLUMNS = {
+    'id': 'string',
+    'source': 'category',
+    'teamId': 'Int64',
+    'playerId': 'Int64',
+    'playerName': 'string',
+    'min': 'Int64',
+    'x': 'float64',
+    'y': 'float64',
+    'eventType': 'category',
+    'expectedGoals': 'float64',
+    'expectedGoalsOnTarget': 'float64',
+    'isOnTarget': 'boolean',
+    'isBlocked': 'boolean',
+    'shotType': 'string',
+    'situation': 'string',
+    'sofascoreId': 'Int64',
+    'sofascoreXg': 'float64',
+    'sofascoreXgot': 'float64',
+    'goalMouthLocation': 'string',
+}
+
+# SofaScore shotType -> FotMob eventType
+SOFASCORE_EVENT_TYPES = {
+    'goal': 'Goal',
+    'save': 'AttemptSaved',
+    'miss': 'Miss',
+    'post': 'Post',
+    'block': 'Miss',
+}
+SOFASCORE_BODY_PARTS = {
+    'right-foot': 'RightFoot',
+    'left-foot': 'LeftFoot',
+    'head': 'Header',
+}
+
+
+def _name_key(name):
+    """Last name without accents or case, so 'Théo Hernández' and 'T. Hernandez' compare equal."""
+    if not isinstance(name, str) or not name.strip():
+        return None
+    ascii_name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode()
+    return ascii_name.lower().replace('.', ' ').split()[-1]
+
+
+def sofascore_shots_frame(shotmap, home_team_id, away_team_id, flip_y=True) -> pd.DataFrame:
+    """SofaScore `shotmap` entries as FotMob-style shot rows on the Opta grid."""
+    rows = []
+    for shot in shotmap:
+        coordinates = shot.get('playerCoordinates') or {}
+        player = shot.get('player') or {}
+        event_type = SOFASCORE_EVENT_TYPES.get(shot.get('shotType'), 'Miss')
+        y = float(coordinates.get('y', np.nan))
+        rows.append({
+            'id': f"sofascore-{shot.get('id')}",
+            'source': 'sofascore',
+            'teamId': home_team_id if shot.get('isHome') else away_team_id,
+            'playerName': player.get('name'),
+            'min': shot.get('time'),
+            'x': 100 - float(coordinates.get('x', np.nan)),
+            'y': 100 - y if flip_y else y,
+            'eventType': event_type,
+            'expectedGoals': shot.get('xg'),
+            'isOnTarget': event_type in ('Goal', 'AttemptSaved'),
+            'isBlocked': shot.get('shotType') == 'block',
+            'shotType': SOFASCORE_BODY_PARTS.get(shot.get('bodyPart'), shot.get('bodyPart')),
+            'situation': shot.get('situation'),
+            'sofascoreId': shot.get('id'),
+            'sofascoreXg': shot.get('xg'),
+            'sofascoreXgot': shot.get('xgot'),
+            'goalMouthLocation': shot.get('goalMouthLocation'),
+        })
+    return pd.DataFrame(rows)
+
+
+def to_shot_frame(df) -> pd.DataFrame:
+    """Restricts `df` to SHOT_COLUMNS (adding missing ones) with their dtypes."""
+    df = df.reindex(columns=list(SHOT_COLUMNS))
+    for column, dtype in SHOT_COLUMNS.items():
+        if dtype in ('Int64', 'float64'):
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+        df[column] = df[column].astype(dtype)
+    return df
+
+
+def match_shot_pairs(fotmob_df, sofascore_df) -> list:
+    """(fotmob row, sofascore row) positional index pairs of shots seen by both sources."""
+    if fotmob_df.empty or sofascore_df.empty:
+        return []
+    f_team = fotmob_df['teamId'].to_numpy()[:, None]
+    s_team = sofascore_df['teamId'].to_numpy()[None, :]
+    f_min = pd.to_numeric(fotmob_df['min'], errors='coerce').to_numpy(dtype=float)[:, None]
+    s_min = pd.to_numeric(sofascore_df['min'], errors='coerce').to_numpy(dtype=float)[None, :]
+    distance = np.hypot(
+        fotmob_df['x'].to_numpy(dtype=float)[:, None] - sofascore_df['x'].to_numpy(dtype=float)[None, :],
+        fotmob_df['y'].to_numpy(dtype=float)[:, None] - sofascore_df['y'].to_numpy(dtype=float)[None, :],
+    )
+    f_names = np.array([_name_key(name) for name in fotmob_df.get('playerName', pd.Series([None] * len(fotmob_df)))], dtype=object)[:, None]
+    s_names = np.array([_name_key(name) for name in sofascore_df['playerName']], dtype=object)[None, :]
+    same_player = (f_names == s_names) | pd.isna(f_names) | pd.isna(s_names)
+
+    candidate = (f_team == s_team) & (np.abs(f_min - s_min) <= MATCH_MINUTE_TOLERANCE) \
+        & (distance <= MATCH_DISTANCE_TOLERANCE) & same_player
+    # Greedy one-to-one pairing, closest shots first
+    rows, columns = np.nonzero(candidate)
+    order = np.argsort(distance[rows, columns], kind='stable')
+    pairs, used_f, used_s = [], set(), set()
+    for f_row, s_row in zip(rows[order], columns[order]):
+        if f_row not in used_f and s_row not in used_s:
+            pairs.append((int(f_row), int(s_row)))
+            used_f.add(f_row)
+            used_s.add(s_row)
+    return pairs
+
+
+def merge_shots(fotmob_shots, sofascore_shotmap, home_team_id, away_team_id) -> pd.DataFrame:
+    """
+    Merges FotMob shots (list of dicts or DataFrame) and a SofaScore `shotmap` list into one
+    frame with SHOT_COLUMNS, each shot appearing once.
+    """
+    fotmob_df = pd.DataFrame(fotmob_shots).reset_index(drop=True)
+    if not fotmob_df.empty:
+        fotmob_df['source'] = 'fotmob'
+        fotmob_df['id'] = fotmob_df['id'].astype(str) if 'id' in fotmob_df.columns else None
+    if not sofascore_shotmap:
+        return to_shot_frame(fotmob_df)
+
+    candidates = [sofascore_shots_frame(sofascore_shotmap, home_team_id, away_team_id, flip_y) for flip_y in (True, False)]
+    pairings = [match_shot_pairs(fotmob_df, candidate) for candidate in candidates]
+    best = 0 if len(pairings[0]) >= len(pairings[1]) else 1
+    sofascore_df, pairs = candidates[best], pairings[best]
+
+    enrich_columns = ['sofascoreId', 'sofascoreXg', 'sofascoreXgot', 'goalMouthLocation']
+    for column in enrich_columns:
+        fotmob_df[column] = None
+    if pairs:
+        f_rows, s_rows = (list(rows) for rows in zip(*pairs))
+        fotmob_df.loc[f_rows, enrich_columns] = sofascore_df.loc[s_rows, enrich_columns].to_numpy()
+        fotmob_df.loc[f_rows, 'source'] = 'both'
+        matched = set(s_rows)
+    else:
+        matched = set()
+    sofascore_only = sofascore_df.drop(index=list(matched))
+
+    merged = pd.concat([to_shot_frame(fotmob_df), to_shot_frame(sofascore_only)], ignore_index=True)
+    return to_shot_frame(merged).sort_values(['min', 'teamId'], kind='stable', ignore_index=True)
@@ -0,0 +1,259 @@
+"""
+Compact binary snapshots of an analysis, for saving, sharing and reopening analyses and
+for spilling them out of memory (session_store).
+
+File layout:
+
+    MAGIC (8 bytes) | header length (uint32, little endian) | header JSON | section data
+
+The header lists every section with its offset in the section data, stored length, codec
+('zlib' or 'raw') and decoded length. Sections:
+
+    summary   zlib JSON: title, teams, match IDs, odds, AI prediction and texts
+    shots     zlib columnar block of the combined shots DataFrame (see encode_frame)
+    raw_data  zlib JSON of the scraped match payloads
+    charts    rendered chart PNGs, stored as they are
+
+Readers load the header and only the sections they ask for, so opening a snapshot shows
+the prediction right away while shots and raw payloads are read when they are needed.
+"""
+import json
+import os
+import struct
+import time
+import zlib
+
+MAGIC = b'KBVSNAP\x01'
+FORMAT_VERSION = 1
+SNAPSHOT_SUFFIX = '.kbv'
+DEFAULT_COMPRESSLEVEL = 6
+_LENGTH = struct.Struct('<I')
+
+SUMMARY_FIELDS = ('title', 'home_team', 'away_team', 'match_ids', 'odds', 'ai_prediction_data',
+                  'analysis_text', 'raw_display_text')
+# Analysis field -> section holding it; None fields are not written (see open_analysis)
+PAYLOAD_SECTIONS = {
+    'shots_df': 'shots',
+    'team_shots': 'shots', # Rebuilt from shots_df
+    'raw_data': 'raw_data',
+    'render_cache': 'charts',
+}
+
+
+class SnapshotError(Exception):
+    """Raised when a file is not a readable analysis snapshot."""
+
+
+# --- Columnar DataFrame block ---
+
+def encode_frame(df) -> bytes:
+    """
+    One DataFrame as a column-oriented block: a JSON column table followed by one buffer per
+    column. NumPy-typed columns are stored as their raw array bytes; object and pandas
+    extension columns (strings, nullable ints, categories, nested dicts) as JSON lists.
+    """
+    import numpy as np
+
+    columns, buffers, offset = [], [], 0
+    for name in df.columns:
+        series = df[name]
+        if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biuf':
+            buffer = np.ascontiguousarray(series.to_numpy()).tobytes()
+            columns.append({'name': name, 'kind': 'array', 'dtype': series.dtype.str})
+        else:
+            values = series.astype(object).where(series.notna(), None).tolist()
+            buffer = json.dumps(values, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+            columns.append({'name': name, 'kind': 'json', 'dtype': str(series.dtype)})
+        columns[-1].update(offset=offset, length=len(buffer))
+        buffers.append(buffer)
+        offset += len(buffer)
+    table = json.dumps({'rows': len(df), 'columns': columns}, ensure_ascii=False).encode('utf-8')
+    return _LENGTH.pack(len(table)) + table + b''.join(buffers)
+
+
+def decode_frame(block):
+    import numpy as np
+    import pandas as pd
+
+    (table_length,) = _LENGTH.unpack_from(block)
+    table = json.loads(block[_LENGTH.size:_LENGTH.size + table_length])
+    data = memoryview(block)[_LENGTH.size + table_length:]
+    frame = {}
+    for column in table['columns']:
+        buffer = data[column['offset']:column['offset'] + column['length']]
+        if column['kind'] == 'array':
+            # Copy so the frame does not keep the whole decompressed block alive
+            frame[column['name']] = np.frombuffer(buffer, dtype=column['dtype']).copy()
+        else:
+            values = pd.Series(json.loads(bytes(buffer)), dtype=object)
+            frame[column['name']] = values if column['dtype'] == 'object' else values.astype(column['dtype'])
+    return pd.DataFrame(frame, index=pd.RangeIndex(table['rows']))
+
+
+# --- Section payloads ---
+
+def _as_tuple(value):
+    """JSON lists back to the tuples render cache keys are made of."""
+    return tuple(_as_tuple(item) for item in value) if isinstance(value, list) else value
+
+
+def _encode_charts(render_cache) -> bytes:
+    index = [{'key': key, 'length': len(png)} for key, png in render_cache.items()]
+    table = json.dumps(index, ensure_ascii=False).encode('utf-8')
+    return _LENGTH.pack(len(table)) + table + b''.join(render_cache.values())
+
+
+def _decode_charts(block) -> dict:
+    (table_length,) = _LENGTH.unpack_from(block)
+    offset = _LENGTH.size + table_length
+    render_cache = {}
+    for entry in json.loads(block[_LENGTH.size:offset]):
+        render_cache[_as_tuple(entry['key'])] = bytes(block[offset:offset + entry['length']])
+        offset += entry['length']
+    return render_cache
+
+
+def _encode_raw_data(raw_data) -> bytes:
+    """Match payloads without their shots DataFrames, which are rebuilt from the shotmap lists."""
+    record = {}
+    for key, value in raw_data.items():
+        if isinstance(value, dict) and 'team_data' in value:
+            value = {field: field_value for field, field_value in value.items() if field != 'shots_df'}
+            value['team_data'] = list(value['team_data'].items())
+        elif key == 'all_teams_for_selection':
+            # JSON object keys are strings; keep the team IDs' original type
+            value = list(value.items())
+        record[key] = value
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _decode_raw_data(block) -> dict:
+    import pandas as pd
+
+    raw_data = json.loads(block)
+    for key, value in raw_data.items():
+        if isinstance(value, dict) and 'team_data' in value:
+            value['team_data'] = dict(map(tuple, value['team_data']))
+            value['shots_df'] = pd.DataFrame(value['shotmap']) if value.get('shotmap') else pd.DataFrame()
+        elif key == 'all_teams_for_selection':
+            raw_data[key] = dict(map(tuple, value))
+    return raw_data
+
+
+def team_shots_of(shots_df) -> dict:
+    if shots_df.empty or 'teamId' not in shots_df.columns:
+        return {}
+    return {team_id: group for team_id, group in shots_df.groupby('teamId')}
+
+
+# --- Files ---
+
+def write_snapshot(path, analysis, fields=None, compresslevel=DEFAULT_COMPRESSLEVEL):
+    """
+    Writes `analysis` to `path` atomically. `fields` limits the payload fields written (the
+    summary is always included); fields that are missing or None are skipped.
+    """
+    fields = PAYLOAD_SECTIONS if fields is None else fields
+    sections = {'summary': ('zlib', json.dumps(
+        {field: analysis.get(field) for field in SUMMARY_FIELDS}, ensure_ascii=False, default=str
+    ).encode('utf-8'))}
+    if 'shots_df' in fields and analysis.get('shots_df') is not None:
+        sections['shots'] = ('zlib', encode_frame(analysis['shots_df']))
+    if 'raw_data' in fields and analysis.get('raw_data') is not None:
+        sections['raw_data'] = ('zlib', _encode_raw_data(analysis['raw_data']))
+    if 'render_cache' in fields and analysis.get('render_cache'):
+        # PNGs are already compressed
+        sections['charts'] = ('raw', _encode_charts(analysis['render_cache']))
+
+    table, chunks, offset = {}, [], 0
+    for name, (codec, data) in sections.items():
+        stored = zlib.compress(data, compresslevel) if codec == 'zlib' else data
+        table[name] = {'offset': offset, 'length': len(stored), 'codec': codec, 'raw_length': len(data)}
+        chunks.append(stored)
+        offset += len(stored)
+    header = json.dumps({'version': FORMAT_VERSION, 'created_at': time.time(), 'sections': table}).encode('utf-8')
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(_LENGTH.pack(len(header)))
+        f.write(header)
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(temp_path, path)
+
+
+class AnalysisSnapshot:
+    """Reads a snapshot's header on creation and each section only when it is asked for."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise SnapshotError(f"Không phải file phân tích hợp lệ: {path}")
+            try:
+                (header_length,) = _LENGTH.unpack(f.read(_LENGTH.size))
+                header = json.loads(f.read(header_length))
+            except (struct.error, ValueError) as e:
+                raise SnapshotError(f"Phần đầu của file phân tích bị hỏng: {path}") from e
+        if header.get('version') != FORMAT_VERSION:
+            raise SnapshotError(f"Phiên bản file phân tích không được hỗ trợ: {header.get('version')}")
+        self.created_at = header.get('created_at')
+        self.sections = header['sections']
+        self._data_start = len(MAGIC) + _LENGTH.size + header_length
+
+    def __contains__(self, section) -> bool:
+        return section in self.sections
+
+    def read(self, section) -> bytes:
+        entry = self.sections[section]
+        with open(self.path, 'rb') as f:
+            f.seek(self._data_start + entry['offset'])
+            data = f.read(entry['length'])
+        try:
+            if entry['codec'] == 'zlib':
+                data = zlib.decompress(data)
+        except zlib.error as e:
+            raise SnapshotError(f"Phần '{section}' của {self.path} bị hỏng: {e}") from e
+        if len(data) != entry['raw_length']:
+            raise SnapshotError(f"Phần '{section}' của {self.path} bị hỏng.")
+        return data
+
+    def summary(self) -> dict:
+        return json.loads(self.read('summary'))
+
+    def fields(self, fields) -> dict:
+        """Payload `fields` of the analysis; fields whose section is absent are None."""
+        values = {}
+        if 'shots_df' in fields or 'team_shots' in fields:
+            shots_df = decode_frame(self.read('shots')) if 'shots' in self else None
+            values['shots_df'] = shots_df
+            values['team_shots'] = team_shots_of(shots_df) if shots_df is not None else None
+        if 'raw_data' in fields:
+            values['raw_data'] = _decode_raw_data(self.read('raw_data')) if 'raw_data' in self else None
+        if 'render_cache' in fields:
+            values['render_cache'] = _decode_charts(self.read('charts')) if 'charts' in self else {}
+        return {field: value for field, value in values.items() if field in fields}
+
+
+def open_analysis(path) -> dict:
+    """
+    An analysis dict from a saved snapshot with only its summary and charts loaded. Shots and
+    raw payloads stay None until `load_lazy_fields` reads them.
+    """
+    snapshot = AnalysisSnapshot(path)
+    analysis = {field: None for field in PAYLOAD_SECTIONS}
+    analysis.update(snapshot.summary())
+    analysis.update(snapshot.fields(('render_cache',)))
+    analysis['source_snapshot'] = snapshot
+    return analysis
+
+
+def load_lazy_fields(analysis, fields) -> bool:
+    """Reads the `fields` of an opened analysis that are still None; returns whether any were read."""
+    snapshot = analysis.get('source_snapshot')
+    missing = [field for field in fields if analysis.get(field) is None]
+    if snapshot is None or not missing:
+        return False
+    analysis.update(snapshot.fields(missing))
+    return True
@@ -0,0 +1,315 @@
+"""
+Transfermarkt market values of FotMob starting XIs, for squad-strength context in the prompt.
+
+    resolver = SquadValueResolver()
+    values = resolver.team_values(full_data['lineup'])
+    # {'AC Milan': {'team_id': 8564, 'xi_value_eur': 512300000, 'players': 11, 'valued': 11, ...}}
+
+FotMob players are mapped to Transfermarkt player IDs through a persistent local index
+(data/transfermarkt/players.json), filled by Transfermarkt's quick search the first time a
+player is seen. Market values are cached in data/transfermarkt/market_values.json for
+MARKET_VALUE_TTL. Only players missing from the index or with a stale value are fetched,
+concurrently and within a time budget, so a known lineup costs no requests at all and an
+unknown one never holds up the analysis for long. Players not found are remembered for
+NOT_FOUND_TTL; correct a wrong match by editing the index.
+"""
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+
+DEFAULT_INDEX_DIR = os.path.join('data', 'transfermarkt')
+MARKET_VALUE_TTL = 7 * 24 * 3600 # Seconds; Transfermarkt revises values a few times a season
+NOT_FOUND_TTL = 30 * 24 * 3600
+DEFAULT_FETCH_TIMEOUT = 20 # Seconds spent fetching missing players per call
+MAX_CONCURRENT_REQUESTS = 4 # Transfermarkt blocks aggressive clients
+REQUEST_TIMEOUT = 15
+REQUEST_HEADERS = {
+    'user-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+}
+
+_PROFILE_LINK_PATTERN = re.compile(r'/(?P<slug>[^/"]+)/profil/spieler/(?P<id>\d+)')
+_MARKET_VALUE_PATTERN = re.compile(r'(?P<amount>\d+(?:[.,]\d+)?)\s*(?P<unit>bn|m|k|Th\.)?', re.IGNORECASE)
+_MARKET_VALUE_UNITS = {'bn': 1e9, 'm': 1e6, 'k': 1e3, 'th.': 1e3}
+
+
+def _normalize_name(name) -> str:
+    """Lower-case ASCII words of a name, so 'Théo Hernández' matches 'Theo Hernandez'."""
+    ascii_name = unicodedata.normalize('NFKD', name or '').encode('ascii', 'ignore').decode()
+    return ' '.join(re.findall(r'[a-z0-9]+', ascii_name.lower()))
+
+
+def parse_market_value(text):
+    """'€60.00m' -> 60000000.0, '€800k' -> 800000.0; None if there is no amount."""
+    match = _MARKET_VALUE_PATTERN.search(str(text or '').replace('€', ''))
+    if not match:
+        return None
+    amount = float(match.group('amount').replace(',', '.'))
+    return amount * _MARKET_VALUE_UNITS.get((match.group('unit') or '').lower(), 1)
+
+
+def format_market_value(value_eur) -> str:
+    if value_eur >= 1e9:
+        return f"€{value_eur / 1e9:.2f}bn"
+    if value_eur >= 1e6:
+        return f"€{value_eur / 1e6:.1f}m"
+    return f"€{value_eur / 1e3:.0f}k"
+
+
+def _player_name(player) -> str:
+    return player.get('name') or ' '.join(filter(None, (player.get('firstName'), player.get('lastName'))))
+
+
+def player_key(team_name, player):
+    """
+    Index key of a FotMob lineup player: its FotMob ID, or for players listed without one
+    their team and normalized name. None when the player has neither and can not be looked up.
+    """
+    if player.get('id') is not None:
+        return str(player['id'])
+    name = _normalize_name(_player_name(player))
+    return f"{_normalize_name(team_name)}/{name}" if name else None
+
+
+def lineup_starters(lineup_data) -> dict:
+    """{team name: (team id, [starting players])} from FotMob's `lineup` content."""
+    teams = {}
+    for team_lineup in (lineup_data or {}).get('lineup', []) or []:
+        starters = team_lineup.get('starters')
+        if starters is None:
+            # Older pages group the starters by formation line
+            starters = [player for line in team_lineup.get('players', []) or [] for player in line]
+        teams[team_lineup.get('teamName')] = (team_lineup.get('teamId'), starters)
+    return teams
+
+
+def parse_search_results(html) -> list:
+    """Player candidates of a Transfermarkt quick-search page: dicts with tm_id, slug, name and club."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    candidates, seen = [], set()
+    for row in soup.select('table.items tr'):
+        link = row.select_one('td.hauptlink a[href*="/profil/spieler/"]')
+        if link is None:
+            continue
+        match = _PROFILE_LINK_PATTERN.search(link['href'])
+        if not match or match.group('id') in seen:
+            continue
+        seen.add(match.group('id'))
+        club = row.select_one('a[href*="/startseite/verein/"]')
+        candidates.append({
+            'tm_id': match.group('id'),
+            'slug': match.group('slug'),
+            'name': link.get('title') or link.get_text(strip=True),
+            'club': (club.get('title') or club.get_text(strip=True)) if club else None,
+        })
+    return candidates
+
+
+def pick_candidate(candidates, player_name, team_name):
+    """The search result that is this player: same name, preferring one at `team_name`'s club."""
+    wanted = _normalize_name(player_name)
+    wanted_last = wanted.split()[-1] if wanted else None
+    team_words = set(_normalize_name(team_name).split())
+
+    def score(candidate):
+        name = _normalize_name(candidate['name'])
+        if name == wanted:
+            name_score = 2
+        elif wanted_last and name.split()[-1:] == [wanted_last]:
+            name_score = 1
+        else:
+            return None
+        club_words = set(_normalize_name(candidate['club']).split())
+        return name_score + (1 if team_words & club_words else 0)
+
+    scored = [(score(candidate), index) for index, candidate in enumerate(candidates)]
+    scored = [(value, index) for value, index in scored if value is not None]
+    if not scored:
+        return None
+    # Search results are ordered by relevance, so ties keep the first one
+    return candidates[max(scored, key=lambda item: (item[0], -item[1]))[1]]
+
+
+class TransfermarktIndex:
+    """FotMob player key (see player_key) -> Transfermarkt player and Transfermarkt ID -> market value, kept on disk."""
+
+    def __init__(self, directory=DEFAULT_INDEX_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.players = self._read('players.json')
+        self.values = self._read('market_values.json')
+
+    def _read(self, name) -> dict:
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write(self, name, entries):
+        # Other processes may have added entries since we read the file; keep theirs too
+        merged = {**self._read(name), **entries}
+        path = os.path.join(self.directory, name)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(merged, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(temp_path, path)
+        return merged
+
+    def save(self):
+        with self._lock:
+            self.players = self._write('players.json', self.players)
+            self.values = self._write('market_values.json', self.values)
+
+    def player(self, key, now=None):
+        """The index entry of a FotMob player, or None if the player must be (re)searched."""
+        entry = self.players.get(key) if key is not None else None
+        if entry is None:
+            return None
+        if entry.get('tm_id') is None and (now or time.time()) - entry.get('resolved_at', 0) > NOT_FOUND_TTL:
+            return None
+        return entry
+
+    def set_player(self, key, candidate, player_name):
+        if key is None:
+            return
+        with self._lock:
+            self.players[key] = {
+                'tm_id': candidate['tm_id'] if candidate else None,
+                'slug': candidate['slug'] if candidate else None,
+                'name': player_name,
+                'resolved_at': time.time(),
+            }
+
+    def market_value(self, tm_id, ttl=MARKET_VALUE_TTL, now=None):
+        """(value in EUR or None, fresh) for a Transfermarkt player."""
+        entry = self.values.get(str(tm_id))
+        if entry is None:
+            return None, False
+        return entry.get('value_eur'), (now or time.time()) - entry.get('fetched_at', 0) <= ttl
+
+    def set_market_value(self, tm_id, value_eur):
+        with self._lock:
+            self.values[str(tm_id)] = {'value_eur': value_eur, 'fetched_at': time.time()}
+
+
+class SquadValueResolver:
+    def __init__(self, index_dir=DEFAULT_INDEX_DIR, ttl=MARKET_VALUE_TTL, fetch_timeout=DEFAULT_FETCH_TIMEOUT,
+                 max_concurrent=MAX_CONCURRENT_REQUESTS):
+        self.index = TransfermarktIndex(index_dir)
+        self.ttl = ttl
+        self.fetch_timeout = fetch_timeout
+        self.max_concurrent = max_concurrent
+
+    def team_values(self, lineup_data, fetch_missing=True) -> dict:
+        """{team name: starting-XI value aggregate} for every team of a FotMob lineup."""
+        teams = lineup_starters(lineup_data)
+        if fetch_missing:
+            self.fetch_missing([(team_name, player) for team_name, (_, starters) in teams.items() for player in starters])
+        return {team_name: self._aggregate(team_id, team_name, starters) for team_name, (team_id, starters) in teams.items()}
+
+    def fetch_missing(self, players) -> int:
+        """
+        Resolves unknown (team name, FotMob player) pairs and refreshes stale market values,
+        for at most fetch_timeout seconds. Returns the number of players still missing.
+        """
+        now = time.time()
+        to_resolve, to_value = [], set()
+        for team_name, player in players:
+            key = player_key(team_name, player)
+            if key is None:
+                continue
+            entry = self.index.player(key, now)
+            if entry is None:
+                to_resolve.append((team_name, player))
+            elif entry['tm_id'] and not self.index.market_value(entry['tm_id'], self.ttl, now)[1]:
+                to_value.add(entry['tm_id'])
+        if not to_resolve and not to_value:
+            return 0
+        pending = asyncio.run(self._fetch(to_resolve, to_value))
+        self.index.save()
+        return pending
+
+    async def _fetch(self, to_resolve, to_value) -> int:
+        import aiohttp
+
+        slots = asyncio.Semaphore(self.max_concurrent)
+        async with aiohttp.ClientSession(headers=REQUEST_HEADERS, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as session:
+            tasks = [asyncio.ensure_future(self._resolve_player(session, slots, team_name, player)) for team_name, player in to_resolve]
+            tasks += [asyncio.ensure_future(self._fetch_market_value(session, slots, tm_id)) for tm_id in to_value]
+            done, pending = await asyncio.wait(tasks, timeout=self.fetch_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        failed = sum(1 for task in done if task.exception() is not None)
+        if failed or pending:
+            print(f"  - Transfermarkt: {failed} request(s) failed, {len(pending)} not finished in {self.fetch_timeout}s.")
+        return failed + len(pending)
+
+    async def _get(self, session, slots, url, **params):
+        async with slots:
+            async with session.get(url, params=params) as response:
+                response.raise_for_status()
+                return await response.read()
+
+    async def _resolve_player(self, session, slots, team_name, player):
+        from football_scraper import TRANSFERMARKT_BASE_URL
+
+        player_name = _player_name(player)
+        html = await self._get(session, slots, f"{TRANSFERMARKT_BASE_URL}/schnellsuche/ergebnis/schnellsuche", query=player_name)
+        candidate = pick_candidate(parse_search_results(html), player_name, team_name)
+        self.index.set_player(player_key(team_name, player), candidate, player_name)
+        if candidate and not self.index.market_value(candidate['tm_id'], self.ttl)[1]:
+            await self._fetch_market_value(session, slots, candidate['tm_id'])
+
+    async def _fetch_market_value(self, session, slots, tm_id):
+        from football_scraper import TRANSFERMARKT_BASE_URL
+
+        body = await self._get(session, slots, f"{TRANSFERMARKT_BASE_URL}/ceapi/marketValueDevelopment/graph/{tm_id}")
+        data = json.loads(body)
+        history = data.get('list') or []
+        value = history[-1].get('y') if history else None
+        if value is None:
+            value = parse_market_value(data.get('current'))
+        self.index.set_market_value(tm_id, value)
+
+    def _aggregate(self, team_id, team_name, starters) -> dict:
+        valued = []
+        for player in starters:
+            entry = self.index.player(player_key(team_name, player))
+            if entry and entry['tm_id']:
+                value, _ = self.index.market_value(entry['tm_id'], self.ttl)
+                if value is not None:
+                    valued.append((value, player.get('name') or entry['name']))
+        total = sum(value for value, _ in valued)
+        top_value, top_player = max(valued) if valued else (None, None)
+        return {
+            'team_id': team_id,
+            'team_name': team_name,
+            'players': len(starters),
+            'valued': len(valued),
+            'xi_value_eur': total,
+            'average_eur': total / len(valued) if valued else None,
+            'top_player': top_player,
+            'top_value_eur': top_value,
+        }
+
+
+def collect_squad_values(raw_data, fetch_missing=True, resolver=None) -> dict:
+    """{'match1': {team name: aggregate}, 'match2': {...}} for the two matches of an analysis."""
+    resolver = resolver or SquadValueResolver()
+    match_keys = ('match1', 'match2')
+    teams = [(team_name, player) for match_key in match_keys
+             for team_name, (_, starters) in lineup_starters(raw_data[match_key].get('full_data', {}).get('lineup')).items()
+             for player in starters]
+    if fetch_missing:
+        # One fetch for both matches, so their players share the time budget and connections
+        resolver.fetch_missing(teams)
+    return {match_key: resolver.team_values(raw_data[match_key].get('full_data', {}).get('lineup'), fetch_missing=False)
+            for match_key in match_keys}
@@ -0,0 +1,232 @@
+"""
+Lightweight tracing spans for the analysis pipeline.
+
+    with span('scrape.page_goto', url=match_url):
+        page.goto(...)
+
+Spans nest per thread and per asyncio task (the current span is a context variable); a span
+opened with no parent in its thread or task starts a new trace.
+Every finished span is
+  - logged as one JSON line on the 'keo_bong_vtt.trace' logger,
+  - aggregated into per-stage histograms, exportable in the Prometheus text format,
+  - kept with its trace in a short history that the app's performance panel shows.
+
+Set KEO_TRACE_LOG and/or KEO_METRICS_FILE (see configure_from_env) to write the JSON log
+and the Prometheus file; the metrics file is rewritten whenever a trace finishes.
+"""
+import contextvars
+import functools
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger('keo_bong_vtt.trace')
+logger.addHandler(logging.NullHandler())
+
+# Histogram buckets in seconds; from JSON parsing (ms) up to page loads and Gemini calls
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+RECENT_TRACES = 20
+METRIC_PREFIX = 'keo_bong_vtt'
+
+
+class Span:
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start', 'duration', 'status', 'error', 'attributes', 'children',
+                 '_token')
+
+    def __init__(self, name, trace_id, span_id, parent_id, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.duration = None # Seconds, set when the span ends
+        self.status = 'ok'
+        self.error = None
+        self.attributes = attributes
+        self.children = []
+        self._token = None # Restores the previous current span when this one ends
+
+    def set(self, **attributes):
+        """Adds attributes known only inside the span (e.g. the number of shots found)."""
+        self.attributes.update(attributes)
+
+    def fail(self, error):
+        """Marks the span as failed; for errors that are handled inside the span instead of raised."""
+        self.status = 'error'
+        self.error = f"{type(error).__name__}: {error}"[:300]
+
+    def to_record(self) -> dict:
+        return {
+            'span': self.name, 'trace_id': self.trace_id, 'span_id': self.span_id, 'parent_id': self.parent_id,
+            'start': round(self.start, 6), 'duration_ms': round(self.duration * 1000, 3),
+            'status': self.status, 'error': self.error, **self.attributes,
+        }
+
+
+class _StageMetrics:
+    __slots__ = ('count', 'errors', 'total', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+
+
+class Tracer:
+    def __init__(self):
+        self._current = contextvars.ContextVar('keo_bong_vtt_current_span', default=None)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock() # One metrics file writer at a time
+        self._metrics = {} # span name -> _StageMetrics
+        self._recent = OrderedDict() # trace id -> root span, most recent last
+        self._listeners = []
+        self.metrics_path = None
+
+    def current_span(self):
+        return self._current.get()
+
+    def start(self, name, attributes) -> Span:
+        parent = self.current_span()
+        span_id = next(self._ids)
+        span = Span(name, parent.trace_id if parent else span_id, span_id, parent.span_id if parent else None, attributes)
+        if parent:
+            parent.children.append(span)
+        span._token = self._current.set(span)
+        return span
+
+    def finish(self, span: Span, duration: float, error=None):
+        span.duration = duration
+        if error is not None:
+            span.fail(error)
+        if span._token is not None and self._current.get() is span:
+            try:
+                self._current.reset(span._token)
+            except ValueError:
+                # Ended in another context than it started in; that context never saw it as current
+                pass
+            span._token = None
+
+        with self._lock:
+            metrics = self._metrics.get(span.name)
+            if metrics is None:
+                metrics = self._metrics[span.name] = _StageMetrics()
+            metrics.count += 1
+            metrics.total += duration
+            metrics.errors += span.status == 'error'
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    metrics.buckets[index] += 1
+            if span.parent_id is None:
+                self._recent[span.trace_id] = span
+                while len(self._recent) > RECENT_TRACES:
+                    self._recent.popitem(last=False)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(span.to_record(), ensure_ascii=False, default=str))
+
+        if span.parent_id is None:
+            if self.metrics_path:
+                try:
+                    self.write_prometheus(self.metrics_path)
+                except OSError as e:
+                    # Metrics are a side channel; failing to export them must not fail the traced stage
+                    print(f"Could not write metrics to {self.metrics_path}: {e}")
+            for listener in list(self._listeners):
+                listener(span)
+
+    def add_listener(self, callback):
+        """Calls `callback(root_span)` whenever a trace finishes, on the thread that finished it."""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def recent_traces(self) -> list:
+        """Finished root spans, most recent first."""
+        with self._lock:
+            return list(reversed(self._recent.values()))
+
+    def prometheus_text(self) -> str:
+        with self._lock:
+            snapshot = {name: (m.count, m.errors, m.total, list(m.buckets)) for name, m in self._metrics.items()}
+        duration_metric = f"{METRIC_PREFIX}_stage_duration_seconds"
+        errors_metric = f"{METRIC_PREFIX}_stage_errors_total"
+        lines = [
+            f"# HELP {duration_metric} Duration of pipeline stages.",
+            f"# TYPE {duration_metric} histogram",
+        ]
+        for name, (count, errors, total, buckets) in sorted(snapshot.items()):
+            for bound, bucket_count in zip(DURATION_BUCKETS, buckets):
+                lines.append(f'{duration_metric}_bucket{{stage="{name}",le="{bound}"}} {bucket_count}')
+            lines.append(f'{duration_metric}_bucket{{stage="{name}",le="+Inf"}} {count}')
+            lines.append(f'{duration_metric}_sum{{stage="{name}"}} {total:.6f}')
+            lines.append(f'{duration_metric}_count{{stage="{name}"}} {count}')
+        lines += [f"# HELP {errors_metric} Pipeline stages that raised.", f"# TYPE {errors_metric} counter"]
+        for name, (count, errors, total, buckets) in sorted(snapshot.items()):
+            lines.append(f'{errors_metric}{{stage="{name}"}} {errors}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """Writes the metrics atomically, so a collector never reads a half-written file."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # Unique per writer, in case another process exports to the same file
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self._write_lock:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(self.prometheus_text())
+            os.replace(temp_path, path)
+
+
+tracer = Tracer()
+
+
+class span:
+    """Context manager timing one stage; usable as `with span('name', key=value) as s:`."""
+    __slots__ = ('name', 'attributes', '_span', '_start')
+
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self) -> Span:
+        self._span = tracer.start(self.name, self.attributes)
+        self._start = time.perf_counter()
+        return self._span
+
+    def __exit__(self, exc_type, exc, traceback):
+        tracer.finish(self._span, time.perf_counter() - self._start, exc)
+        return False
+
+
+def traced(name):
+    """Decorator wrapping every call of a function in a span."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def configure(log_path=None, metrics_path=None):
+    """Writes span records as JSON lines to `log_path` and the Prometheus text to `metrics_path`."""
+    if log_path:
+        os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+        handler = logging.FileHandler(log_path, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+    if metrics_path:
+        tracer.metrics_path = metrics_path
+
+
+def configure_from_env():
+    configure(os.environ.get('KEO_TRACE_LOG'), os.environ.get('KEO_METRICS_FILE'))